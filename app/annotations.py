@@ -0,0 +1,378 @@
+"""编辑窗口的矢量标注
+
+截图本身（底图）不会被修改。画笔、矩形、圆形、箭头、文字和马赛克都作为标注对象保存在列表中，
+按顺序叠加在底图之上。标注对象创建后不可修改，用__slots__保存绘制所需的最少数据：
+坐标用元组，颜色用ARGB整数。撤销/重做记录的是标注列表（元组）的引用，不复制图片。
+
+AnnotationScene缓存合成后的图片，增删标注时只重新绘制这些标注所在的区域。
+导出时直接使用缓存的合成结果（只合成一次），也可以按更高的倍数重新绘制，线条和文字依然清晰。
+"""
+import math
+from PyQt6.QtCore import Qt, QRect, QRectF, QPoint, QPointF
+from PyQt6.QtGui import QPainter, QPen, QColor, QImage, QPixmap
+from .stroke_processing import smooth_path
+from .text_layout import layout_text
+from . import metrics
+
+# 脏区域超过这个数量时合并为一个矩形，避免大量很小的重绘
+MAX_DIRTY_RECTS = 16
+
+def shape_pen(kind, color, width):
+    """标注使用的画笔：画笔和箭头用圆头，矩形和圆形与Qt默认一致"""
+    pen = QPen(color, width, Qt.PenStyle.SolidLine)
+    if kind in ('stroke', 'arrow'):
+        pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+        pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
+    return pen
+
+def draw_arrow(painter, start, end, size):
+    """画箭头：主线加两条30度的短边，短边长度为size"""
+    start = QPointF(start)
+    end = QPointF(end)
+    dx = end.x() - start.x()
+    dy = end.y() - start.y()
+    if math.hypot(dx, dy) < 1:  # 避免除以零
+        return
+    painter.drawLine(start, end)
+    angle = math.atan2(dy, dx)
+    for side in (math.pi / 6, -math.pi / 6):
+        painter.drawLine(end, QPointF(end.x() - size * math.cos(angle + side),
+                                      end.y() - size * math.sin(angle + side)))
+
+def align_rect(rect, block):
+    """把区域向外扩展到以图片原点为起点、边长为block的网格上"""
+    left = (rect.left() // block) * block
+    top = (rect.top() // block) * block
+    right = (rect.right() // block + 1) * block
+    bottom = (rect.bottom() // block + 1) * block
+    return QRect(left, top, right - left, bottom - top)
+
+def pixelate(image, rect, block):
+    """对image中的rect做马赛克：缩小再用最近邻放大，每一块取平均色
+    
+    rect的左上角应当在网格上，这样同一块无论在哪次重绘中都得到同样的颜色。
+    """
+    rect = rect.intersected(image.rect())
+    if rect.isEmpty():
+        return
+    columns = -(-rect.width() // block)
+    rows = -(-rect.height() // block)
+    small = image.copy(rect).scaled(columns, rows, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                    Qt.TransformationMode.SmoothTransformation)
+    blocks = small.scaled(columns * block, rows * block, Qt.AspectRatioMode.IgnoreAspectRatio,
+                          Qt.TransformationMode.FastTransformation)
+    painter = QPainter(image)
+    painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+    painter.drawImage(rect.topLeft(), blocks, QRect(0, 0, rect.width(), rect.height()))
+    painter.end()
+
+def points_bounds(points, margin):
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return QRect(min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1).adjusted(
+        -margin, -margin, margin, margin)
+
+class Annotation:
+    """标注对象的基类，创建后不可修改"""
+    __slots__ = ('_bounds',)
+    # 为True时需要读取下面已经画好的像素（马赛克），由apply处理而不是paint
+    reads_pixels = False
+    
+    def __init__(self, **fields):
+        object.__setattr__(self, '_bounds', None)
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+            
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 创建后不可修改")
+        
+    def bounds(self):
+        """标注在图片坐标中占据的区域（含线宽），只计算一次"""
+        if self._bounds is None:
+            object.__setattr__(self, '_bounds', self.computeBounds())
+        return QRect(self._bounds)
+        
+    def computeBounds(self):
+        raise NotImplementedError
+        
+    def paint(self, painter):
+        """painter已经变换到图片坐标"""
+        raise NotImplementedError
+
+class StrokeAnnotation(Annotation):
+    """画笔笔画，points是已经简化过的点，绘制时平滑为曲线"""
+    __slots__ = ('points', 'color', 'width', '_path')
+    
+    def __init__(self, points, color, width):
+        super().__init__(points=tuple(points), color=color, width=width, _path=None)
+        
+    def path(self):
+        if self._path is None:
+            object.__setattr__(self, '_path', smooth_path(self.points))
+        return self._path
+        
+    def computeBounds(self):
+        # 二次曲线不会超出控制点的凸包
+        return points_bounds(self.points, self.width // 2 + 2)
+        
+    def paint(self, painter):
+        painter.strokePath(self.path(), shape_pen('stroke', QColor.fromRgba(self.color), self.width))
+
+class RectAnnotation(Annotation):
+    __slots__ = ('rect', 'color', 'width')
+    kind = 'rect'
+    
+    def __init__(self, rect, color, width):
+        super().__init__(rect=(rect.x(), rect.y(), rect.width(), rect.height()), color=color, width=width)
+        
+    def computeBounds(self):
+        margin = self.width // 2 + 2
+        return QRect(*self.rect).adjusted(-margin, -margin, margin, margin)
+        
+    def paint(self, painter):
+        painter.setPen(shape_pen(self.kind, QColor.fromRgba(self.color), self.width))
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawRect(QRect(*self.rect))
+
+class EllipseAnnotation(RectAnnotation):
+    __slots__ = ()
+    kind = 'circle'
+    
+    def paint(self, painter):
+        painter.setPen(shape_pen(self.kind, QColor.fromRgba(self.color), self.width))
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawEllipse(QRect(*self.rect))
+
+class ArrowAnnotation(Annotation):
+    __slots__ = ('start', 'end', 'color', 'width')
+    
+    def __init__(self, start, end, color, width):
+        super().__init__(start=(start.x(), start.y()), end=(end.x(), end.y()), color=color, width=width)
+        
+    def computeBounds(self):
+        # 箭头两边的长度为线宽的3倍
+        return points_bounds((self.start, self.end), self.width * 3 + 2)
+        
+    def paint(self, painter):
+        painter.setPen(shape_pen('arrow', QColor.fromRgba(self.color), self.width))
+        draw_arrow(painter, QPointF(*self.start), QPointF(*self.end), self.width * 3)
+
+class TextAnnotation(Annotation):
+    """多行文字，position为第一行的左上角，font使用像素字号
+    
+    按wrap_width（None表示只在换行符处换行）排版，与编辑时文本框中显示的是同一个缓存的排版结果。
+    """
+    __slots__ = ('position', 'text', 'font', 'color', 'background', 'border', 'border_width', 'border_style',
+                 'wrap_width')
+    
+    def __init__(self, position, text, font, color, background=0, border=0, border_width=1,
+                 border_style=Qt.PenStyle.SolidLine, wrap_width=None):
+        super().__init__(position=(position.x(), position.y()), text=text, font=font, color=color,
+                         background=background, border=border, border_width=border_width,
+                         border_style=border_style, wrap_width=wrap_width)
+                         
+    def layout(self):
+        return layout_text(self.text, self.font, self.font.pixelSize(), self.wrap_width)
+                         
+    def boxRect(self):
+        """背景和边框的区域"""
+        size = self.layout().size()
+        x, y = self.position
+        return QRect(x - 2, y - 2, size.width() + 4, size.height() + 4)
+        
+    def computeBounds(self):
+        margin = self.border_width + 2
+        return self.boxRect().adjusted(-margin, -margin, margin, margin)
+        
+    def paint(self, painter):
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+        box = self.boxRect()
+        background = QColor.fromRgba(self.background)
+        if background.alpha() > 0:
+            painter.fillRect(box, background)
+        border = QColor.fromRgba(self.border)
+        if border.alpha() > 0:
+            painter.setPen(QPen(border, self.border_width, self.border_style))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRect(box)
+        self.layout().paint(painter, QPointF(*self.position), QColor.fromRgba(self.color))
+
+class MosaicAnnotation(Annotation):
+    """一次拖动涂抹的马赛克，rects为对齐到网格的区域"""
+    __slots__ = ('rects', 'block_size')
+    reads_pixels = True
+    
+    def __init__(self, rects, block_size):
+        super().__init__(rects=tuple((rect.x(), rect.y(), rect.width(), rect.height()) for rect in rects),
+                         block_size=block_size)
+                         
+    def computeBounds(self):
+        bounds = QRect()
+        for rect in self.rects:
+            bounds = bounds.united(QRect(*rect))
+        return bounds
+        
+    def apply(self, image, origin, scale=1.0):
+        """对image（左上角对应图片坐标origin，按scale缩放）中已经画好的内容打马赛克"""
+        block = max(1, round(self.block_size * scale))
+        for x, y, width, height in self.rects:
+            target = QRect(round(x * scale) - origin.x(), round(y * scale) - origin.y(),
+                           round(width * scale), round(height * scale))
+            pixelate(image, target, block)
+
+class AnnotationScene:
+    """底图和其上的标注列表，composite是缓存的合成结果（编辑窗口直接显示它）
+    
+    composite在绘制过程中也可以被直接画上临时内容（正在拖动的画笔、马赛克），
+    之后用invalidate标记这些区域，update时按底图和标注重新绘制。
+    """
+    
+    def __init__(self, base):
+        # 编辑时一律使用像素坐标，导出时再恢复设备像素比
+        self.device_pixel_ratio = base.devicePixelRatio()
+        # 浅复制（共享数据），撤销时修改底图不会影响调用方的图片
+        base = QPixmap(base)
+        if self.device_pixel_ratio != 1.0:
+            base.setDevicePixelRatio(1.0)
+        self.base = base
+        self.annotations = ()
+        self.composite = base.copy()
+        self.dirty = []
+        # 最近一次导出的(倍数, 图片)，内容变化时清空
+        self.exported = None
+        
+    def rect(self):
+        return QRect(QPoint(0, 0), self.base.size())
+        
+    def setAnnotations(self, annotations):
+        """换成另一组标注（撤销/重做），只重绘两边不同的标注"""
+        for annotation in set(self.annotations).symmetric_difference(annotations):
+            self.invalidate(annotation.bounds())
+        self.annotations = tuple(annotations)
+        
+    def setBase(self, base, annotations=()):
+        """更换底图（旋转、调整颜色），整张重绘"""
+        if base.size() != self.base.size():
+            self.composite = QPixmap(base.size())
+        self.base = base
+        self.annotations = tuple(annotations)
+        self.dirty = []
+        self.invalidate(self.rect())
+        
+    def patchBase(self, tiles):
+        """把[(区域, QImage), ...]写回底图（撤销/重做底图的变化）"""
+        painter = QPainter(self.base)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        for rect, image in tiles:
+            painter.drawImage(rect.topLeft(), image)
+        painter.end()
+        for rect, _ in tiles:
+            self.invalidate(rect)
+        
+    def add(self, annotation):
+        self.annotations += (annotation,)
+        self.invalidate(annotation.bounds())
+        
+    def invalidate(self, rect):
+        """标记需要按底图和标注重新绘制的区域"""
+        rect = rect.intersected(self.rect())
+        if rect.isEmpty():
+            return
+        self.exported = None
+        # 与已有区域相交时合并为一个矩形
+        merged = True
+        while merged:
+            merged = False
+            for index, dirty in enumerate(self.dirty):
+                if dirty.intersects(rect):
+                    rect = rect.united(self.dirty.pop(index))
+                    merged = True
+                    break
+        self.dirty.append(rect)
+        if len(self.dirty) > MAX_DIRTY_RECTS:
+            bounds = QRect()
+            for dirty in self.dirty:
+                bounds = bounds.united(dirty)
+            self.dirty = [bounds]
+            
+    def expandForMosaic(self, rect):
+        """重绘区域切到马赛克块时扩展到整块，否则块的平均色会变化"""
+        expanded = True
+        while expanded:
+            expanded = False
+            for annotation in self.annotations:
+                if annotation.reads_pixels and annotation.bounds().intersects(rect):
+                    grown = rect.united(annotation.bounds().intersected(align_rect(rect, annotation.block_size)))
+                    if grown != rect:
+                        rect = grown
+                        expanded = True
+        return rect.intersected(self.rect())
+        
+    def render(self, region, scale=1.0):
+        """把region（图片坐标）内的底图和标注按scale绘制成新的QImage"""
+        origin = QPoint(math.floor(region.x() * scale), math.floor(region.y() * scale))
+        image = QImage(max(1, math.ceil(region.width() * scale)), max(1, math.ceil(region.height() * scale)),
+                       QImage.Format.Format_ARGB32_Premultiplied)
+                       
+        def begin():
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.translate(-origin.x(), -origin.y())
+            painter.scale(scale, scale)
+            return painter
+            
+        painter = begin()
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.drawPixmap(QRectF(region), self.base, QRectF(region))
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+        for annotation in self.annotations:
+            if not annotation.bounds().intersects(region):
+                continue
+            if annotation.reads_pixels:
+                painter.end()
+                annotation.apply(image, origin, scale)
+                painter = begin()
+            else:
+                painter.save()
+                annotation.paint(painter)
+                painter.restore()
+        painter.end()
+        return image
+        
+    def update(self):
+        """重新绘制所有脏区域，返回绘制过的区域"""
+        if not self.dirty:
+            return []
+        start = metrics.now()
+        dirty, self.dirty = self.dirty, []
+        updated = []
+        for rect in dirty:
+            rect = self.expandForMosaic(rect)
+            image = self.render(rect)
+            painter = QPainter(self.composite)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            painter.drawImage(rect.topLeft(), image)
+            painter.end()
+            updated.append(rect)
+        metrics.record('scene_update', metrics.elapsed_ms(start))
+        return updated
+        
+    def flatten(self, scale=1.0):
+        """导出合成后的图片，内容不变时重复导出直接返回上一次的结果
+        
+        scale为1时使用缓存的合成结果，其他倍数时按该倍数重新绘制一次：
+        底图被缩放，标注按矢量绘制，放大导出时线条和文字依然清晰。
+        """
+        self.update()
+        if self.exported is not None and self.exported[0] == scale:
+            return self.exported[1]
+        start = metrics.now()
+        if scale == 1.0:
+            pixmap = self.composite.copy()
+        else:
+            pixmap = QPixmap.fromImage(self.render(self.rect(), scale))
+        pixmap.setDevicePixelRatio(self.device_pixel_ratio * scale)
+        self.exported = (scale, pixmap)
+        metrics.record('scene_flatten', metrics.elapsed_ms(start))
+        return pixmap
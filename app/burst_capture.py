@@ -0,0 +1,216 @@
+import os
+import hashlib
+import threading
+from collections import deque
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, QDateTime, pyqtSignal
+from . import capture_output
+from . import metrics
+
+def image_hash(image):
+    """计算QImage像素数据的摘要，用于判断相邻两帧是否完全相同"""
+    data = image.constBits().asstring(image.sizeInBytes())
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class FrameRingBuffer:
+    """按内存上限保存帧的环形缓冲区
+    
+    超出上限时丢弃最旧的帧。截图在界面线程中放入，写盘线程从另一端取出，
+    所以所有操作都加锁。
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.bytes = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        
+    def push(self, index, timestamp, image):
+        size = image.sizeInBytes()
+        with self.lock:
+            self.frames.append((index, timestamp, image))
+            self.bytes += size
+            # 至少保留刚放入的一帧
+            while self.bytes > self.max_bytes and len(self.frames) > 1:
+                _, _, old_image = self.frames.popleft()
+                self.bytes -= old_image.sizeInBytes()
+                self.evicted += 1
+            self.available.notify()
+            
+    def pop(self, timeout=None):
+        """取出最旧的一帧，超时仍没有帧时返回None"""
+        with self.lock:
+            if not self.frames:
+                self.available.wait(timeout)
+            if not self.frames:
+                return None
+            frame = self.frames.popleft()
+            self.bytes -= frame[2].sizeInBytes()
+            return frame
+            
+    def wakeAll(self):
+        with self.lock:
+            self.available.notify_all()
+            
+    def __len__(self):
+        with self.lock:
+            return len(self.frames)
+            
+    def occupancy(self):
+        """当前占用的字节数和占上限的比例"""
+        with self.lock:
+            return self.bytes, self.bytes / self.max_bytes if self.max_bytes else 0.0
+
+class BurstFlusher(QThread):
+    """后台把环形缓冲区中的帧编码并写入目录，停止后写完剩余的帧再退出"""
+    def __init__(self, buffer, directory, image_format='png', parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.directory = directory
+        self.image_format = image_format
+        self.stop_event = threading.Event()
+        self.written = 0
+        self.failed = 0
+        
+    def stop(self):
+        self.stop_event.set()
+        self.buffer.wakeAll()
+        
+    def run(self):
+        while True:
+            frame = self.buffer.pop(timeout=0.2)
+            if frame is None:
+                if self.stop_event.is_set():
+                    break
+                continue
+            index, timestamp, image = frame
+            filename = os.path.join(self.directory, f'frame_{index:05d}_{timestamp}.{self.image_format}')
+            try:
+                if image.save(filename, quality=90):
+                    self.written += 1
+                else:
+                    self.failed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"写入连拍帧时出错: {str(e)}")
+
+class BurstCapture(QObject):
+    """按固定间隔重复截取一个区域
+    
+    每一帧都走ScreenshotTool.grabRegion（只截取与区域相交的屏幕），
+    与上一帧完全相同的帧直接跳过，其余的放入有内存上限的环形缓冲区，
+    由BurstFlusher在后台写盘。rect为全局逻辑坐标。
+    """
+    statsChanged = pyqtSignal(dict)
+    stopped = pyqtSignal(dict)
+    
+    # 停止后仍在写盘的线程，写完之前保持引用
+    _flushing = set()
+    
+    def __init__(self, tool, rect, interval_ms=300, max_bytes=256 * 1024 * 1024,
+                 directory=None, max_frames=0, parent=None):
+        super().__init__(parent)
+        self.tool = tool
+        self.rect = rect
+        self.interval_ms = max(1, interval_ms)
+        self.max_frames = max_frames
+        if directory is None:
+            timestamp = QDateTime.currentDateTime().toString('yyyyMMdd_hhmmss')
+            directory = os.path.join(capture_output.default_save_dir() or os.path.expanduser('~'),
+                                     f'burst_{timestamp}')
+        self.directory = directory
+        
+        self.buffer = FrameRingBuffer(max_bytes)
+        self.flusher = None
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        
+        self.start_time = None
+        self.stop_time = None
+        self.finished = False
+        self.grabbed = 0
+        self.duplicates = 0
+        self.last_hash = None
+        
+    def isRunning(self):
+        return self.timer.isActive()
+        
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.flusher = BurstFlusher(self.buffer, self.directory)
+        self.flusher.start(QThread.Priority.LowPriority)
+        self.start_time = metrics.now()
+        self.timer.start(self.interval_ms)
+        self.tick()
+        
+    def tick(self):
+        grab_start = metrics.now()
+        screenshot = self.tool.grabRegion(self.rect)
+        if screenshot is None:
+            print("连拍区域不在任何屏幕上，停止连拍")
+            self.stop()
+            return
+        self.grabbed += 1
+        
+        # QPixmap只能在界面线程使用，放入缓冲区的是QImage
+        image = screenshot.toImage()
+        digest = image_hash(image)
+        if digest == self.last_hash:
+            self.duplicates += 1
+        else:
+            self.last_hash = digest
+            timestamp = QDateTime.currentDateTime().toString('hhmmss_zzz')
+            self.buffer.push(self.grabbed, timestamp, image)
+        metrics.record('burst_grab', metrics.elapsed_ms(grab_start))
+        
+        self.statsChanged.emit(self.stats())
+        if self.max_frames and self.grabbed >= self.max_frames:
+            self.stop()
+            
+    def stats(self):
+        """实际帧率、丢帧数（错过的定时周期和因内存上限丢弃的帧）和缓冲区占用"""
+        if self.start_time is None:
+            elapsed = 0.0
+        else:
+            end_time = self.stop_time if self.stop_time is not None else metrics.now()
+            elapsed = end_time - self.start_time
+        expected = int(elapsed * 1000 / self.interval_ms) + 1 if elapsed > 0 else 0
+        occupancy_bytes, occupancy_ratio = self.buffer.occupancy()
+        return {
+            'elapsed': elapsed,
+            'fps': self.grabbed / elapsed if elapsed > 0 else 0.0,
+            'grabbed': self.grabbed,
+            'duplicates': self.duplicates,
+            'missed_ticks': max(0, expected - self.grabbed),
+            'evicted': self.buffer.evicted,
+            'dropped': max(0, expected - self.grabbed) + self.buffer.evicted,
+            'buffered': len(self.buffer),
+            'buffer_bytes': occupancy_bytes,
+            'buffer_occupancy': occupancy_ratio,
+            'written': self.flusher.written if self.flusher is not None else 0,
+            'directory': self.directory,
+        }
+        
+    def stop(self, wait=False):
+        """停止截图，后台线程写完缓冲区中剩余的帧后退出"""
+        if self.start_time is None or self.finished:
+            return
+        self.finished = True
+        self.timer.stop()
+        self.stop_time = metrics.now()
+        flusher = self.flusher
+        flusher.stop()
+        if wait:
+            flusher.wait()
+        elif flusher.isRunning():
+            BurstCapture._flushing.add(flusher)
+            flusher.finished.connect(lambda: BurstCapture._flushing.discard(flusher))
+        self.stopped.emit(self.stats())
+
+def format_stats(stats):
+    """把统计信息格式化为一行文字"""
+    return (f"{stats['fps']:.1f} 帧/秒，已截取 {stats['grabbed']} 帧，重复 {stats['duplicates']}，"
+            f"丢帧 {stats['dropped']}，缓冲 {stats['buffered']} 帧 "
+            f"({stats['buffer_bytes'] / 1048576:.1f} MB, {stats['buffer_occupancy'] * 100:.0f}%)，"
+            f"已写入 {stats['written']}")
@@ -0,0 +1,208 @@
+import os
+import random
+from PyQt6.QtCore import Qt, QRect, QSize, QPoint
+from PyQt6.QtGui import QImage, QPixmap, QPainter, QColor, QLinearGradient, QFont
+from .tiled_frame import TiledFrame
+
+# 请求截取的区域每边的上限（QPixmap单边的上限），超过时不做任何截图工作
+MAX_REGION_SIZE = 32767
+
+class ScreenInfo:
+    """截图后端中的一个屏幕：逻辑区域、设备像素比和名称"""
+    def __init__(self, geometry, device_pixel_ratio=1.0, name='', handle=None):
+        self.geometry = QRect(geometry)
+        self.device_pixel_ratio = device_pixel_ratio
+        self.name = name
+        # Qt后端中为对应的QScreen，合成后端中为None
+        self.handle = handle
+
+class CaptureBackend:
+    """截图后端接口，ScreenshotTool通过它获取屏幕布局和屏幕截图"""
+    name = ''
+    
+    def screens(self):
+        """返回ScreenInfo列表，布局不变时应返回同一批对象"""
+        raise NotImplementedError
+        
+    def virtualGeometry(self):
+        """所有屏幕的总区域"""
+        virtual_geometry = QRect()
+        for screen in self.screens():
+            virtual_geometry = virtual_geometry.united(screen.geometry)
+        return virtual_geometry
+        
+    def grabScreen(self, screen, rect=None):
+        """截取一个屏幕，rect为相对屏幕左上角的逻辑区域，为None时截取整个屏幕
+        
+        返回原生分辨率的QPixmap，设备像素比与屏幕一致。
+        """
+        raise NotImplementedError
+
+class QtCaptureBackend(CaptureBackend):
+    """默认后端：通过QScreen.grabWindow截取真实屏幕"""
+    name = 'qt'
+    
+    def __init__(self, topology):
+        self.topology = topology
+        self._screens = None
+        self.topology.changed.connect(self.invalidate)
+        
+    def invalidate(self):
+        self._screens = None
+        
+    def screens(self):
+        if self._screens is None:
+            self._screens = [
+                ScreenInfo(screen.geometry(), screen.devicePixelRatio(), screen.name(), screen)
+                for screen in self.topology.screens()
+            ]
+        return self._screens
+        
+    def virtualGeometry(self):
+        return self.topology.virtualGeometry()
+        
+    def grabScreen(self, screen, rect=None):
+        if rect is None:
+            return screen.handle.grabWindow(0)
+        return screen.handle.grabWindow(0, rect.x(), rect.y(), rect.width(), rect.height())
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """合成后端：按给定的屏幕布局生成确定的画面，不需要真实显示器
+    
+    可以在QT_QPA_PLATFORM=offscreen下运行，用于基准测试和回归测试。
+    layout为'horizontal'、'vertical'或'staggered'，也可以直接传入geometries。
+    """
+    name = 'synthetic'
+    
+    LAYOUTS = ('horizontal', 'vertical', 'staggered')
+    
+    def __init__(self, screen_count=2, screen_size=QSize(1920, 1080), layout='horizontal',
+                 device_pixel_ratios=None, geometries=None, seed=0, windows_per_screen=12):
+        if geometries is None:
+            geometries = self.layoutGeometries(screen_count, screen_size, layout)
+        if device_pixel_ratios is None:
+            device_pixel_ratios = [1.0] * len(geometries)
+        elif not isinstance(device_pixel_ratios, (list, tuple)):
+            device_pixel_ratios = [device_pixel_ratios] * len(geometries)
+            
+        self.seed = seed
+        self.windows_per_screen = windows_per_screen
+        self._screens = [
+            ScreenInfo(geometry, device_pixel_ratios[index], f'synthetic-{index}')
+            for index, geometry in enumerate(geometries)
+        ]
+        # 每个屏幕的画面只生成一次
+        self._images = {}
+        
+    @classmethod
+    def layoutGeometries(cls, screen_count, screen_size, layout):
+        """按布局名称计算各屏幕的逻辑区域"""
+        geometries = []
+        width, height = screen_size.width(), screen_size.height()
+        for index in range(screen_count):
+            if layout == 'vertical':
+                top_left = QPoint(0, index * height)
+            elif layout == 'staggered':
+                # 每个屏幕向下错开半个屏幕，包围盒中有大片空白
+                top_left = QPoint(index * width, index * height // 2)
+            else:
+                top_left = QPoint(index * width, 0)
+            geometries.append(QRect(top_left, screen_size))
+        return geometries
+        
+    def screens(self):
+        return self._screens
+        
+    def advance(self):
+        """模拟屏幕内容变化：换一个随机种子，下次截图时重新生成画面"""
+        self.seed += 1
+        self._images = {}
+        
+    def screenImage(self, screen):
+        """生成（并缓存）一个屏幕的画面：渐变背景、网格和若干窗口状的矩形"""
+        index = self._screens.index(screen)
+        image = self._images.get(index)
+        if image is not None:
+            return image
+            
+        scale = screen.device_pixel_ratio
+        size = screen.geometry.size()
+        image = QImage(round(size.width() * scale), round(size.height() * scale),
+                       QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(scale)
+        
+        rng = random.Random(self.seed * 1000 + index)
+        painter = QPainter(image)
+        
+        # 背景渐变
+        gradient = QLinearGradient(0, 0, size.width(), size.height())
+        gradient.setColorAt(0, QColor.fromHsv((index * 67) % 360, 120, 200))
+        gradient.setColorAt(1, QColor.fromHsv((index * 67 + 90) % 360, 160, 90))
+        painter.fillRect(QRect(QPoint(0, 0), size), gradient)
+        
+        # 网格，方便检查拼接和缩放是否对齐
+        painter.setPen(QColor(255, 255, 255, 60))
+        for x in range(0, size.width(), 100):
+            painter.drawLine(x, 0, x, size.height())
+        for y in range(0, size.height(), 100):
+            painter.drawLine(0, y, size.width(), y)
+            
+        # 模拟窗口：带标题栏的矩形
+        for _ in range(self.windows_per_screen):
+            w = rng.randint(size.width() // 10, size.width() // 2)
+            h = rng.randint(size.height() // 10, size.height() // 2)
+            x = rng.randint(0, size.width() - w)
+            y = rng.randint(0, size.height() - h)
+            painter.fillRect(x, y, w, h, QColor(rng.randint(200, 255), rng.randint(200, 255), rng.randint(200, 255)))
+            painter.fillRect(x, y, w, 24, QColor(rng.randint(0, 120), rng.randint(0, 120), rng.randint(0, 120)))
+            painter.setPen(QColor(40, 40, 40))
+            painter.drawRect(x, y, w - 1, h - 1)
+            
+        painter.setPen(Qt.GlobalColor.white)
+        painter.setFont(QFont('Arial', 24))
+        painter.drawText(20, 40, screen.name)
+        painter.end()
+        
+        self._images[index] = image
+        return image
+        
+    def grabScreen(self, screen, rect=None):
+        image = self.screenImage(screen)
+        if rect is not None:
+            scale = screen.device_pixel_ratio
+            image = image.copy(round(rect.x() * scale), round(rect.y() * scale),
+                               round(rect.width() * scale), round(rect.height() * scale))
+            image.setDevicePixelRatio(scale)
+        return QPixmap.fromImage(image)
+
+def grab_region(backend, rect, scale=None):
+    """截取全局逻辑坐标中的区域，不需要遮罩窗口
+    
+    只截取与区域相交的屏幕，并且每个屏幕只截取相交的部分；scale的含义同TiledFrame.crop。
+    结果只覆盖区域与各屏幕相交部分的外接矩形，超出屏幕的部分不分配内存。
+    区域不在任何屏幕上时返回None。
+    """
+    parts = []
+    bounds = QRect()
+    for screen in backend.screens():
+        part = screen.geometry.intersected(rect)
+        if part.isEmpty():
+            continue
+        parts.append((screen, part))
+        bounds = bounds.united(part)
+    if not parts:
+        return None
+    grabs = []
+    for screen, part in parts:
+        pixmap = backend.grabScreen(screen, part.translated(-screen.geometry.topLeft()))
+        grabs.append((part.translated(-bounds.topLeft()), pixmap))
+    frame = TiledFrame.fromGrabs(grabs, QRect(QPoint(0, 0), bounds.size()))
+    return frame.crop(frame.bounds, scale)
+
+def create_backend(topology, name=None):
+    """按名称创建截图后端，未指定时读取SCREENSHOT_TOOL_BACKEND环境变量"""
+    if name is None:
+        name = os.environ.get('SCREENSHOT_TOOL_BACKEND', 'qt')
+    if name == SyntheticCaptureBackend.name:
+        return SyntheticCaptureBackend()
+    return QtCaptureBackend(topology)
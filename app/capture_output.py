@@ -0,0 +1,138 @@
+import os
+import math
+import atexit
+import shutil
+import tempfile
+import threading
+from PyQt6.QtCore import QDateTime, QRunnable, QSettings, QThreadPool, QMimeData, QUrl
+from PyQt6.QtGui import QPainter, QPixmap, QColor
+from PyQt6.QtWidgets import QApplication
+
+def copy_to_clipboard(pixmap):
+    """把截图放到剪贴板"""
+    clipboard = QApplication.clipboard()
+    clipboard.clear()
+    clipboard.setPixmap(pixmap)
+
+def default_save_dir():
+    """设置中的存储路径，未设置时返回空字符串"""
+    return QSettings('ScreenshotTool', 'Settings').value('save_path', '')
+
+# 已分配但可能还在后台写入的文件名，写完（无论成功与否）后由SaveImageTask移除
+_reserved_filenames = set()
+_reserved_lock = threading.Lock()
+
+def timestamped_filename(directory, prefix='screenshot', suffix='.png'):
+    """生成带时间戳的文件名，同一秒内的多张截图追加序号"""
+    timestamp = QDateTime.currentDateTime().toString('yyyyMMdd_hhmmss')
+    filename = os.path.join(directory, f'{prefix}_{timestamp}{suffix}')
+    index = 1
+    with _reserved_lock:
+        while filename in _reserved_filenames or os.path.exists(filename):
+            filename = os.path.join(directory, f'{prefix}_{timestamp}_{index}{suffix}')
+            index += 1
+        _reserved_filenames.add(filename)
+    return filename
+
+def release_filename(filename):
+    """文件已经写完或放弃写入，不再需要保留这个文件名"""
+    with _reserved_lock:
+        _reserved_filenames.discard(filename)
+
+class SaveImageTask(QRunnable):
+    """在线程池中把QImage编码并写入文件，PNG编码不占用界面线程"""
+    def __init__(self, image, filename):
+        super().__init__()
+        self.image = image
+        self.filename = filename
+        
+    def run(self):
+        try:
+            if not self.image.save(self.filename, quality=100):
+                print(f"保存截图失败: {self.filename}")
+        except Exception as e:
+            print(f"保存截图时出错: {str(e)}")
+        finally:
+            release_filename(self.filename)
+
+def save_in_background(pixmap, directory=None, prefix='screenshot'):
+    """在后台把截图保存到目录（默认使用设置中的存储路径），返回文件名，未设置路径时返回None"""
+    if directory is None:
+        directory = default_save_dir()
+    if not directory:
+        return None
+    filename = timestamped_filename(directory, prefix)
+    # QPixmap只能在界面线程使用，交给线程池的是QImage
+    QThreadPool.globalInstance().start(SaveImageTask(pixmap.toImage(), filename))
+    return filename
+
+def save_batch_in_background(pixmaps, directory, prefix='screenshot'):
+    """把多张截图分别保存到目录，文件名带序号，返回文件名列表"""
+    filenames = []
+    for index, pixmap in enumerate(pixmaps, 1):
+        filename = timestamped_filename(directory, f'{prefix}_{index:02d}')
+        QThreadPool.globalInstance().start(SaveImageTask(pixmap.toImage(), filename))
+        filenames.append(filename)
+    return filenames
+
+def make_collage(pixmaps, spacing=10, background=QColor(255, 255, 255)):
+    """把多张截图按行排列拼成一张图，每行ceil(sqrt(n))张"""
+    columns = max(1, math.ceil(math.sqrt(len(pixmaps))))
+    rows = [pixmaps[i:i + columns] for i in range(0, len(pixmaps), columns)]
+    width = max(sum(p.width() for p in row) + spacing * (len(row) + 1) for row in rows)
+    height = sum(max(p.height() for p in row) for row in rows) + spacing * (len(rows) + 1)
+    
+    collage = QPixmap(width, height)
+    collage.fill(background)
+    painter = QPainter(collage)
+    y = spacing
+    for row in rows:
+        x = spacing
+        for pixmap in row:
+            painter.drawPixmap(x, y, pixmap)
+            x += pixmap.width() + spacing
+        y += max(p.height() for p in row) + spacing
+    painter.end()
+    return collage
+
+# 上一次批量复制写入文件的临时目录，下一次批量复制或程序退出时删除
+_batch_directory = None
+
+def remove_batch_directory():
+    global _batch_directory
+    if _batch_directory is not None:
+        shutil.rmtree(_batch_directory, ignore_errors=True)
+        _batch_directory = None
+
+atexit.register(remove_batch_directory)
+
+def copy_batch_to_clipboard(pixmaps):
+    """一次复制多张截图：剪贴板中同时放入拼图和各张截图的文件
+    
+    粘贴到图片编辑器时得到拼图，粘贴到文件管理器或聊天窗口时得到单独的文件。
+    文件在线程池中并行写入，全部写完后才放到剪贴板，粘贴时不会拿到没写完的文件。
+    """
+    global _batch_directory
+    remove_batch_directory()
+    directory = _batch_directory = tempfile.mkdtemp(prefix='screenshot_batch_')
+    # 使用单独的线程池，只等待这一批文件
+    pool = QThreadPool()
+    filenames = []
+    for index, pixmap in enumerate(pixmaps, 1):
+        filename = timestamped_filename(directory, f'screenshot_{index:02d}')
+        pool.start(SaveImageTask(pixmap.toImage(), filename))
+        filenames.append(filename)
+    pool.waitForDone()
+    filenames = [filename for filename in filenames if os.path.exists(filename)]
+    mime_data = QMimeData()
+    mime_data.setImageData(make_collage(pixmaps).toImage())
+    mime_data.setUrls([QUrl.fromLocalFile(filename) for filename in filenames])
+    clipboard = QApplication.clipboard()
+    clipboard.clear()
+    clipboard.setMimeData(mime_data)
+    return filenames
+
+def deliver(pixmap):
+    """复制到剪贴板，设置了存储路径时同时在后台保存，返回保存的文件名"""
+    copy_to_clipboard(pixmap)
+    return save_in_background(pixmap)
@@ -0,0 +1,215 @@
+"""命令行模式：不创建悬浮图标和编辑器，执行一次截图或图片处理后退出
+
+    python main.py capture --region 0,0,800,600 --out shot.png
+    python main.py annotate shot.png --out marked.png --color red --rect 10,10,200,100 --arrow 300,300,220,120
+
+为了让自动化脚本频繁调用时启动足够快，这里只在模块顶层导入标准库：
+capture只加载QtGui和截图后端（不加载QtWidgets），annotate只用Pillow，完全不加载Qt。
+加上 --stats 时在标准错误输出中打印耗时和峰值内存。
+"""
+import os
+import sys
+import math
+import argparse
+
+def parse_numbers(text, count):
+    """解析逗号分隔的count个数字"""
+    try:
+        values = [int(float(part)) for part in text.split(',')]
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise argparse.ArgumentTypeError(f"需要 {count} 个逗号分隔的数字: {text}")
+    return values
+
+def write_image(image, out, quality=-1):
+    """保存QImage，out为 - 时把PNG写到标准输出"""
+    if out == '-':
+        from PyQt6.QtCore import QBuffer, QIODevice
+        buffer = QBuffer()
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        ok = image.save(buffer, 'PNG')
+        sys.stdout.buffer.write(bytes(buffer.data()))
+        sys.stdout.buffer.flush()
+        return ok
+    return image.save(out, None, quality)
+
+def command_capture(args):
+    from PyQt6.QtGui import QGuiApplication
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    from .screen_topology import ScreenTopology
+    from .capture_backend import create_backend, grab_region, MAX_REGION_SIZE
+    
+    backend = create_backend(ScreenTopology(), args.backend)
+    if args.region is None:
+        rect = backend.virtualGeometry()
+    else:
+        from PyQt6.QtCore import QRect
+        rect = QRect(*args.region)
+    if rect.width() <= 0 or rect.height() <= 0:
+        print("区域的宽和高必须大于0", file=sys.stderr)
+        return 1
+    if rect.width() > MAX_REGION_SIZE or rect.height() > MAX_REGION_SIZE:
+        print(f"区域的宽和高不能超过 {MAX_REGION_SIZE}", file=sys.stderr)
+        return 1
+        
+    screenshot = grab_region(backend, rect, args.scale)
+    if screenshot is None:
+        print(f"区域不在任何屏幕上: {rect.x()},{rect.y()},{rect.width()},{rect.height()}", file=sys.stderr)
+        return 1
+    if not write_image(screenshot.toImage(), args.out, args.quality):
+        print(f"保存截图失败: {args.out}", file=sys.stderr)
+        return 1
+    return 0
+
+def draw_arrow(draw, points, color, width):
+    """箭头与编辑器一致：主线加两条30度的短边，短边长度为线宽的3倍"""
+    x1, y1, x2, y2 = points
+    length = math.hypot(x2 - x1, y2 - y1)
+    if length < 1:
+        return
+    draw.line(points, fill=color, width=width)
+    angle = math.atan2(y2 - y1, x2 - x1)
+    size = width * 3
+    for side in (math.pi / 6, -math.pi / 6):
+        draw.line((x2, y2, x2 - size * math.cos(angle + side), y2 - size * math.sin(angle + side)),
+                  fill=color, width=width)
+
+def apply_mosaic(image, box, block_size):
+    """马赛克：把区域缩小再用最近邻放大，一次完成而不是逐块求平均"""
+    from PIL import Image
+    x, y, w, h = box
+    box = (max(0, x), max(0, y), min(image.width, x + w), min(image.height, y + h))
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return
+    region = image.crop(box)
+    small = region.resize((max(1, region.width // block_size), max(1, region.height // block_size)),
+                          Image.Resampling.BOX)
+    image.paste(small.resize(region.size, Image.Resampling.NEAREST), box[:2])
+
+def load_font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # 旧版本Pillow的默认字体不能指定大小
+        return ImageFont.load_default()
+
+class OperationAction(argparse.Action):
+    """把标注参数按命令行中的顺序记录到同一个列表，样式参数只影响其后的标注"""
+    def __call__(self, parser, namespace, values, option_string=None):
+        operations = getattr(namespace, 'operations', None)
+        if operations is None:
+            operations = []
+            setattr(namespace, 'operations', operations)
+        operations.append((self.dest, values))
+
+def command_annotate(args):
+    import io
+    from PIL import Image, ImageDraw, ImageColor
+    
+    source = io.BytesIO(sys.stdin.buffer.read()) if args.input == '-' else args.input
+    image = Image.open(source)
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    draw = ImageDraw.Draw(image)
+    
+    color = ImageColor.getrgb('red')
+    width = 3
+    font_size = 20
+    for kind, value in args.operations or ():
+        if kind == 'color':
+            color = ImageColor.getrgb(value)
+        elif kind == 'width':
+            width = max(1, value)
+        elif kind == 'font_size':
+            font_size = max(1, value)
+        elif kind == 'rect':
+            x, y, w, h = parse_numbers(value, 4)
+            draw.rectangle((x, y, x + w - 1, y + h - 1), outline=color, width=width)
+        elif kind == 'ellipse':
+            x, y, w, h = parse_numbers(value, 4)
+            draw.ellipse((x, y, x + w - 1, y + h - 1), outline=color, width=width)
+        elif kind == 'line':
+            draw.line(parse_numbers(value, 4), fill=color, width=width)
+        elif kind == 'arrow':
+            draw_arrow(draw, parse_numbers(value, 4), color, width)
+        elif kind == 'text':
+            position, _, text = value.partition(':')
+            x, y = parse_numbers(position, 2)
+            draw.text((x, y), text, fill=color, font=load_font(font_size))
+        elif kind == 'mosaic':
+            apply_mosaic(image, parse_numbers(value, 4), width * 5)
+            
+    if args.out == '-':
+        image.save(sys.stdout.buffer, 'PNG')
+        sys.stdout.buffer.flush()
+    else:
+        save_args = {'quality': args.quality} if args.quality >= 0 else {}
+        if image.mode == 'RGBA' and os.path.splitext(args.out)[1].lower() in ('.jpg', '.jpeg'):
+            image = image.convert('RGB')
+        image.save(args.out, **save_args)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='main.py', description='截图工具命令行模式')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    capture = subparsers.add_parser('capture', help='截取区域并保存')
+    capture.add_argument('--region', type=lambda text: parse_numbers(text, 4), default=None,
+                         help='全局逻辑坐标中的区域 x,y,w,h，默认为整个虚拟桌面')
+    capture.add_argument('--out', required=True, help='输出文件，格式由扩展名决定；- 表示PNG写到标准输出')
+    capture.add_argument('--scale', type=float, default=None,
+                         help='每个逻辑像素对应的像素数，默认使用屏幕的原生分辨率')
+    capture.add_argument('--quality', type=int, default=-1, help='JPEG/WebP质量 0-100')
+    capture.add_argument('--backend', choices=['qt', 'synthetic'], default=None,
+                         help='截图后端，默认读取SCREENSHOT_TOOL_BACKEND环境变量')
+    capture.add_argument('--stats', action='store_true', help='在标准错误输出中打印耗时和峰值内存')
+    capture.set_defaults(handler=command_capture)
+    
+    annotate = subparsers.add_parser('annotate', help='在图片上添加标注并保存',
+                                     epilog='标注按命令行中的顺序绘制，--color/--width/--font-size 影响其后的标注')
+    annotate.add_argument('input', help='输入图片，- 表示从标准输入读取')
+    annotate.add_argument('--out', required=True, help='输出文件；- 表示PNG写到标准输出')
+    annotate.add_argument('--quality', type=int, default=-1, help='JPEG/WebP质量 0-100')
+    annotate.add_argument('--color', action=OperationAction, help='颜色，如 red 或 #ff0000')
+    annotate.add_argument('--width', action=OperationAction, type=int, help='线宽（马赛克块为线宽的5倍）')
+    annotate.add_argument('--font-size', dest='font_size', action=OperationAction, type=int, help='文字大小')
+    annotate.add_argument('--rect', action=OperationAction, metavar='X,Y,W,H', help='矩形')
+    annotate.add_argument('--ellipse', action=OperationAction, metavar='X,Y,W,H', help='圆形')
+    annotate.add_argument('--line', action=OperationAction, metavar='X1,Y1,X2,Y2', help='直线')
+    annotate.add_argument('--arrow', action=OperationAction, metavar='X1,Y1,X2,Y2', help='箭头')
+    annotate.add_argument('--text', action=OperationAction, metavar='X,Y:文字', help='文字')
+    annotate.add_argument('--mosaic', action=OperationAction, metavar='X,Y,W,H', help='马赛克')
+    annotate.add_argument('--stats', action='store_true', help='在标准错误输出中打印耗时和峰值内存')
+    annotate.set_defaults(handler=command_annotate, operations=None)
+    return parser
+
+def peak_memory_mb():
+    """当前进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上单位为字节，Linux上为KB
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run(argv):
+    """执行一条命令，返回进程退出码"""
+    import time
+    start = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    try:
+        code = args.handler(args)
+    except argparse.ArgumentTypeError as e:
+        print(f"参数错误: {str(e)}", file=sys.stderr)
+        code = 2
+    except Exception as e:
+        print(f"执行 {args.command} 时出错: {str(e)}", file=sys.stderr)
+        code = 1
+    if args.stats:
+        peak = peak_memory_mb()
+        peak_text = f"{peak:.1f} MB" if peak is not None else '未知'
+        print(f"[stats] {args.command}: {(time.perf_counter() - start) * 1000:.1f} ms，峰值内存 {peak_text}",
+              file=sys.stderr)
+    return code
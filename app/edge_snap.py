@@ -0,0 +1,148 @@
+import re
+import threading
+from PyQt6.QtCore import QThread, QRect, pyqtSignal
+from .image_ops import qimage_to_gray
+
+def find_runs(image, min_length):
+    """在二值图的每一行中查找长度不小于min_length的连续白色线段，返回(行, 起点, 终点)"""
+    width, height = image.size
+    data = image.tobytes()
+    pattern = re.compile(rb'\xff{%d,}' % min_length)
+    runs = []
+    for y in range(height):
+        row = data[y * width:(y + 1) * width]
+        if b'\xff' * min_length not in row:
+            continue
+        for match in pattern.finditer(row):
+            runs.append((y, match.start(), match.end() - 1))
+    return runs
+
+def merge_runs(runs, tolerance):
+    """合并相邻行中几乎重合的线段（边缘检测得到的线通常有两个像素宽）"""
+    merged = []
+    last_by_span = {}
+    for y, start, end in sorted(runs):
+        key = (start // tolerance, end // tolerance)
+        previous = last_by_span.get(key)
+        if previous is not None and y - previous[0] <= tolerance:
+            last_by_span[key] = (y, start, end)
+            continue
+        last_by_span[key] = (y, start, end)
+        merged.append((y, start, end))
+    return merged
+
+def covered(segments, position, start, end, tolerance):
+    """检查在position附近是否有线段覆盖[start, end]"""
+    for offset in range(-tolerance, tolerance + 1):
+        for seg_start, seg_end in segments.get(position + offset, ()):
+            if seg_start <= start + tolerance and seg_end >= end - tolerance:
+                return True
+    return False
+
+def detect_rectangles(gray, min_size=12, threshold=40, tolerance=2):
+    """在灰度图上检测矩形边框（窗口、按钮、面板等界面元素）
+    
+    先用Pillow的边缘滤波得到二值边缘图，再用正则在每一行（以及转置后的每一列）
+    中批量查找长直线，最后把上下边与左右边配对成矩形。
+    """
+    from PIL import ImageFilter, Image
+    edges = gray.filter(ImageFilter.FIND_EDGES).point(lambda v: 255 if v > threshold else 0)
+    
+    horizontal = merge_runs(find_runs(edges, min_size), tolerance)
+    vertical = merge_runs(find_runs(edges.transpose(Image.Transpose.TRANSPOSE), min_size), tolerance)
+    
+    # 竖线按x坐标索引：x -> [(y1, y2)]
+    vertical_by_x = {}
+    for x, y1, y2 in vertical:
+        vertical_by_x.setdefault(x, []).append((y1, y2))
+        
+    # 横线按(起点, 终点)分桶，只在相近的桶中寻找配对的底边
+    buckets = {}
+    for y, x1, x2 in horizontal:
+        buckets.setdefault((x1 // tolerance, x2 // tolerance), []).append((y, x1, x2))
+        
+    rects = set()
+    for (bx1, bx2), tops in buckets.items():
+        candidates = []
+        for dx1 in (-1, 0, 1):
+            for dx2 in (-1, 0, 1):
+                candidates.extend(buckets.get((bx1 + dx1, bx2 + dx2), ()))
+        candidates.sort()
+        for top_y, x1, x2 in tops:
+            for bottom_y, bx1_, bx2_ in candidates:
+                if bottom_y - top_y < min_size:
+                    continue
+                left = max(x1, bx1_)
+                right = min(x2, bx2_)
+                if right - left < min_size:
+                    continue
+                if covered(vertical_by_x, left, top_y, bottom_y, tolerance) and \
+                   covered(vertical_by_x, right, top_y, bottom_y, tolerance):
+                    rects.add((left, top_y, right, bottom_y))
+                    # 同一条顶边只取最近的底边
+                    break
+    return [QRect(left, top, right - left + 1, bottom - top + 1) for left, top, right, bottom in rects]
+
+class RectIndex:
+    """矩形的网格空间索引
+    
+    每个矩形登记到它覆盖的网格中，同一格内按面积从小到大排序，
+    查询时只需检查鼠标所在的一格，返回包含该点的最小矩形。
+    """
+    def __init__(self, rects, cell_size=256):
+        self.cell_size = cell_size
+        self.cells = {}
+        for rect in sorted(rects, key=lambda r: r.width() * r.height()):
+            for cx in range(rect.left() // cell_size, rect.right() // cell_size + 1):
+                for cy in range(rect.top() // cell_size, rect.bottom() // cell_size + 1):
+                    self.cells.setdefault((cx, cy), []).append(rect)
+        self.count = len(rects)
+        
+    def rectAt(self, point):
+        for rect in self.cells.get((point.x() // self.cell_size, point.y() // self.cell_size), ()):
+            if rect.contains(point):
+                return rect
+        return None
+
+class SnapDetector(QThread):
+    """在后台线程中检测冻结截图里的矩形，完成后发出detected信号
+    
+    images为(块在虚拟桌面中的逻辑区域, QImage)列表，QImage可以安全地在线程间传递。
+    """
+    detected = pyqtSignal(int, object)
+    
+    def __init__(self, serial, images, downsample=2, parent=None):
+        super().__init__(parent)
+        self.serial = serial
+        self.images = images
+        self.downsample = downsample
+        self.cancel_event = threading.Event()
+        
+    def cancel(self):
+        self.cancel_event.set()
+        
+    def run(self):
+        try:
+            rects = []
+            for tile_rect, image in self.images:
+                if self.cancel_event.is_set():
+                    return
+                gray = qimage_to_gray(image)
+                factor = self.downsample
+                if factor > 1:
+                    gray = gray.reduce(factor)
+                # 检测结果从降采样后的像素换算回虚拟桌面的逻辑坐标
+                scale = factor / image.devicePixelRatio()
+                for rect in detect_rectangles(gray):
+                    if self.cancel_event.is_set():
+                        return
+                    rects.append(QRect(tile_rect.x() + int(rect.x() * scale),
+                                       tile_rect.y() + int(rect.y() * scale),
+                                       max(1, int(rect.width() * scale)),
+                                       max(1, int(rect.height() * scale))))
+                # 整个屏幕也作为候选
+                rects.append(QRect(tile_rect))
+            if not self.cancel_event.is_set():
+                self.detected.emit(self.serial, RectIndex(rects))
+        except Exception as e:
+            print(f"检测界面矩形时出错: {str(e)}")
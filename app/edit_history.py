@@ -0,0 +1,291 @@
+"""编辑窗口的撤销/重做历史
+
+每一步只保存与上一步的差异。标注列表是不可修改的元组，直接保存引用；
+底图发生变化（旋转、调整颜色）时，把新旧底图分成固定大小的块，只保存变化了的块，用zlib压缩。
+撤销和重做都是交换：把保存的块写回底图，同时把被替换下来的块保存到这一步中，
+因此每次撤销/重做的开销只与这一步改动的大小有关，与历史的长度无关。
+
+内存中的块数据超过预算时，把最早的步骤的块写入临时文件，用到时再读回。
+读回或丢弃的块在文件中占用的空间记入空闲列表，之后写入的块优先复用，文件末尾的空闲空间直接截掉。
+"""
+import sys
+import zlib
+import bisect
+import tempfile
+from PyQt6.QtCore import QRect, QSize
+from PyQt6.QtGui import QImage, QPixmap, QPainter
+from . import metrics
+
+TILE_SIZE = 256
+TILE_FORMAT = QImage.Format.Format_ARGB32_Premultiplied
+
+def encode_tile(image):
+    """把块压缩为字节数据，块的尺寸由调用方记录"""
+    image = image.convertToFormat(TILE_FORMAT)
+    return zlib.compress(image.constBits().asstring(image.sizeInBytes()), 1)
+
+def decode_tile(data, width, height):
+    return QImage(zlib.decompress(data), width, height, width * 4, TILE_FORMAT).copy()
+
+def tile_rects(size, tile_size=TILE_SIZE):
+    for y in range(0, size.height(), tile_size):
+        for x in range(0, size.width(), tile_size):
+            yield QRect(x, y, min(tile_size, size.width() - x), min(tile_size, size.height() - y))
+
+def changed_tiles(old, new, tile_size=TILE_SIZE):
+    """比较两张同样大小的QImage，返回内容不同的块"""
+    old = old.convertToFormat(TILE_FORMAT)
+    new = new.convertToFormat(TILE_FORMAT)
+    old_data = old.constBits().asstring(old.sizeInBytes())
+    new_data = new.constBits().asstring(new.sizeInBytes())
+    stride = old.bytesPerLine()
+    rects = []
+    for rect in tile_rects(old.size(), tile_size):
+        left = rect.x() * 4
+        right = (rect.x() + rect.width()) * 4
+        for row in range(rect.top(), rect.bottom() + 1):
+            offset = row * stride
+            if old_data[offset + left:offset + right] != new_data[offset + left:offset + right]:
+                rects.append(rect)
+                break
+    return rects
+
+class TileDelta:
+    """一步中底图另一侧的内容：size是那一侧底图的尺寸，tiles为 (x, y, w, h) -> 压缩数据
+    
+    写入临时文件的块记录在spilled中：(x, y, w, h) -> (偏移, 长度)。
+    """
+    __slots__ = ('size', 'tiles', 'spilled')
+    
+    def __init__(self, size):
+        self.size = QSize(size)
+        self.tiles = {}
+        self.spilled = {}
+        
+    def memoryBytes(self):
+        return sum(len(data) for data in self.tiles.values())
+        
+    def diskBytes(self):
+        return sum(length for _, length in self.spilled.values())
+
+class HistoryStep:
+    __slots__ = ('annotations', 'delta')
+    
+    def __init__(self, annotations, delta=None):
+        self.annotations = annotations
+        self.delta = delta
+
+class EditHistory:
+    """AnnotationScene的撤销/重做历史，budget_bytes为内存中块数据的上限"""
+    
+    def __init__(self, scene, budget_bytes=256 * 1024 * 1024, tile_size=TILE_SIZE):
+        self.scene = scene
+        self.budget_bytes = budget_bytes
+        self.tile_size = tile_size
+        # 最近一次记录时的底图，场景的底图换成别的对象时说明底图发生了变化
+        self.base = scene.base
+        self.steps = [HistoryStep(scene.annotations)]
+        self.index = 0
+        self.spill_file = None
+        # 临时文件中的空闲空间[(偏移, 长度)]，按偏移排序，相邻的空间已合并
+        self.free_slots = []
+        self.spill_end = 0
+        # 分别累计，报告占用时不需要遍历所有步骤
+        self.memory_bytes = sys.getsizeof(scene.annotations)
+        self.disk_bytes = 0
+        
+    def canUndo(self):
+        return self.index > 0
+        
+    def canRedo(self):
+        return self.index < len(self.steps) - 1
+        
+    def push(self):
+        """把场景当前的状态记录为新的一步"""
+        start = metrics.now()
+        for step in self.steps[self.index + 1:]:
+            self.forget(step)
+        del self.steps[self.index + 1:]
+        delta = None
+        if self.scene.base is not self.base:
+            delta = self.diffBase(self.base, self.scene.base)
+            self.base = self.scene.base
+        step = HistoryStep(self.scene.annotations, delta)
+        self.memory_bytes += sys.getsizeof(step.annotations)
+        if delta is not None:
+            self.memory_bytes += delta.memoryBytes()
+        self.steps.append(step)
+        self.index += 1
+        self.enforceBudget()
+        metrics.record('history_push', metrics.elapsed_ms(start))
+        metrics.record('history_memory', self.memoryBytes() / (1024 * 1024), 'MB')
+        
+    def diffBase(self, old, new):
+        """保存旧底图中与新底图不同的块，尺寸不同时保存整张旧底图"""
+        delta = TileDelta(old.size())
+        old_image = old.toImage()
+        if old.size() == new.size():
+            rects = changed_tiles(old_image, new.toImage(), self.tile_size)
+        else:
+            rects = list(tile_rects(old.size(), self.tile_size))
+        for rect in rects:
+            delta.tiles[(rect.x(), rect.y(), rect.width(), rect.height())] = encode_tile(old_image.copy(rect))
+        return delta
+        
+    def undo(self):
+        if self.scene.base is not self.base:
+            # 还没有记录的底图变化（调整颜色）先记为一步，这次撤销的就是它
+            self.push()
+        if not self.canUndo():
+            return False
+        start = metrics.now()
+        step = self.steps[self.index]
+        self.index -= 1
+        self.apply(step, self.steps[self.index].annotations)
+        metrics.record('history_undo', metrics.elapsed_ms(start))
+        return True
+        
+    def redo(self):
+        if not self.canRedo():
+            return False
+        start = metrics.now()
+        self.index += 1
+        step = self.steps[self.index]
+        self.apply(step, step.annotations)
+        metrics.record('history_redo', metrics.elapsed_ms(start))
+        return True
+        
+    def apply(self, step, annotations):
+        """恢复标注列表，有底图变化时与这一步保存的块交换"""
+        if step.delta is None:
+            self.scene.setAnnotations(annotations)
+            return
+        delta = step.delta
+        self.load(delta)
+        base = self.scene.base
+        if delta.size == base.size():
+            other = TileDelta(base.size())
+            tiles = []
+            for key, data in delta.tiles.items():
+                rect = QRect(*key)
+                other.tiles[key] = encode_tile(base.copy(rect).toImage())
+                tiles.append((rect, decode_tile(data, rect.width(), rect.height())))
+            self.scene.setAnnotations(annotations)
+            self.scene.patchBase(tiles)
+        else:
+            # 旋转前后尺寸不同，整张交换
+            other = TileDelta(base.size())
+            image = base.toImage()
+            for rect in tile_rects(base.size(), self.tile_size):
+                other.tiles[(rect.x(), rect.y(), rect.width(), rect.height())] = encode_tile(image.copy(rect))
+            restored = QImage(delta.size, TILE_FORMAT)
+            painter = QPainter(restored)
+            for key, data in delta.tiles.items():
+                painter.drawImage(key[0], key[1], decode_tile(data, key[2], key[3]))
+            painter.end()
+            self.scene.setBase(QPixmap.fromImage(restored), annotations)
+        self.memory_bytes += other.memoryBytes() - delta.memoryBytes()
+        step.delta = other
+        self.base = self.scene.base
+        self.enforceBudget()
+        
+    def forget(self, step):
+        """丢弃的步骤（撤销后又做了新的修改）不再计入占用，临时文件中的数据不再使用"""
+        self.memory_bytes -= sys.getsizeof(step.annotations)
+        if step.delta is not None:
+            self.memory_bytes -= step.delta.memoryBytes()
+            self.disk_bytes -= step.delta.diskBytes()
+            for offset, length in step.delta.spilled.values():
+                self.releaseSlot(offset, length)
+            step.delta.spilled = {}
+            
+    def memoryBytes(self):
+        """历史在内存中占用的字节数（块数据和标注列表）"""
+        return self.memory_bytes
+        
+    def diskBytes(self):
+        """临时文件中仍在使用的块数据的字节数"""
+        return self.disk_bytes
+        
+    def fileBytes(self):
+        """临时文件的大小，包括还没有被复用的空闲空间"""
+        return self.spill_end
+        
+    def allocateSlot(self, length):
+        """在临时文件中分配length字节，优先使用空闲空间（首次适配），返回偏移"""
+        for index, (offset, free_length) in enumerate(self.free_slots):
+            if free_length >= length:
+                if free_length == length:
+                    del self.free_slots[index]
+                else:
+                    self.free_slots[index] = (offset + length, free_length - length)
+                return offset
+        offset = self.spill_end
+        self.spill_end += length
+        return offset
+        
+    def releaseSlot(self, offset, length):
+        """归还临时文件中的空间，与相邻的空闲空间合并，位于文件末尾时截掉"""
+        slots = self.free_slots
+        index = bisect.bisect(slots, (offset, length))
+        if index < len(slots) and offset + length == slots[index][0]:
+            length += slots.pop(index)[1]
+        if index > 0 and slots[index - 1][0] + slots[index - 1][1] == offset:
+            index -= 1
+            offset, length = slots[index][0], slots[index][1] + length
+            del slots[index]
+        if offset + length == self.spill_end:
+            self.spill_end = offset
+            try:
+                self.spill_file.truncate(offset)
+            except Exception as e:
+                print(f"截短历史记录临时文件出错: {str(e)}")
+            return
+        slots.insert(index, (offset, length))
+        
+    def enforceBudget(self):
+        """内存超过预算时从最早的步骤开始把块写入临时文件"""
+        excess = self.memoryBytes() - self.budget_bytes
+        for step in self.steps:
+            if excess <= 0:
+                break
+            if step.delta is not None and step.delta.tiles:
+                excess -= self.spill(step.delta)
+                
+    def spill(self, delta):
+        try:
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile(prefix='screenshot_history_')
+            spilled = {}
+            released = 0
+            for key, data in delta.tiles.items():
+                offset = self.allocateSlot(len(data))
+                self.spill_file.seek(offset)
+                self.spill_file.write(data)
+                spilled[key] = (offset, len(data))
+                released += len(data)
+            delta.spilled.update(spilled)
+            delta.tiles = {}
+            self.memory_bytes -= released
+            self.disk_bytes += released
+            return released
+        except Exception as e:
+            print(f"写入历史记录临时文件出错: {str(e)}")
+            return 0
+            
+    def load(self, delta):
+        """把写入临时文件的块读回内存"""
+        for key, (offset, length) in delta.spilled.items():
+            self.spill_file.seek(offset)
+            delta.tiles[key] = self.spill_file.read(length)
+            self.releaseSlot(offset, length)
+            self.memory_bytes += length
+            self.disk_bytes -= length
+        delta.spilled = {}
+        
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        self.free_slots = []
+        self.spill_end = 0
@@ -1,17 +1,220 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                            QColorDialog, QSpinBox, QLabel, QSlider, QFileDialog,
-                           QLineEdit, QComboBox, QToolButton, QFontDialog, QFrame, QMenu)
-from PyQt6.QtCore import Qt, QPoint, QRect, QLineF, QPointF, QMimeData, QUrl, QTimer, QSize, QByteArray, QBuffer
-from PyQt6.QtGui import QPainter, QPen, QColor, QImage, QPixmap, QFont, QTransform, QCursor, QDrag, QFontMetrics, QIcon
+                           QComboBox, QToolButton, QFontDialog, QFrame, QMenu)
+from PyQt6.QtCore import (Qt, QPoint, QRect, QRectF, QLineF, QPointF, QMimeData, QUrl, QTimer, QSize, QByteArray, QBuffer,
+                          pyqtSignal)
+from PyQt6.QtGui import (QPainter, QPen, QColor, QImage, QPixmap, QFont, QTransform, QCursor, QDrag,
+                         QFontMetricsF, QIcon, QPainterPath, QKeySequence)
 from PyQt6.QtWidgets import QApplication
 import os
 import pyperclip
 from PIL import Image, ImageEnhance
 import io
-import math
 from .cursor_rules import CursorRules
+from .image_canvas import ImageCanvas
+from . import metrics
+from . import stroke_processing
+from . import text_layout
+from .annotations import (AnnotationScene, StrokeAnnotation, RectAnnotation, EllipseAnnotation,
+                          ArrowAnnotation, TextAnnotation, MosaicAnnotation, shape_pen, align_rect, pixelate)
+from .edit_history import EditHistory
 from PyQt6.QtCore import QSettings, QDateTime
 
+class TextEditArea(QWidget):
+    """文本框中的输入区域，支持多行（Shift+回车换行）和自动换行
+    
+    不使用QLineEdit自己的排版：文字按text_layout排版后绘制，写入截图时使用同一个排版结果。
+    排版以图片像素为单位，scale为画布的显示比例，字号在文本框大小内二分查找。
+    """
+    textChanged = pyqtSignal()
+    returnPressed = pyqtSignal()
+    # 文字与文本框边缘的距离（屏幕像素）
+    PADDING = 4
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._text = ''
+        self.cursor = 0
+        # 输入法正在组字的内容，只显示不计入文字
+        self.preedit = ''
+        self.base_font = QFont('Arial', 12)
+        self.color = QColor(255, 0, 0)
+        self.scale = 1.0
+        self.pixel_size = None
+        self.text_layout = None
+        self.cursor_rect = QRect()
+        # 按键的时刻，重绘完成后记录按键到画面更新的耗时
+        self.keystroke_start = None
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.setAttribute(Qt.WidgetAttribute.WA_InputMethodEnabled)
+        self.setMouseTracking(True)
+        
+    def text(self):
+        return self._text
+        
+    def setText(self, text):
+        self._text = text
+        self.cursor = len(text)
+        self.preedit = ''
+        self.textEdited()
+        
+    def clear(self):
+        self.setText('')
+        
+    def font(self):
+        """当前排版使用的字体（像素字号，图片像素）"""
+        if self.text_layout is not None:
+            return QFont(self.text_layout.font)
+        return QFont(self.base_font)
+        
+    def setBaseFont(self, font):
+        """设置字体，字号由文本框大小决定"""
+        self.base_font = QFont(font)
+        self.pixel_size = None
+        self.relayout()
+        
+    def setScale(self, scale):
+        self.scale = scale if scale > 0 else 1.0
+        self.relayout()
+        
+    def wrapWidth(self):
+        """换行宽度（图片像素）"""
+        return max(1.0, (self.width() - 2 * self.PADDING) / self.scale)
+        
+    def textOrigin(self):
+        """第一行文字左上角在控件中的位置"""
+        return QPoint(self.PADDING, self.PADDING)
+        
+    def displayText(self):
+        return self._text[:self.cursor] + self.preedit + self._text[self.cursor:]
+        
+    def relayout(self):
+        """按文本框的大小重新查找字号并排版，字号不变时只重绘变化了的行"""
+        height = max(1.0, (self.height() - 2 * self.PADDING) / self.scale)
+        previous = self.text_layout
+        previous_cursor = self.cursor_rect
+        self.pixel_size, self.text_layout = text_layout.fit_text(
+            self.displayText(), self.base_font, self.wrapWidth(), height, hint=self.pixel_size)
+        self.cursor_rect = self.cursorRect()
+        if previous is None or previous.entry is not self.text_layout.entry:
+            self.update()
+            return
+        top = self.text_layout.firstDifference(previous) * self.text_layout.line_height * self.scale
+        self.update(QRect(0, int(top) + self.PADDING - 1, self.width(), self.height()))
+        self.update(previous_cursor)
+        self.update(self.cursor_rect)
+        
+    def moveCursor(self, cursor):
+        self.cursor = cursor
+        self.update(self.cursor_rect)
+        self.cursor_rect = self.cursorRect()
+        self.update(self.cursor_rect)
+        
+    def textEdited(self):
+        self.relayout()
+        self.textChanged.emit()
+        
+    def insert(self, text):
+        self._text = self._text[:self.cursor] + text + self._text[self.cursor:]
+        self.cursor += len(text)
+        self.textEdited()
+        
+    def keyPressEvent(self, event):
+        self.keystroke_start = metrics.now()
+        key = event.key()
+        shift = event.modifiers() & Qt.KeyboardModifier.ShiftModifier
+        if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            if shift:
+                self.insert('\n')
+            else:
+                self.returnPressed.emit()
+        elif key == Qt.Key.Key_Backspace:
+            if self.cursor > 0:
+                self._text = self._text[:self.cursor - 1] + self._text[self.cursor:]
+                self.cursor -= 1
+                self.textEdited()
+        elif key == Qt.Key.Key_Delete:
+            if self.cursor < len(self._text):
+                self._text = self._text[:self.cursor] + self._text[self.cursor + 1:]
+                self.textEdited()
+        elif key == Qt.Key.Key_Left:
+            self.moveCursor(max(0, self.cursor - 1))
+        elif key == Qt.Key.Key_Right:
+            self.moveCursor(min(len(self._text), self.cursor + 1))
+        elif key == Qt.Key.Key_Home:
+            self.moveCursor(self._text.rfind('\n', 0, self.cursor) + 1)
+        elif key == Qt.Key.Key_End:
+            end = self._text.find('\n', self.cursor)
+            self.moveCursor(len(self._text) if end < 0 else end)
+        elif event.matches(QKeySequence.StandardKey.Paste):
+            self.insert(QApplication.clipboard().text())
+        elif event.text() and event.text().isprintable():
+            self.insert(event.text())
+        else:
+            # Esc等按键交给文本框处理
+            self.keystroke_start = None
+            event.ignore()
+            
+    def inputMethodEvent(self, event):
+        self.keystroke_start = metrics.now()
+        self.preedit = event.preeditString()
+        if event.commitString():
+            self.insert(event.commitString())
+        else:
+            self.textEdited()
+        event.accept()
+        
+    def inputMethodQuery(self, query):
+        if query == Qt.InputMethodQuery.ImCursorRectangle:
+            return self.cursorRect()
+        return super().inputMethodQuery(query)
+        
+    def cursorRect(self):
+        """光标在控件中的区域"""
+        if self.text_layout is None:
+            return QRect(self.PADDING, self.PADDING, 1, self.height() - 2 * self.PADDING)
+        point = self.text_layout.cursorPos(self.cursor + len(self.preedit))
+        return QRectF(self.PADDING + point.x() * self.scale, self.PADDING + point.y() * self.scale,
+                      1, self.text_layout.line_height * self.scale).toAlignedRect()
+                      
+    def mousePressEvent(self, event):
+        parent = self.parentWidget()
+        if parent is not None and parent.getResizeCorner(self.mapTo(parent, event.pos())):
+            # 角落用于调整文本框大小
+            event.ignore()
+            return
+        self.setFocus()
+        if self.text_layout is not None:
+            point = (QPointF(event.pos()) - QPointF(self.textOrigin())) / self.scale
+            self.moveCursor(min(len(self._text), self.text_layout.indexAt(point)))
+            
+    def mouseMoveEvent(self, event):
+        # 鼠标样式和拖动由文本框处理
+        event.ignore()
+        
+    def resizeEvent(self, event):
+        self.relayout()
+        super().resizeEvent(event)
+        
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+        if self.text_layout is not None:
+            painter.save()
+            painter.translate(self.textOrigin())
+            painter.scale(self.scale, self.scale)
+            # 与写入截图时相同的排版，只绘制需要重绘的行
+            clip = QRectF(event.rect()).translated(-self.PADDING, -self.PADDING)
+            clip = QRectF(clip.topLeft() / self.scale, clip.size() / self.scale)
+            self.text_layout.paint(painter, QPointF(0, 0), self.color, clip)
+            painter.restore()
+        if self.hasFocus():
+            painter.fillRect(self.cursorRect(), self.color)
+        painter.end()
+        if self.keystroke_start is not None:
+            metrics.record('text_keystroke', metrics.elapsed_ms(self.keystroke_start))
+            self.keystroke_start = None
+
 class DynamicTextBox(QFrame):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -30,16 +233,8 @@ class DynamicTextBox(QFrame):
         # 设置样式
         self.updateStyle()
         
-        # 创建文本编辑框
-        self.text_edit = QLineEdit(self)
-        self.text_edit.setStyleSheet("""
-            QLineEdit {
-                background: transparent;
-                padding: 4px;
-                text-align: center;  /* 文本居中 */
-                qproperty-alignment: AlignCenter;  /* 文本居中对齐 */
-            }
-        """)
+        # 创建文本编辑区域，文字按text_layout排版后绘制
+        self.text_edit = TextEditArea(self)
         
         # 初始化变量
         self.resizing = False
@@ -63,45 +258,11 @@ class DynamicTextBox(QFrame):
         
         # 设置鼠标跟踪
         self.setMouseTracking(True)
-        self.text_edit.setMouseTracking(True)
-        
-        # 连接文本变化信号
-        self.text_edit.textChanged.connect(self.adjustFontSize)
         
     def adjustFontSize(self):
-        """根据文本框大小调整字体大小"""
+        """根据文本框大小调整字体大小（二分查找，排版结果有缓存）"""
         try:
-            text = self.text_edit.text()
-            if not text:
-                return
-                
-            # 获取当前字体
-            font = self.text_edit.font()
-            
-            # 计算合适的字体大小（考虑内边距）
-            padding = 8  # 内边距
-            height = int(self.height() * 0.8) - (padding * 2)  # 文本框高度的80%，减去内边距
-            width = self.width() - (padding * 2)  # 减去内边距
-            
-            # 设置初始字体大小
-            font.setPixelSize(height)
-            
-            # 创建字体度量对象
-            metrics = QFontMetrics(font)
-            text_width = metrics.horizontalAdvance(text)
-            text_height = metrics.height()
-            
-            # 如果文本宽度超过可用宽度，或文本高度超过可用高度，调整字体大小
-            if text_width > width or text_height > height:
-                width_scale = width / text_width if text_width > width else 1
-                height_scale = height / text_height if text_height > height else 1
-                scale_factor = min(width_scale, height_scale)
-                new_size = max(8, int(height * scale_factor))  # 设置最小字体大小为8像素
-                font.setPixelSize(new_size)
-            
-            # 应用字体
-            self.text_edit.setFont(font)
-            
+            self.text_edit.relayout()
         except Exception as e:
             print(f"调整字体大小时出错: {str(e)}")
             
@@ -240,19 +401,21 @@ class DynamicTextBox(QFrame):
     def getText(self):
         return self.text_edit.text()
         
+    def setScale(self, scale):
+        """画布的显示比例，文字按图片像素排版后按这个比例显示"""
+        self.text_edit.setScale(scale)
+        
     def setFont(self, font):
         """设置字体并调整文本框大小"""
-        self.text_edit.setFont(font)
-        # 根据字体大小调整文本框高度
-        metrics = QFontMetrics(font)
-        height = metrics.height() + 10  # 添加一些内边距
-        self.setMinimumSize(self.min_size.width(), height)
-        self.resize(self.width(), height)
+        self.text_edit.setBaseFont(font)
+        # 根据字体大小调整文本框高度，正好放下一行
+        line_height = QFontMetricsF(font).lineSpacing() * self.text_edit.scale
+        height = int(line_height + 2 * TextEditArea.PADDING + 1)
+        self.resize(self.width(), max(height, self.min_size.height()))
         
     def setTextColor(self, color):
-        palette = self.text_edit.palette()
-        palette.setColor(self.text_edit.foregroundRole(), color)
-        self.text_edit.setPalette(palette)
+        self.text_edit.color = QColor(color)
+        self.text_edit.update()
 
     def updateStyle(self):
         """更新样式表"""
@@ -296,15 +459,51 @@ class DynamicTextBox(QFrame):
         self.border_style = style
         self.updateStyle()
 
+    def resetStyle(self):
+        """恢复默认的透明背景和边框，编辑窗口复用时调用"""
+        self.bg_color = QColor(255, 255, 255, 0)
+        self.border_color = QColor(255, 255, 255, 0)
+        self.border_width = 1
+        self.border_style = Qt.PenStyle.SolidLine
+        self.text_edit.clear()
+        self.updateStyle()
+
+# 关闭后回收的编辑窗口，下次打开时直接载入新截图，不再重新创建控件
+_editor_pool = []
+EDITOR_POOL_SIZE = 1
+
+def open_editor(screenshot, trigger_time=None):
+    """打开编辑窗口编辑screenshot，优先复用回收的窗口
+    
+    trigger_time为触发打开的时刻（metrics.now()，例如松开鼠标时），用于记录到编辑窗口第一次绘制的耗时。
+    """
+    start = metrics.now()
+    editor = _editor_pool.pop() if _editor_pool else EditorWindow()
+    editor.load(screenshot, trigger_time if trigger_time is not None else start)
+    editor.show()
+    metrics.record('editor_open', metrics.elapsed_ms(start))
+    return editor
+
+def prewarm_editor():
+    """空闲时预先创建一个编辑窗口放入回收池，第一次截图编辑也不需要等待创建控件"""
+    if not _editor_pool:
+        _editor_pool.append(EditorWindow())
+
 class EditorWindow(QWidget):
-    def __init__(self, screenshot, parent=None):
+    def __init__(self, screenshot=None, parent=None):
         super().__init__(parent)
-        self.original_screenshot = screenshot
-        self.current_screenshot = screenshot.copy()
+        # 控件只在这里创建一次，每张截图的状态由load()重置，窗口关闭后放回回收池复用
+        self.scene = None
+        self.history = None
+        self.current_screenshot = None
         self.drawing = False
         self.last_point = None
         self.preview_point = None
+        # 上一次预览图形所占的区域（图片坐标），移动时只重绘新旧两个区域
+        self.preview_rect = None
         self.is_dragging = False  # 添加拖拽状态标志
+        # 触发打开的时刻，第一次绘制后记录耗时
+        self.open_started = None
         
         # 添加当前颜色属性
         self.current_color = QColor(255, 0, 0)  # 默认红色
@@ -312,7 +511,6 @@ class EditorWindow(QWidget):
         # 设置窗口属性以支持拖放
         self.setAcceptDrops(True)
         self.setMouseTracking(True)
-        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
         self.setWindowFlags(
             Qt.WindowType.Window |
             Qt.WindowType.WindowStaysOnTopHint |
@@ -326,9 +524,18 @@ class EditorWindow(QWidget):
         self.current_font = QFont('Arial', 12)
         self.text_position = None
         
-        # 添加历史记录用于撤销/重做
-        self.history = [screenshot.copy()]
-        self.history_index = 0
+        # 画笔的输入合并：鼠标移动只记录点，按屏幕刷新率一次性把这些点画成一条路径
+        self.pending_points = []
+        self.pending_since = None
+        # 整个笔画的原始点，以及拖动时直接画进合成缓存的区域，
+        # 松开鼠标时把笔画作为标注加入场景，这些区域按简化平滑后的曲线重新绘制
+        self.stroke_points = []
+        self.stroke_dirty = QRect()
+        # 马赛克拖动时涂抹过的区域（已对齐到马赛克网格）
+        self.mosaic_rects = []
+        self.stroke_timer = QTimer(self)
+        self.stroke_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.stroke_timer.timeout.connect(self.flushStroke)
         
         # 添加延迟更新定时器
         self.update_timer = QTimer()
@@ -337,33 +544,20 @@ class EditorWindow(QWidget):
         
         self.temp_file = None
         
-        # 修改文本输入框为动态文本框
-        self.text_box = DynamicTextBox()
-        self.text_box.hide()
-        self.text_box.text_edit.returnPressed.connect(self.handleTextInput)
-        
-        # 添加文本背景色按钮
-        self.text_bg_color_btn = QPushButton('文本背景色')
-        self.text_bg_color_btn.clicked.connect(self.chooseTextBackgroundColor)
-        
-        # 添加文本边框颜色按钮
-        self.text_border_color_btn = QPushButton('文本边框颜色')
-        self.text_border_color_btn.clicked.connect(self.chooseTextBorderColor)
+        # 动态文本框在第一次使用文字工具时才创建，见textBox()
+        self.text_box = None
         
         # 添加设置对象
         self.settings = QSettings('ScreenshotTool', 'Settings')
         
-        # 初始化自定义图标
-        self.loadCustomIcons()
-        
         # 修改布局为水平布局
         self.main_layout = QHBoxLayout()
         self.setLayout(self.main_layout)
         
-        # 图片显示区域（左侧）
-        self.image_label = QLabel()
-        self.image_label.setPixmap(self.current_screenshot)
-        self.main_layout.addWidget(self.image_label, stretch=1)
+        # 图片显示区域（左侧），正在绘制的图形画在截图之上的预览层中
+        self.canvas = ImageCanvas()
+        self.canvas.overlay_painter = self.paintOverlay
+        self.main_layout.addWidget(self.canvas, stretch=1)
         
         # 工具栏（右侧）
         toolbar = QVBoxLayout()
@@ -417,8 +611,168 @@ class EditorWindow(QWidget):
         text_settings_layout.addLayout(text_buttons_layout)
         toolbar.addLayout(text_settings_layout)
         
-        # 图片调整
-        adjustment_group = QVBoxLayout()
+        # 图片调整（亮度、对比度、色相）不常用，第一次点击时才创建滑动条
+        self.adjust_btn = QPushButton('图片调整')
+        self.adjust_btn.setCheckable(True)
+        self.adjust_btn.toggled.connect(self.toggleAdjustmentPanel)
+        toolbar.addWidget(self.adjust_btn)
+        self.adjustment_layout = QVBoxLayout()
+        self.adjustment_layout.setContentsMargins(0, 0, 0, 0)
+        toolbar.addLayout(self.adjustment_layout)
+        self.adjustment_panel = None
+        
+        # 旋转按钮
+        rotation_layout = QHBoxLayout()
+        self.rotate_left_btn = QToolButton()
+        self.rotate_left_btn.setText('↺')
+        self.rotate_left_btn.clicked.connect(lambda: self.rotateImage(-90))
+        self.rotate_left_btn.setMinimumSize(40, 40)
+        self.rotate_left_btn.setFont(QFont('Arial', 16))
+        self.rotate_left_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.rotate_left_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.rotate_left_btn, 'rotate_left_icon'))
+        rotation_layout.addWidget(self.rotate_left_btn)
+        
+        self.rotate_right_btn = QToolButton()
+        self.rotate_right_btn.setText('↻')
+        self.rotate_right_btn.clicked.connect(lambda: self.rotateImage(90))
+        self.rotate_right_btn.setMinimumSize(40, 40)
+        self.rotate_right_btn.setFont(QFont('Arial', 16))
+        self.rotate_right_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.rotate_right_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.rotate_right_btn, 'rotate_right_icon'))
+        rotation_layout.addWidget(self.rotate_right_btn)
+        toolbar.addLayout(rotation_layout)
+        
+        # 撤销/重做按钮
+        undo_redo_layout = QHBoxLayout()
+        self.undo_btn = QPushButton('↩')
+        self.undo_btn.clicked.connect(self.undo)
+        self.undo_btn.setMinimumSize(40, 40)
+        self.undo_btn.setFont(QFont('Arial', 16))
+        self.undo_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.undo_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.undo_btn, 'undo_icon'))
+        undo_redo_layout.addWidget(self.undo_btn)
+        
+        self.redo_btn = QPushButton('↪')
+        self.redo_btn.clicked.connect(self.redo)
+        self.redo_btn.setMinimumSize(40, 40)
+        self.redo_btn.setFont(QFont('Arial', 16))
+        self.redo_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.redo_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.redo_btn, 'redo_icon'))
+        undo_redo_layout.addWidget(self.redo_btn)
+        toolbar.addLayout(undo_redo_layout)
+        
+        # 保存/分享按钮
+        save_share_layout = QHBoxLayout()
+        self.save_btn = QPushButton('保存')
+        self.save_btn.clicked.connect(self.saveImage)
+        self.save_btn.setMaximumWidth(60)
+        save_share_layout.addWidget(self.save_btn)
+        
+        self.share_btn = QPushButton('分享')
+        self.share_btn.clicked.connect(self.shareImage)
+        self.share_btn.setMaximumWidth(60)
+        save_share_layout.addWidget(self.share_btn)
+        toolbar.addLayout(save_share_layout)
+        
+        # 添加弹簧
+        toolbar.addStretch()
+        
+        # 将工具栏添加到主布局
+        toolbar_widget = QWidget()
+        toolbar_widget.setLayout(toolbar)
+        toolbar_widget.setMaximumWidth(200)  # 限制工具栏宽度
+        self.main_layout.addWidget(toolbar_widget)
+        
+        # 初始化自定义图标（按钮创建之后才能设置）
+        self.loadCustomIcons()
+        
+        if screenshot is not None:
+            self.load(screenshot)
+            
+    def load(self, screenshot, trigger_time=None):
+        """载入新的截图并重置编辑状态，新建和复用的窗口都经过这里"""
+        self.original_screenshot = screenshot
+        # 截图作为不变的底图，所有标注都是场景中的矢量对象；
+        # current_screenshot是场景缓存的合成结果，编辑窗口直接显示它
+        self.scene = AnnotationScene(screenshot)
+        self.current_screenshot = self.scene.composite
+        # 添加历史记录用于撤销/重做，每一步只保存标注列表的引用和底图中变化的块，
+        # 超过内存预算（设置项history_budget_mb）时最早的步骤写入临时文件
+        budget_mb = int(self.settings.value('history_budget_mb', 256))
+        self.history = EditHistory(self.scene, budget_mb * 1024 * 1024)
+        
+        self.drawing = False
+        self.last_point = None
+        self.preview_point = None
+        self.preview_rect = None
+        self.is_dragging = False
+        self.text_position = None
+        self.pending_points = []
+        self.pending_since = None
+        self.stroke_points = []
+        self.stroke_dirty = QRect()
+        self.mosaic_rects = []
+        
+        # 工具恢复为默认值，与新建的窗口一致
+        self.current_color = QColor(255, 0, 0)
+        self.current_font = QFont('Arial', 12)
+        self.thickness_spin.setValue(2)
+        self.tool_combo.setCurrentIndex(0)
+        self.draw_mode = 'pen'
+        self.setCursor(CursorRules.get_cursor_for_tool(self.draw_mode))
+        if self.text_box is not None:
+            self.text_box.hide()
+            self.text_box.resetStyle()
+        self.resetAdjustments()
+        self.adjust_btn.setChecked(False)
+        self.enableTools()
+        self.updateUndoRedoButtons()
+        
+        self.canvas.fit_to_view = True
+        self.canvas.setPixmap(self.current_screenshot)
+        # 从触发打开到第一次绘制出截图的耗时
+        self.open_started = trigger_time if trigger_time is not None else metrics.now()
+        self.canvas.first_paint_callback = self.firstPainted
+        
+    def firstPainted(self):
+        if self.open_started is not None:
+            metrics.record('editor_first_paint', metrics.elapsed_ms(self.open_started))
+            self.open_started = None
+            
+    def release(self):
+        """窗口关闭后释放这张截图占用的内存，控件保留"""
+        self.stroke_timer.stop()
+        self.update_timer.stop()
+        if self.text_box is not None:
+            self.text_box.hide()
+        if self.history is not None:
+            self.history.close()
+        self.history = None
+        self.scene = None
+        self.current_screenshot = None
+        self.original_screenshot = None
+        self.canvas.clear()
+        
+    def textBox(self):
+        """动态文本框，第一次使用文字工具时创建"""
+        if self.text_box is None:
+            self.text_box = DynamicTextBox()
+            self.text_box.hide()
+            self.text_box.text_edit.returnPressed.connect(self.handleTextInput)
+        return self.text_box
+        
+    def toggleAdjustmentPanel(self, checked):
+        """显示或隐藏图片调整面板，第一次显示时才创建"""
+        if checked and self.adjustment_panel is None:
+            self.buildAdjustmentPanel()
+        if self.adjustment_panel is not None:
+            self.adjustment_panel.setVisible(checked)
+            
+    def buildAdjustmentPanel(self):
+        """创建亮度、对比度和色相的输入框和滑动条"""
+        self.adjustment_panel = QWidget()
+        adjustment_group = QVBoxLayout(self.adjustment_panel)
+        adjustment_group.setContentsMargins(0, 0, 0, 0)
         adjustment_group.setSpacing(1)
         
         # 亮度
@@ -499,69 +853,17 @@ class EditorWindow(QWidget):
         self.hue_spin.valueChanged.connect(lambda: self.update_timer.start(100))
         adjustment_group.addLayout(hue_layout)
         
-        toolbar.addLayout(adjustment_group)
+        self.adjustment_layout.addWidget(self.adjustment_panel)
         
-        # 旋转按钮
-        rotation_layout = QHBoxLayout()
-        self.rotate_left_btn = QToolButton()
-        self.rotate_left_btn.setText('↺')
-        self.rotate_left_btn.clicked.connect(lambda: self.rotateImage(-90))
-        self.rotate_left_btn.setMinimumSize(40, 40)
-        self.rotate_left_btn.setFont(QFont('Arial', 16))
-        self.rotate_left_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.rotate_left_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.rotate_left_btn, 'rotate_left_icon'))
-        rotation_layout.addWidget(self.rotate_left_btn)
-        
-        self.rotate_right_btn = QToolButton()
-        self.rotate_right_btn.setText('↻')
-        self.rotate_right_btn.clicked.connect(lambda: self.rotateImage(90))
-        self.rotate_right_btn.setMinimumSize(40, 40)
-        self.rotate_right_btn.setFont(QFont('Arial', 16))
-        self.rotate_right_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.rotate_right_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.rotate_right_btn, 'rotate_right_icon'))
-        rotation_layout.addWidget(self.rotate_right_btn)
-        toolbar.addLayout(rotation_layout)
-        
-        # 撤销/重做按钮
-        undo_redo_layout = QHBoxLayout()
-        self.undo_btn = QPushButton('↩')
-        self.undo_btn.clicked.connect(self.undo)
-        self.undo_btn.setMinimumSize(40, 40)
-        self.undo_btn.setFont(QFont('Arial', 16))
-        self.undo_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.undo_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.undo_btn, 'undo_icon'))
-        undo_redo_layout.addWidget(self.undo_btn)
-        
-        self.redo_btn = QPushButton('↪')
-        self.redo_btn.clicked.connect(self.redo)
-        self.redo_btn.setMinimumSize(40, 40)
-        self.redo_btn.setFont(QFont('Arial', 16))
-        self.redo_btn.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.redo_btn.customContextMenuRequested.connect(lambda pos: self.showIconMenu(self.redo_btn, 'redo_icon'))
-        undo_redo_layout.addWidget(self.redo_btn)
-        toolbar.addLayout(undo_redo_layout)
-        
-        # 保存/分享按钮
-        save_share_layout = QHBoxLayout()
-        self.save_btn = QPushButton('保存')
-        self.save_btn.clicked.connect(self.saveImage)
-        self.save_btn.setMaximumWidth(60)
-        save_share_layout.addWidget(self.save_btn)
-        
-        self.share_btn = QPushButton('分享')
-        self.share_btn.clicked.connect(self.shareImage)
-        self.share_btn.setMaximumWidth(60)
-        save_share_layout.addWidget(self.share_btn)
-        toolbar.addLayout(save_share_layout)
-        
-        # 添加弹簧
-        toolbar.addStretch()
-        
-        # 将工具栏添加到主布局
-        toolbar_widget = QWidget()
-        toolbar_widget.setLayout(toolbar)
-        toolbar_widget.setMaximumWidth(200)  # 限制工具栏宽度
-        self.main_layout.addWidget(toolbar_widget)
+    def resetAdjustments(self):
+        """新截图的调整值归零，不触发调整"""
+        if self.adjustment_panel is None:
+            return
+        for control in (self.brightness_spin, self.brightness_slider, self.contrast_spin,
+                        self.contrast_slider, self.hue_spin, self.hue_slider):
+            control.blockSignals(True)
+            control.setValue(0)
+            control.blockSignals(False)
         
     def changeDrawMode(self, mode):
         mode_map = {
@@ -576,7 +878,7 @@ class EditorWindow(QWidget):
         if self.drawing:
             self.drawing = False
             self.last_point = None
-            self.update()
+            self.clearPreview()
             
         self.draw_mode = mode_map[mode]
         
@@ -593,51 +895,28 @@ class EditorWindow(QWidget):
         try:
             text = self.text_box.getText()
             if text and self.text_position:
-                painter = QPainter(self.current_screenshot)
-                painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
-                
-                # 使用文本框的字体和颜色
-                font = self.text_box.text_edit.font()
-                painter.setFont(font)
-                painter.setPen(QPen(self.current_color))
-                
-                # 获取文本框当前的全局位置
-                text_box_pos = self.text_box.mapToGlobal(QPoint(0, 0))
-                # 转换为图片坐标系
-                window_pos = self.mapFromGlobal(text_box_pos)
-                image_pos = QPoint(window_pos.x() - self.image_label.pos().x(),
-                                 window_pos.y() - self.image_label.pos().y())
-                
-                # 计算文本边界
-                metrics = QFontMetrics(font)
-                text_width = metrics.horizontalAdvance(text)
-                text_height = metrics.height()
-                
-                # 调整文本位置，确保在图片范围内
-                x = min(max(0, image_pos.x()), self.current_screenshot.width() - text_width)
-                y = min(max(text_height, image_pos.y() + text_height),
-                       self.current_screenshot.height())
-                
-                # 绘制文本背景（如果不是完全透明）
-                if self.text_box.bg_color.alpha() > 0:
-                    bg_rect = QRect(x - 2, y - text_height - 2,
-                                  text_width + 4, text_height + 4)
-                    painter.fillRect(bg_rect, self.text_box.bg_color)
+                # 使用文本框中的排版：字号和换行宽度都以图片像素为单位
+                text_edit = self.text_box.text_edit
+                layout = text_edit.text_layout
                 
-                # 绘制文本边框（如果不是完全透明）
-                if self.text_box.border_color.alpha() > 0:
-                    pen = QPen(self.text_box.border_color, 
-                             self.text_box.border_width,
-                             self.text_box.border_style)
-                    painter.setPen(pen)
-                    painter.drawRect(bg_rect)
+                # 文本框中文字左上角的全局位置转换为图片坐标
+                text_pos = text_edit.mapToGlobal(text_edit.textOrigin())
+                image_pos = self.canvas.imagePos(self.canvas.mapFromGlobal(text_pos))
                 
-                # 绘制文本
-                painter.setPen(QPen(self.current_color))
-                painter.drawText(x, y, text)
+                # 调整文本位置，确保在图片范围内；文字比图片还大时从左上角开始
+                size = layout.size()
+                x = max(0, min(image_pos.x(), self.current_screenshot.width() - size.width()))
+                y = max(0, min(image_pos.y(), self.current_screenshot.height() - size.height()))
                 
-                # 更新图片
-                self.image_label.setPixmap(self.current_screenshot)
+                # 文字连同背景和边框作为一个标注加入场景，只重绘文字所在的区域
+                self.scene.add(TextAnnotation(QPoint(x, y), text, layout.font,
+                                              self.current_color.rgba(),
+                                              self.text_box.bg_color.rgba(),
+                                              self.text_box.border_color.rgba(),
+                                              self.text_box.border_width,
+                                              self.text_box.border_style,
+                                              layout.wrap_width))
+                self.refreshScene()
                 self.addToHistory()
                 
                 # 重置状态
@@ -679,10 +958,8 @@ class EditorWindow(QWidget):
             # 确保工具栏是启用的
             self.enableTools()
             
-            # 获取鼠标位置相对于图片标签的偏移
-            pos = event.pos()
-            label_pos = self.image_label.pos()
-            image_pos = QPoint(pos.x() - label_pos.x(), pos.y() - label_pos.y())
+            # 获取鼠标位置在图片中的坐标
+            image_pos = self.imagePos(event.pos())
             
             # 检查是否在图片范围内
             if image_pos.x() >= 0 and image_pos.y() >= 0 and \
@@ -690,15 +967,21 @@ class EditorWindow(QWidget):
                image_pos.y() < self.current_screenshot.height():
                 self.drawing = True
                 self.last_point = image_pos
+                self.pending_points = []
+                self.stroke_points = [(image_pos.x(), image_pos.y())]
+                self.stroke_dirty = QRect()
+                self.mosaic_rects = []
                 
                 if self.draw_mode == 'text':
                     self.text_position = image_pos
                     # 显示动态文本框，使用实际鼠标位置
+                    self.textBox()
+                    self.text_box.setScale(self.canvas.zoom)
                     self.text_box.setFont(self.current_font)
                     self.text_box.setTextColor(self.current_color)
                     self.text_box.text_edit.clear()
                     # 使用实际鼠标位置
-                    self.text_box.updatePosition(self.mapToGlobal(pos))
+                    self.text_box.updatePosition(self.mapToGlobal(event.pos()))
                     self.text_box.show()
                     self.text_box.text_edit.setFocus()
                     self.text_box.raise_()
@@ -711,21 +994,22 @@ class EditorWindow(QWidget):
             # 创建拖拽对象
             drag = QDrag(self)
             mime_data = QMimeData()
+            image = self.exportImage()
             
             # 设置剪贴板
             clipboard = QApplication.clipboard()
             clipboard.clear()
-            clipboard.setPixmap(self.current_screenshot)
+            clipboard.setPixmap(image)
             
             # 将图片转换为字节数据
             byte_array = QByteArray()
             buffer = QBuffer(byte_array)
             buffer.open(QBuffer.OpenModeFlag.WriteOnly)
-            self.current_screenshot.save(buffer, 'PNG', quality=100)  # 使用高质量设置
+            image.save(buffer, 'PNG', quality=100)  # 使用高质量设置
             buffer.close()
             
             # 设置MIME数据
-            mime_data.setImageData(self.current_screenshot.toImage())
+            mime_data.setImageData(image.toImage())
             mime_data.setData('image/png', byte_array)
             
             # 设置拖拽数据
@@ -747,7 +1031,7 @@ class EditorWindow(QWidget):
             
             # 确保拖拽完成后剪贴板内容仍然存在
             if not clipboard.pixmap().isNull():
-                clipboard.setPixmap(self.current_screenshot)
+                clipboard.setPixmap(image)
             
         except Exception as e:
             print(f"拖拽操作出错: {str(e)}")
@@ -767,7 +1051,8 @@ class EditorWindow(QWidget):
             # 复制到剪贴板
             clipboard = QApplication.clipboard()
             clipboard.clear()  # 先清除剪贴板
-            if not clipboard.setPixmap(self.current_screenshot):
+            image = self.exportImage()
+            if not clipboard.setPixmap(image):
                 print("设置剪贴板失败")
             
             # 保存到设置的路径（如果有）
@@ -776,7 +1061,7 @@ class EditorWindow(QWidget):
             if save_path:
                 timestamp = QDateTime.currentDateTime().toString('yyyyMMdd_hhmmss')
                 filename = os.path.join(save_path, f'screenshot_{timestamp}.png')
-                self.current_screenshot.save(filename, quality=100)
+                image.save(filename, quality=100)
             
             # 禁用所有工具按钮
             self.disableTools()
@@ -794,12 +1079,9 @@ class EditorWindow(QWidget):
         self.color_btn.setEnabled(False)
         self.thickness_spin.setEnabled(False)
         self.font_btn.setEnabled(False)
-        self.brightness_slider.setEnabled(False)
-        self.brightness_spin.setEnabled(False)
-        self.contrast_slider.setEnabled(False)
-        self.contrast_spin.setEnabled(False)
-        self.hue_slider.setEnabled(False)
-        self.hue_spin.setEnabled(False)
+        self.adjust_btn.setEnabled(False)
+        if self.adjustment_panel is not None:
+            self.adjustment_panel.setEnabled(False)
         self.undo_btn.setEnabled(False)
         self.redo_btn.setEnabled(False)
         self.save_btn.setEnabled(False)
@@ -811,12 +1093,9 @@ class EditorWindow(QWidget):
         self.color_btn.setEnabled(True)
         self.thickness_spin.setEnabled(True)
         self.font_btn.setEnabled(True)
-        self.brightness_slider.setEnabled(True)
-        self.brightness_spin.setEnabled(True)
-        self.contrast_slider.setEnabled(True)
-        self.contrast_spin.setEnabled(True)
-        self.hue_slider.setEnabled(True)
-        self.hue_spin.setEnabled(True)
+        self.adjust_btn.setEnabled(True)
+        if self.adjustment_panel is not None:
+            self.adjustment_panel.setEnabled(True)
         self.undo_btn.setEnabled(True)
         self.redo_btn.setEnabled(True)
         self.save_btn.setEnabled(True)
@@ -824,72 +1103,187 @@ class EditorWindow(QWidget):
         self.text_bg_color_btn.setEnabled(True)
         self.text_border_color_btn.setEnabled(True)
         
+    def imagePos(self, pos):
+        """窗口坐标转换为图片坐标，考虑画布的缩放和平移"""
+        return self.canvas.imagePos(self.canvas.mapFrom(self, pos))
+        
     def mouseMoveEvent(self, event):
         if self.is_dragging:
             return
             
-        # 获取相对于图片标签的位置
-        pos = event.pos()
-        label_pos = self.image_label.pos()
-        image_pos = QPoint(pos.x() - label_pos.x(), pos.y() - label_pos.y())
+        # 获取相对于图片的位置
+        image_pos = self.imagePos(event.pos())
         
         # 检查是否在图片范围内
         if image_pos.x() >= 0 and image_pos.y() >= 0 and \
            image_pos.x() < self.current_screenshot.width() and \
            image_pos.y() < self.current_screenshot.height():
+            previous_point = self.preview_point
             self.preview_point = image_pos
+            if self.draw_mode == 'pen':
+                self.updateCursorPreview(previous_point)
             
             if not self.drawing:
-                if self.draw_mode == 'pen':
-                    self.update()
                 return
                 
-            # 创建临时副本用于预览
-            temp_pixmap = QPixmap(self.current_screenshot)
-            painter = QPainter(temp_pixmap)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            if self.draw_mode == 'pen':
+                self.queueStrokePoint(image_pos)
+            elif self.draw_mode == 'mosaic':
+                if self.last_point:  # 确保有上一个点
+                    self.canvas.updateImageRect(self.applyMosaic(self.last_point, image_pos))
+                self.last_point = image_pos
+            else:
+                # 矩形、圆形和箭头只画在预览层中，松开鼠标时才写入截图
+                self.updatePreviewShape(self.shapeBounds(self.last_point, image_pos))
+        else:
+            previous_point = self.preview_point
+            self.preview_point = None
+            self.updateCursorPreview(previous_point)
             
-            try:
-                if self.draw_mode == 'pen':
-                    pen = QPen(self.current_color, 
-                              self.thickness_spin.value(),
-                              Qt.PenStyle.SolidLine,
-                              Qt.PenCapStyle.RoundCap,
-                              Qt.PenJoinStyle.RoundJoin)
-                    painter.setPen(pen)
-                    if self.last_point:  # 确保有上一个点
-                        painter.drawLine(self.last_point, image_pos)
-                    self.current_screenshot = temp_pixmap
-                    self.last_point = image_pos
-                elif self.draw_mode == 'mosaic':
-                    if self.last_point:  # 确保有上一个点
-                        self.applyMosaic(painter, self.last_point, image_pos)
-                    self.current_screenshot = temp_pixmap
-                    self.last_point = image_pos
-                else:
-                    pen = QPen(self.current_color, 
-                              self.thickness_spin.value(),
-                              Qt.PenStyle.SolidLine)
-                    if self.draw_mode == 'arrow':
-                        pen.setCapStyle(Qt.PenCapStyle.RoundCap)
-                        pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
-                    painter.setPen(pen)
+    def queueStrokePoint(self, point):
+        """记录画笔经过的点，等到下一帧再统一绘制"""
+        if not self.pending_points:
+            self.pending_since = metrics.now()
+        self.pending_points.append(point)
+        self.stroke_points.append((point.x(), point.y()))
+        if not self.stroke_timer.isActive():
+            refresh_rate = self.screen().refreshRate() if self.screen() is not None else 60.0
+            self.stroke_timer.start(max(1, int(1000 / max(1.0, refresh_rate))))
+            
+    def flushStroke(self):
+        """把累积的点作为一条路径画进截图，只重绘路径所在的区域"""
+        if not self.pending_points or self.last_point is None:
+            self.pending_points = []
+            self.stroke_timer.stop()
+            return
+        path = QPainterPath(QPointF(self.last_point))
+        for point in self.pending_points:
+            path.lineTo(QPointF(point))
+        dirty = self.strokeBounds(path)
+        self.stroke_dirty = self.stroke_dirty.united(dirty)
+        painter = QPainter(self.current_screenshot)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.strokePath(path, self.strokePen())
+        painter.end()
+        self.last_point = self.pending_points[-1]
+        self.pending_points = []
+        
+        self.canvas.repaintImageRect(dirty)
+        # 从这一帧中最早的输入到画面更新完成的时间
+        metrics.record('stroke_latency', metrics.elapsed_ms(self.pending_since))
+        
+    def strokePen(self):
+        return shape_pen('stroke', self.current_color, self.thickness_spin.value())
                     
-                    if self.draw_mode in ['rect', 'circle']:
-                        rect = QRect(self.last_point, image_pos).normalized()
-                        if self.draw_mode == 'rect':
-                            painter.drawRect(rect)
-                        else:
-                            painter.drawEllipse(rect)
-                    elif self.draw_mode == 'arrow':
-                        self.drawArrow(painter, self.last_point, image_pos)
-            finally:
-                painter.end()
+    def strokeBounds(self, path):
+        margin = self.thickness_spin.value() + 2
+        return path.boundingRect().toAlignedRect().adjusted(-margin, -margin, margin, margin)
+        
+    def finishStroke(self):
+        """笔画结束：简化后作为标注加入场景，拖动时画进缓存的原始折线按平滑后的曲线重新绘制"""
+        points = self.stroke_points
+        dirty = self.stroke_dirty
+        self.stroke_points = []
+        self.stroke_dirty = QRect()
+        if len(points) < 2 or dirty.isEmpty():
+            return
+        start = metrics.now()
+        stroke_processing.record_trace(points, self.thickness_spin.value())
+        self.scene.invalidate(dirty)
+        self.scene.add(StrokeAnnotation(stroke_processing.simplify(points),
+                                        self.current_color.rgba(),
+                                        self.thickness_spin.value()))
+        self.refreshScene()
+        metrics.record('stroke_smooth', metrics.elapsed_ms(start))
+            
+    def shapeAnnotation(self, start, end):
+        """按当前工具创建矩形、圆形或箭头标注，预览和最终加入场景共用"""
+        color = self.current_color.rgba()
+        thickness = self.thickness_spin.value()
+        if self.draw_mode == 'rect':
+            return RectAnnotation(QRect(start, end).normalized(), color, thickness)
+        if self.draw_mode == 'circle':
+            return EllipseAnnotation(QRect(start, end).normalized(), color, thickness)
+        if self.draw_mode == 'arrow':
+            return ArrowAnnotation(start, end, color, thickness)
+        return None
+                    
+    def refreshScene(self):
+        """按底图和标注重新绘制合成缓存中变化的区域，并更新显示"""
+        if self.scene.composite is not self.current_screenshot:
+            # 尺寸变化（旋转）时场景会换一个新的缓存
+            self.current_screenshot = self.scene.composite
+            self.canvas.setPixmap(self.current_screenshot)
+        for rect in self.scene.update():
+            self.canvas.updateImageRect(rect)
+            
+    def exportScale(self):
+        """导出的倍数，大于1时标注按矢量放大绘制"""
+        try:
+            return max(0.1, float(self.settings.value('export_scale', 1.0)))
+        except (TypeError, ValueError):
+            return 1.0
+            
+    def exportImage(self):
+        """合成底图和所有标注，用于保存、复制和拖拽"""
+        return self.scene.flatten(self.exportScale())
                 
-            self.image_label.setPixmap(temp_pixmap)
-        else:
-            self.preview_point = None
-            self.update()
+    def shapeBounds(self, start, end):
+        """图形所占的区域，留出线宽和箭头两边的余量"""
+        margin = self.thickness_spin.value() * 3 + 2
+        return QRect(start, end).normalized().adjusted(-margin, -margin, margin, margin)
+        
+    def updatePreviewShape(self, bounds):
+        """预览图形移动后只重绘旧位置和新位置"""
+        if self.preview_rect is not None:
+            self.canvas.updateImageRect(self.preview_rect)
+        self.preview_rect = bounds
+        if bounds is not None:
+            self.canvas.updateImageRect(bounds)
+            
+    def clearPreview(self):
+        self.updatePreviewShape(None)
+        
+    def cursorPreviewRect(self, point):
+        radius = int(self.thickness_spin.value() / 2) + 2
+        return QRect(point.x() - radius, point.y() - radius, radius * 2 + 1, radius * 2 + 1)
+        
+    def updateCursorPreview(self, previous_point):
+        """画笔光标移动后只重绘旧位置和新位置"""
+        if previous_point is not None:
+            self.canvas.updateImageRect(self.cursorPreviewRect(previous_point))
+        if self.preview_point is not None and self.draw_mode == 'pen':
+            self.canvas.updateImageRect(self.cursorPreviewRect(self.preview_point))
+            
+    def paintOverlay(self, painter):
+        """在截图之上绘制正在拖动的图形和画笔光标"""
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if self.drawing and self.preview_rect is not None and self.last_point and self.preview_point:
+            annotation = self.shapeAnnotation(self.last_point, self.preview_point)
+            if annotation is not None:
+                annotation.paint(painter)
+            
+        if self.preview_point and self.draw_mode == 'pen':
+            # 绘制画笔预览圆圈，光标的线条在任何缩放下都是1个屏幕像素宽
+            pen = QPen(self.current_color, 1, Qt.PenStyle.SolidLine)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.setBrush(QColor(self.current_color.red(),
+                                  self.current_color.green(),
+                                  self.current_color.blue(),
+                                  100))
+            radius = int(self.thickness_spin.value() / 2)
+            painter.drawEllipse(self.preview_point, radius, radius)
+            
+            # 绘制十字线（确保十字线在圆圈中心）
+            line_length = radius  # 使用画笔半径作为十字线长度
+            pen = QPen(QColor(0, 0, 0), 1, Qt.PenStyle.SolidLine)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.drawLine(self.preview_point.x(), self.preview_point.y() - line_length,
+                           self.preview_point.x(), self.preview_point.y() + line_length)
+            painter.drawLine(self.preview_point.x() - line_length, self.preview_point.y(),
+                           self.preview_point.x() + line_length, self.preview_point.y())
         
     def mouseReleaseEvent(self, event):
         if self.is_dragging:  # 如果正在拖拽，不处理其他鼠标事件
@@ -898,36 +1292,25 @@ class EditorWindow(QWidget):
             return
             
         if event.button() == Qt.MouseButton.LeftButton and self.drawing:
+            if self.draw_mode == 'pen':
+                # 画完还没到下一帧的点
+                self.flushStroke()
+                self.stroke_timer.stop()
+                self.finishStroke()
             self.drawing = False
-            # 获取相对于图片标签的位置
-            pos = event.pos()
-            label_pos = self.image_label.pos()
-            image_pos = QPoint(pos.x() - label_pos.x(), pos.y() - label_pos.y())
+            # 获取相对于图片的位置
+            image_pos = self.imagePos(event.pos())
             
             if self.draw_mode in ['rect', 'circle', 'arrow'] and self.last_point:
-                painter = QPainter(self.current_screenshot)
-                painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-                try:
-                    pen = QPen(self.current_color, 
-                              self.thickness_spin.value(),
-                              Qt.PenStyle.SolidLine)
-                    if self.draw_mode == 'arrow':
-                        pen.setCapStyle(Qt.PenCapStyle.RoundCap)
-                        pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
-                    painter.setPen(pen)
-                    
-                    if self.draw_mode in ['rect', 'circle']:
-                        rect = QRect(self.last_point, image_pos).normalized()
-                        if self.draw_mode == 'rect':
-                            painter.drawRect(rect)
-                        else:
-                            painter.drawEllipse(rect)
-                    else:  # arrow
-                        self.drawArrow(painter, self.last_point, image_pos)
-                finally:
-                    painter.end()
-                    
-                self.image_label.setPixmap(self.current_screenshot)
+                # 松开鼠标时才把图形作为标注加入场景
+                self.scene.add(self.shapeAnnotation(self.last_point, image_pos))
+                self.clearPreview()
+                self.refreshScene()
+            elif self.draw_mode == 'mosaic' and self.mosaic_rects:
+                # 拖动时已经直接涂抹在缓存上，这里加入场景后按底图和其他标注重新绘制一次
+                self.scene.add(MosaicAnnotation(self.mosaic_rects, self.mosaicBlockSize()))
+                self.mosaic_rects = []
+                self.refreshScene()
                 
             self.addToHistory()  # 移动到这里，确保所有工具都会添加历史记录
             
@@ -948,7 +1331,8 @@ class EditorWindow(QWidget):
         """调整图片的亮度、对比度和色相"""
         try:
             # 将QPixmap转换为PIL Image
-            qimage = self.current_screenshot.toImage()
+            # 只调整底图，标注保持原来的颜色
+            qimage = self.scene.base.toImage()
             buffer = QBuffer()
             buffer.open(QBuffer.OpenModeFlag.ReadWrite)
             qimage.save(buffer, "PNG")
@@ -994,8 +1378,8 @@ class EditorWindow(QWidget):
             pixmap.loadFromData(img_bytes.getvalue())
             
             # 更新显示
-            self.current_screenshot = pixmap
-            self.image_label.setPixmap(self.current_screenshot)
+            self.scene.setBase(pixmap, self.scene.annotations)
+            self.refreshScene()
             
         except Exception as e:
             print(f"调整图片时出错: {str(e)}")
@@ -1011,12 +1395,12 @@ class EditorWindow(QWidget):
         
         if file_name:
             # 使用高质量设置保存图片
-            self.current_screenshot.save(file_name, quality=100)
+            self.exportImage().save(file_name, quality=100)
         
     def shareImage(self):
         # 将图片保存到剪贴板
         clipboard = QApplication.clipboard()
-        clipboard.setPixmap(self.current_screenshot)
+        clipboard.setPixmap(self.exportImage())
         
         # 也可以添加其他分享方式，比如：
         # 1. 直接上传到图床
@@ -1025,84 +1409,51 @@ class EditorWindow(QWidget):
         
     def addToHistory(self):
         # 添加当前状态到历史记录
-        self.history = self.history[:self.history_index + 1]
-        self.history.append(self.current_screenshot.copy())
-        self.history_index += 1
+        self.history.push()
         self.updateUndoRedoButtons()
         
     def undo(self):
-        if self.history_index > 0:
-            self.history_index -= 1
-            self.current_screenshot = self.history[self.history_index].copy()
-            self.image_label.setPixmap(self.current_screenshot)
-            self.updateUndoRedoButtons()
+        # 只重绘前后两个状态之间不同的标注和底图块
+        if self.history.undo():
+            self.refreshScene()
+        self.updateUndoRedoButtons()
             
     def redo(self):
-        if self.history_index < len(self.history) - 1:
-            self.history_index += 1
-            self.current_screenshot = self.history[self.history_index].copy()
-            self.image_label.setPixmap(self.current_screenshot)
-            self.updateUndoRedoButtons()
+        if self.history.redo():
+            self.refreshScene()
+        self.updateUndoRedoButtons()
             
     def updateUndoRedoButtons(self):
-        self.undo_btn.setEnabled(self.history_index > 0)
-        self.redo_btn.setEnabled(self.history_index < len(self.history) - 1)
-        
-    def drawArrow(self, painter, start, end):
-        try:
-            # 计算箭头参数
-            arrow_size = self.thickness_spin.value() * 3
-            
-            # 确保使用浮点数进行计算
-            start_point = QPointF(float(start.x()), float(start.y()))
-            end_point = QPointF(float(end.x()), float(end.y()))
-            
-            # 计算方向向量
-            dx = end_point.x() - start_point.x()
-            dy = end_point.y() - start_point.y()
-            length = math.sqrt(dx * dx + dy * dy)
-            
-            if length < 1:  # 避免除以零
-                return
-                
-            # 单位向量
-            udx = dx / length
-            udy = dy / length
-            
-            # 画箭头主线
-            painter.drawLine(start_point, end_point)
-            
-            # 计算箭头两边的点
-            # 箭头角度为30度（pi/6）
-            angle1 = math.atan2(udy, udx) + math.pi/6
-            angle2 = math.atan2(udy, udx) - math.pi/6
-            
-            arrow_p1 = QPointF(
-                end_point.x() - arrow_size * math.cos(angle1),
-                end_point.y() - arrow_size * math.sin(angle1)
-            )
-            arrow_p2 = QPointF(
-                end_point.x() - arrow_size * math.cos(angle2),
-                end_point.y() - arrow_size * math.sin(angle2)
-            )
-            
-            # 画箭头两边
-            painter.drawLine(end_point, arrow_p1)
-            painter.drawLine(end_point, arrow_p2)
-            
-        except Exception as e:
-            print(f"绘制箭头时出错: {str(e)}")
+        self.undo_btn.setEnabled(self.history.canUndo())
+        self.redo_btn.setEnabled(self.history.canRedo())
+        # 在按钮提示中显示历史记录占用的内存
+        memory_mb = self.history.memoryBytes() / (1024 * 1024)
+        disk_mb = self.history.diskBytes() / (1024 * 1024)
+        tip = f"历史记录占用内存 {memory_mb:.1f} MB"
+        if disk_mb > 0:
+            tip += f"，临时文件 {disk_mb:.1f} MB"
+        self.undo_btn.setToolTip(tip)
+        self.redo_btn.setToolTip(tip)
         
     def rotateImage(self, angle):
-        # 旋转图片
+        # 旋转图片：标注先合成进底图，旋转后的图片作为新的底图
         transform = QTransform().rotate(angle)
-        self.current_screenshot = self.current_screenshot.transformed(transform)
-        self.image_label.setPixmap(self.current_screenshot)
+        self.scene.update()
+        self.scene.setBase(self.scene.composite.transformed(transform))
+        self.refreshScene()
         self.addToHistory()
         
-    def applyMosaic(self, painter, start, end):
+    def mosaicBlockSize(self):
         # 马赛克块的大小
-        block_size = self.thickness_spin.value() * 5
+        return self.thickness_spin.value() * 5
+        
+    def applyMosaic(self, start, end):
+        """对start到end之间的区域打马赛克，返回修改的区域
+        
+        拖动时直接涂抹在合成缓存上，区域对齐到以图片原点为起点的网格，
+        松开鼠标后场景按同样的网格重新绘制，结果一致。
+        """
+        block_size = self.mosaicBlockSize()
         
         # 计算需要处理的矩形区域
         x1 = min(start.x(), end.x())
@@ -1116,57 +1467,19 @@ class EditorWindow(QWidget):
         x2 = min(self.current_screenshot.width(), x2 + block_size)
         y2 = min(self.current_screenshot.height(), y2 + block_size)
         
-        # 获取图片数据
-        image = self.current_screenshot.toImage()
-        
-        # 对区域内的每个块进行马赛克处理
-        for x in range(x1, x2, block_size):
-            for y in range(y1, y2, block_size):
-                # 计算块的平均颜色
-                r, g, b, count = 0, 0, 0, 0
-                for dx in range(block_size):
-                    for dy in range(block_size):
-                        if x + dx < x2 and y + dy < y2:
-                            pixel = image.pixel(x + dx, y + dy)
-                            color = QColor(pixel)
-                            r += color.red()
-                            g += color.green()
-                            b += color.blue()
-                            count += 1
-                
-                if count > 0:
-                    avg_color = QColor(r // count, g // count, b // count)
-                    painter.fillRect(x, y, block_size, block_size, avg_color)
-        
-    def paintEvent(self, event):
-        super().paintEvent(event)
-        
-        if self.preview_point and self.draw_mode == 'pen':
-            # 获取图片标签的位置
-            label_pos = self.image_label.pos()
-            # 转换预览点到窗口坐标系
-            window_pos = QPoint(self.preview_point.x() + label_pos.x(),
-                              self.preview_point.y() + label_pos.y())
-            
-            painter = QPainter(self)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-            
-            # 绘制画笔预览圆圈
-            painter.setPen(QPen(self.current_color, 1, Qt.PenStyle.SolidLine))
-            painter.setBrush(QColor(self.current_color.red(), 
-                                  self.current_color.green(),
-                                  self.current_color.blue(), 
-                                  100))
-            radius = int(self.thickness_spin.value() / 2)
-            painter.drawEllipse(window_pos, radius, radius)
-            
-            # 绘制十字线（确保十字线在圆圈中心）
-            line_length = radius  # 使用画笔半径作为十字线长度
-            painter.setPen(QPen(QColor(0, 0, 0), 1, Qt.PenStyle.SolidLine))
-            painter.drawLine(window_pos.x(), window_pos.y() - line_length,
-                           window_pos.x(), window_pos.y() + line_length)
-            painter.drawLine(window_pos.x() - line_length, window_pos.y(),
-                           window_pos.x() + line_length, window_pos.y())
+        # 只取出需要处理的区域，不转换整张截图
+        region = QRect(x1, y1, x2 - x1, y2 - y1)
+        if region.isEmpty():
+            return region
+        region = align_rect(region, block_size).intersected(self.current_screenshot.rect())
+        image = self.current_screenshot.copy(region).toImage()
+        pixelate(image, image.rect(), block_size)
+        
+        painter = QPainter(self.current_screenshot)
+        painter.drawImage(region.topLeft(), image)
+        painter.end()
+        self.mosaic_rects.append(region)
+        return region
             
     def closeEvent(self, event):
         # 窗口关闭时清理临时文件
@@ -1175,15 +1488,32 @@ class EditorWindow(QWidget):
                 os.remove(self.temp_file)
             except:
                 pass
+        self.release()
         super().closeEvent(event)
+        # 放回回收池，下次打开编辑窗口时直接复用；池已满时删除
+        if len(_editor_pool) < EDITOR_POOL_SIZE and self not in _editor_pool:
+            _editor_pool.append(self)
+        else:
+            self.deleteLater()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Escape:
-            if self.text_box.isVisible():
+            if self.text_box and self.text_box.isVisible():
                 self.text_box.hide()
                 self.text_position = None
             else:
                 self.confirmEdit()
+        elif event.modifiers() & Qt.KeyboardModifier.ControlModifier and \
+             event.key() in (Qt.Key.Key_0, Qt.Key.Key_1, Qt.Key.Key_Plus, Qt.Key.Key_Equal, Qt.Key.Key_Minus):
+            # Ctrl+0适应窗口，Ctrl+1原始大小，Ctrl+加号/减号缩放
+            if event.key() == Qt.Key.Key_0:
+                self.canvas.fitToView()
+            elif event.key() == Qt.Key.Key_1:
+                self.canvas.setZoom(1.0)
+            elif event.key() == Qt.Key.Key_Minus:
+                self.canvas.setZoom(self.canvas.zoom / 1.25)
+            else:
+                self.canvas.setZoom(self.canvas.zoom * 1.25)
         else:
             super().keyPressEvent(event)
 
@@ -1206,12 +1536,12 @@ class EditorWindow(QWidget):
         if color_dialog.exec() == QColorDialog.DialogCode.Accepted:
             color = color_dialog.currentColor()
             if color.isValid():
-                self.text_box.setBackgroundColor(color)
+                self.textBox().setBackgroundColor(color)
                 
     def setTextBackgroundTransparent(self, dialog):
         """设置文本背景为完全透明"""
         transparent_color = QColor(255, 255, 255, 0)
-        self.text_box.setBackgroundColor(transparent_color)
+        self.textBox().setBackgroundColor(transparent_color)
         dialog.close()
 
     def chooseTextBorderColor(self):
@@ -1280,14 +1610,14 @@ class EditorWindow(QWidget):
         if color_dialog.exec() == QColorDialog.DialogCode.Accepted:
             color = color_dialog.currentColor()
             if color.isValid():
-                self.text_box.setBorderColor(color)
+                self.textBox().setBorderColor(color)
                 self.text_box.setBorderWidth(thickness_spin.value())
                 self.text_box.setBorderStyle(style_map[style_combo.currentText()])
                 
     def setTextBorderTransparent(self, dialog):
         """设置文本边框为完全透明"""
         transparent_color = QColor(255, 255, 255, 0)
-        self.text_box.setBorderColor(transparent_color)
+        self.textBox().setBorderColor(transparent_color)
         dialog.close()
 
     def loadCustomIcons(self):
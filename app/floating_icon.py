@@ -1,12 +1,27 @@
-from PyQt6.QtWidgets import QWidget, QMenu
-from PyQt6.QtCore import Qt, QPoint, QTimer, QSettings
+import math
+from PyQt6.QtWidgets import QWidget, QMenu, QInputDialog, QApplication
+from PyQt6.QtCore import Qt, QPoint, QTimer, QSettings, QDateTime, pyqtSignal
 from PyQt6.QtGui import QPainter, QColor, QIcon, QPixmap
 from .settings_dialog import SettingsDialog
 from .screenshot import ScreenshotTool
 from .cursor_rules import CursorRules
+from .region_presets import RegionPresets
+from .burst_capture import BurstCapture, format_stats
+from .region_recorder import RegionRecorder, format_report
+from .region_watcher import RegionWatcher
+from .scroll_capture import ScrollingCapture
+from . import scroll_capture
+from . import region_watcher
+from . import metrics
+from .image_ops import image_shown_in
 import os
 
 class FloatingIcon(QWidget):
+    # 图标的隐藏事件处理完后发出，之后还要确认图标已经从屏幕上消失
+    iconHidden = pyqtSignal()
+    # 隐藏后最多再等待的帧数，超过后不再等待合成器刷新，直接截图
+    HIDE_CHECK_LIMIT = 6
+    
     def __init__(self):
         super().__init__()
         self.settings = QSettings('ScreenshotTool', 'Settings')
@@ -29,6 +44,44 @@ class FloatingIcon(QWidget):
         # 使用光标规则类设置光标
         self.setCursor(CursorRules.get_cursor_for_widget('floating_icon'))
         
+        # 预先创建截图窗口，之后每次截图都复用它
+        self.capture_pending = False
+        self.pending_action = None
+        self.trigger_time = None
+        # 隐藏前图标的位置和渲染结果，用于确认屏幕上已经没有图标
+        self.hidden_geometry = None
+        self.hidden_image = None
+        self.hide_checks = 0
+        self.screenshot_tool = ScreenshotTool()
+        self.screenshot_tool.finished.connect(self.onScreenshotFinished)
+        self.screenshot_tool.recordRequested.connect(self.startRecording)
+        self.screenshot_tool.scrollCaptureRequested.connect(self.startScrollCapture)
+        self.screenshot_tool.warmUp()
+        # 启动后空闲时预先创建编辑窗口（设置项editor_prewarm），第一次编辑截图时不需要等待创建控件
+        if str(self.settings.value('editor_prewarm', 'true')).lower() == 'true':
+            QTimer.singleShot(2000, self.prewarmEditor)
+        
+        # 隐藏事件处理完后再开始检查图标是否已经不在屏幕上
+        self.iconHidden.connect(self.onIconHidden, Qt.ConnectionType.QueuedConnection)
+        
+        # 上次截图区域和命名预设
+        self.presets = RegionPresets()
+        
+        # 正在进行的连拍和录制
+        self.burst = None
+        self.recorder = None
+        self.watcher = None
+        self.scroller = None
+        
+        # 通过命令打开的编辑窗口
+        self.editor = None
+        
+        # 本地HTTP截图接口，设置了端口时才启动
+        self.http_api = None
+        port = int(self.settings.value('http_api_port', 0))
+        if port > 0:
+            self.startHttpApi(port)
+        
     def loadCustomIcon(self):
         icon_path = self.settings.value('custom_icon_path', '')
         if icon_path and os.path.exists(icon_path):
@@ -43,10 +96,29 @@ class FloatingIcon(QWidget):
         else:
             # 绘制默认的粉色方块
             painter.fillRect(0, 0, 64, 64, QColor(255, 192, 203))
+        if self.burst is not None:
+            # 连拍期间显示红色边框
+            painter.setPen(QColor(255, 0, 0))
+            painter.drawRect(0, 0, 63, 63)
+        if self.recorder is not None:
+            # 录制期间显示蓝色边框
+            painter.setPen(QColor(0, 120, 255))
+            painter.drawRect(1, 1, 61, 61)
+        if self.watcher is not None:
+            # 监视期间显示绿色边框
+            painter.setPen(QColor(0, 200, 80))
+            painter.drawRect(2, 2, 59, 59)
+        if self.scroller is not None:
+            # 长截图期间显示橙色边框
+            painter.setPen(QColor(255, 150, 0))
+            painter.drawRect(3, 3, 57, 57)
             
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
             self.drag_position = event.globalPosition().toPoint() - self.frameGeometry().topLeft()
+        elif event.button() == Qt.MouseButton.MiddleButton:
+            # 中键：不显示遮罩，直接重复截取上次的区域
+            self.repeatLastRegion()
             
     def mouseMoveEvent(self, event):
         if event.buttons() == Qt.MouseButton.LeftButton:
@@ -54,8 +126,11 @@ class FloatingIcon(QWidget):
             
     def mouseDoubleClickEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
-            self.hide()  # 先隐藏悬浮图标
-            QTimer.singleShot(200, self.startScreenshot)  # 增加延迟时间
+            if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+                # Ctrl+双击：选择区域预设
+                self.showPresetMenu(event.globalPosition().toPoint())
+            else:
+                self.requestScreenshot()
         elif event.button() == Qt.MouseButton.RightButton:
             self.showSettingsDialog()
             
@@ -63,11 +138,322 @@ class FloatingIcon(QWidget):
         settings = SettingsDialog(self)
         settings.exec()
         
+    def showPresetMenu(self, pos):
+        menu = QMenu(self)
+        last_region = self.presets.lastRegion()
+        repeat_action = menu.addAction('重复上次区域', self.repeatLastRegion)
+        repeat_action.setEnabled(last_region is not None)
+        
+        presets = self.presets.presets()
+        if presets:
+            menu.addSeparator()
+            for name, rect in presets.items():
+                menu.addAction(f'{name}  ({rect.width()} x {rect.height()})',
+                               lambda checked=False, rect=rect: self.requestRegionCapture(rect))
+                               
+        menu.addSeparator()
+        if self.burst is not None:
+            menu.addAction('停止连拍', self.stopBurst)
+        else:
+            burst_action = menu.addAction('连拍上次区域', self.startBurst)
+            burst_action.setEnabled(last_region is not None)
+        if self.recorder is not None:
+            menu.addAction('停止录制', self.stopRecording)
+        else:
+            record_action = menu.addAction('录制上次区域', lambda checked=False: self.startRecording(self.presets.lastRegion()))
+            record_action.setEnabled(last_region is not None)
+        if self.watcher is not None:
+            menu.addAction('停止监视', self.stopWatching)
+        else:
+            watch_action = menu.addAction('监视上次区域的变化', self.startWatching)
+            watch_action.setEnabled(last_region is not None)
+        if self.scroller is not None:
+            menu.addAction('停止长截图', self.stopScrollCapture)
+        else:
+            scroll_action = menu.addAction('长截图上次区域', lambda checked=False: self.startScrollCapture(self.presets.lastRegion()))
+            scroll_action.setEnabled(last_region is not None)
+            
+        menu.addSeparator()
+        save_action = menu.addAction('将上次区域保存为预设...', self.saveLastRegionAsPreset)
+        save_action.setEnabled(last_region is not None)
+        if presets:
+            remove_menu = menu.addMenu('删除预设')
+            for name in presets:
+                remove_menu.addAction(name, lambda checked=False, name=name: self.presets.removePreset(name))
+        menu.exec(pos)
+        
+    def saveLastRegionAsPreset(self):
+        rect = self.presets.lastRegion()
+        if rect is None:
+            return
+        name, ok = QInputDialog.getText(self, '保存区域预设', '预设名称:')
+        name = name.strip().replace('/', '_')
+        if ok and name:
+            self.presets.savePreset(name, rect)
+            
+    def startBurst(self):
+        """按设置的间隔连续截取上次的区域，直到再次从菜单停止"""
+        rect = self.presets.lastRegion()
+        if rect is None or self.burst is not None:
+            return
+        if self.frameGeometry().intersects(rect):
+            print("悬浮图标位于连拍区域内，会出现在截图中")
+        try:
+            interval_ms = int(self.settings.value('burst_interval_ms', 300))
+            max_bytes = int(self.settings.value('burst_buffer_mb', 256)) * 1024 * 1024
+            self.burst = BurstCapture(self.screenshot_tool, rect, interval_ms, max_bytes, parent=self)
+            self.burst.statsChanged.connect(lambda stats: self.setToolTip(format_stats(stats)))
+            self.burst.stopped.connect(self.onBurstStopped)
+            self.burst.start()
+            self.update()
+        except Exception as e:
+            print(f"启动连拍时出错: {str(e)}")
+            self.burst = None
+            
+    def stopBurst(self):
+        if self.burst is not None:
+            self.burst.stop()
+            
+    def onBurstStopped(self, stats):
+        print(f"连拍结束: {format_stats(stats)}，保存到 {stats['directory']}")
+        self.burst.deleteLater()
+        self.burst = None
+        self.setToolTip('')
+        self.update()
+        
+    def startRecording(self, rect):
+        """按设置的帧率录制区域，编码在后台完成"""
+        if rect is None or self.recorder is not None:
+            return
+        try:
+            fps = int(self.settings.value('record_fps', 10))
+            record_format = self.settings.value('record_format', 'webp')
+            directory = self.settings.value('save_path', '') or os.path.expanduser('~')
+            timestamp = QDateTime.currentDateTime().toString('yyyyMMdd_hhmmss')
+            filename = os.path.join(directory, f'recording_{timestamp}.{record_format}')
+            self.recorder = RegionRecorder(self.screenshot_tool, rect, filename, fps, parent=self)
+            self.recorder.finished.connect(self.onRecordingFinished)
+            self.recorder.start()
+            self.update()
+        except Exception as e:
+            print(f"开始录制时出错: {str(e)}")
+            self.recorder = None
+            
+    def stopRecording(self):
+        if self.recorder is not None:
+            self.recorder.stop()
+            
+    def onRecordingFinished(self, report):
+        print(format_report(report))
+        self.recorder.deleteLater()
+        self.recorder = None
+        self.update()
+            
+    def startWatching(self):
+        """监视上次的区域，画面变化超过阈值时保存到存储路径"""
+        rect = self.presets.lastRegion()
+        if rect is None or self.watcher is not None:
+            return
+        try:
+            self.watcher = RegionWatcher(
+                self.screenshot_tool, rect,
+                interval_ms=int(self.settings.value('watch_interval_ms', 1000)),
+                threshold=float(self.settings.value('watch_threshold', 0.01)),
+                pixel_threshold=int(self.settings.value('watch_pixel_threshold', 24)),
+                parent=self
+            )
+            self.watcher.changed.connect(lambda filename, score: self.setToolTip(
+                region_watcher.format_stats(self.watcher.stats())))
+            self.watcher.start()
+            self.update()
+        except Exception as e:
+            print(f"开始监视时出错: {str(e)}")
+            self.watcher = None
+            
+    def stopWatching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            print(f"监视结束: {region_watcher.format_stats(self.watcher.stats())}")
+            self.watcher.deleteLater()
+            self.watcher = None
+            self.setToolTip('')
+            self.update()
+            
+    def startScrollCapture(self, rect):
+        """开始长截图：用户滚动区域中的内容，停止滚动几秒后自动结束并输出长图"""
+        if rect is None or self.scroller is not None:
+            return
+        try:
+            self.scroller = ScrollingCapture(
+                self.screenshot_tool, rect,
+                interval_ms=int(self.settings.value('scroll_interval_ms', 150)),
+                idle_seconds=float(self.settings.value('scroll_idle_seconds', 3.0)),
+                parent=self
+            )
+            self.scroller.finished.connect(self.onScrollCaptureFinished)
+            self.scroller.start()
+            self.update()
+        except Exception as e:
+            print(f"开始长截图时出错: {str(e)}")
+            self.scroller = None
+            
+    def stopScrollCapture(self):
+        if self.scroller is not None:
+            self.scroller.stop()
+            
+    def onScrollCaptureFinished(self, stats):
+        print(scroll_capture.format_stats(stats))
+        self.scroller.deleteLater()
+        self.scroller = None
+        self.update()
+        
+    def startHttpApi(self, port):
+        """启动本地HTTP截图接口，所有连接共享截图工具的区域截图"""
+        try:
+            from .http_api import FrameHub, HttpApi, new_token
+            # 访问令牌保存在设置中，第一次启动接口时生成
+            token = self.settings.value('http_api_token', '')
+            if not token:
+                token = new_token()
+                self.settings.setValue('http_api_token', token)
+            hub = FrameHub(self.screenshot_tool.grabRegion, self.screenshot_tool.backend.screens, self)
+            self.http_api = HttpApi(hub, port, token=token)
+            self.http_api.start()
+            QApplication.instance().aboutToQuit.connect(self.http_api.stop)
+            print(f"HTTP截图接口已启动: http://127.0.0.1:{self.http_api.port}/ （令牌见设置项 http_api_token）")
+        except Exception as e:
+            print(f"启动HTTP截图接口时出错: {str(e)}")
+            self.http_api = None
+            
+    def handleCommand(self, command, argument=''):
+        """执行单实例服务收到的命令，返回错误信息，成功时返回None"""
+        if command == 'capture':
+            if self.screenshot_tool.isVisible():
+                return '正在截图'
+            self.requestScreenshot()
+        elif command == 'repeat-last':
+            if self.presets.lastRegion() is None:
+                return '还没有可以重复的截图区域'
+            self.repeatLastRegion()
+        elif command == 'open':
+            return self.openImage(argument)
+        elif command == 'show':
+            self.show()
+            self.raise_()
+        elif command == 'quit':
+            QApplication.quit()
+        else:
+            return f'未知命令: {command}'
+        return None
+        
+    def prewarmEditor(self):
+        from .editor_window import prewarm_editor
+        prewarm_editor()
+        
+    def openImage(self, path):
+        """在编辑窗口中打开图片文件"""
+        pixmap = QPixmap(path)
+        if pixmap.isNull():
+            return f'无法打开图片: {path}'
+        from .editor_window import open_editor
+        self.editor = open_editor(pixmap)
+        self.editor.raise_()
+        self.editor.activateWindow()
+        return None
+        
+    def repeatLastRegion(self):
+        rect = self.presets.lastRegion()
+        if rect is None:
+            print("还没有可以重复的截图区域")
+            return
+        self.requestRegionCapture(rect)
+        
+    def requestRegionCapture(self, rect):
+        """直接截取区域，图标挡住区域时才先隐藏图标"""
+        if self.frameGeometry().intersects(rect):
+            self.requestCapture(lambda: self.captureRegion(rect))
+        else:
+            self.trigger_time = metrics.now()
+            self.captureRegion(rect)
+            
+    def captureRegion(self, rect):
+        try:
+            self.screenshot_tool.captureRegion(rect, self.trigger_time)
+        except Exception as e:
+            print(f"截取区域时出错: {str(e)}")
+        self.show()
+        
+    def requestScreenshot(self):
+        """请求截图：先隐藏悬浮图标，隐藏完成后再开始截图"""
+        self.requestCapture(self.startScreenshot)
+        
+    def requestCapture(self, action):
+        """隐藏悬浮图标后再执行截图动作，避免图标出现在截图中"""
+        self.trigger_time = metrics.now()
+        if self.isVisible():
+            self.capture_pending = True
+            self.pending_action = action
+            self.hidden_geometry = self.frameGeometry()
+            self.hidden_image = self.grab().toImage()
+            self.hide_checks = 0
+            self.hide()
+        else:
+            action()
+            
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if self.capture_pending:
+            self.iconHidden.emit()
+            
+    def onIconHidden(self):
+        """窗口隐藏后合成器还需要刷新一帧屏幕才会真正去掉图标"""
+        if self.capture_pending:
+            QTimer.singleShot(self.frameInterval(), self.checkIconHidden)
+            
+    def frameInterval(self):
+        """图标所在屏幕刷新一帧的毫秒数"""
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return math.ceil(1000 / rate) if rate > 0 else 17
+        
+    def checkIconHidden(self):
+        """截取图标原来所在的区域，仍能看到图标时再等一帧"""
+        if not self.capture_pending:
+            return
+        if self.isVisible():
+            # 等待期间图标又被显示出来，放弃这次截图
+            self.capture_pending = False
+            self.pending_action = None
+            return
+        on_screen = self.iconOnScreen()
+        if on_screen and self.hide_checks < self.HIDE_CHECK_LIMIT:
+            self.hide_checks += 1
+            QTimer.singleShot(self.frameInterval(), self.checkIconHidden)
+            return
+        if on_screen:
+            print("等待悬浮图标从屏幕上消失超时，直接开始截图")
+        metrics.record('icon_hide_wait', metrics.elapsed_ms(self.trigger_time))
+        self.capture_pending = False
+        self.hidden_image = None
+        action, self.pending_action = self.pending_action, None
+        action()
+        
+    def iconOnScreen(self):
+        try:
+            geometry = self.hidden_geometry
+            backend = self.screenshot_tool.backend
+            for screen in backend.screens():
+                if screen.geometry.contains(geometry.center()):
+                    part = geometry.intersected(screen.geometry).translated(-screen.geometry.topLeft())
+                    grabbed = backend.grabScreen(screen, part).toImage()
+                    return image_shown_in(self.hidden_image, grabbed)
+        except Exception as e:
+            print(f"检查悬浮图标是否隐藏时出错: {str(e)}")
+        return False
+            
     def startScreenshot(self):
         try:
-            self.screenshot_tool = ScreenshotTool()
-            self.screenshot_tool.finished.connect(self.onScreenshotFinished)
-            QTimer.singleShot(100, self.screenshot_tool.start)  # 延迟启动截图
+            self.screenshot_tool.start(self.trigger_time)
         except Exception as e:
             print(f"启动截图工具时出错: {str(e)}")
             self.show()  # 如果出错，重新显示图标
@@ -0,0 +1,377 @@
+"""可选的本地HTTP截图接口，供测试脚本远程获取被测机器的画面
+
+    GET /screens                                    屏幕列表（JSON）
+    GET /capture?region=x,y,w,h&format=png          截取区域，也可以用 screen=序号；默认整个虚拟桌面
+    GET /capture?screen=0&format=jpeg&quality=80
+    GET /stream?region=x,y,w,h&fps=10&quality=70   multipart MJPEG流，frames=N 时发送N帧后结束
+
+每个请求都必须带上令牌（查询参数 token=... 或请求头 X-Api-Token），Host 必须是
+127.0.0.1:<端口> 或 localhost:<端口>，否则返回403，防止网页通过DNS重绑定读取屏幕。
+
+HTTP服务运行在后台线程中，每个连接一个线程。截图只能在界面线程进行，所有连接通过
+FrameHub共享截图：同一区域在同一个周期内只截取一次，截图转换为QImage后交给各连接的
+线程编码，同一帧编码出的数据也只生成一次。
+"""
+import hmac
+import json
+import time
+import secrets
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from PyQt6.QtCore import Qt, QObject, QTimer, QRect, QBuffer, QIODevice, pyqtSignal
+from .region_presets import region_from_text
+from .capture_backend import MAX_REGION_SIZE
+from . import metrics
+
+BOUNDARY = 'frame'
+TOKEN_HEADER = 'X-Api-Token'
+
+def new_token():
+    """生成访问令牌"""
+    return secrets.token_urlsafe(24)
+
+def encode_image(image, fmt, quality=-1):
+    """把QImage编码为PNG/JPEG数据，QImage可以在任意线程中使用"""
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, fmt, quality)
+    return bytes(buffer.data())
+
+class SharedFrame:
+    """某个区域的一次截图，image为None表示区域不在任何屏幕上"""
+    __slots__ = ('image', 'serial', 'time', 'encoded', 'lock')
+    
+    def __init__(self, image, serial):
+        self.image = image
+        self.serial = serial
+        self.time = time.perf_counter()
+        self.encoded = {}
+        self.lock = threading.Lock()
+        
+    def encode(self, fmt, quality=-1):
+        """同一帧同样格式的数据只编码一次，由第一个需要它的连接线程完成"""
+        key = (fmt, quality)
+        with self.lock:
+            data = self.encoded.get(key)
+            if data is None:
+                start = metrics.now()
+                data = self.encoded[key] = encode_image(self.image, fmt, quality)
+                metrics.record('http_encode', metrics.elapsed_ms(start))
+        return data
+
+class FrameHub(QObject):
+    """在界面线程中为所有HTTP连接截图
+    
+    grab(rect)在界面线程中调用，返回QPixmap或None；screens()返回ScreenInfo列表。
+    capture/subscribe/waitFrame可以在任意线程中调用，其余方法只在界面线程中运行。
+    单次截图的请求在界面线程处理之前会合并；有视频流时按其中最高的帧率定时截图，
+    同一区域的单次截图直接使用这一周期的帧。
+    """
+    grabRequested = pyqtSignal()
+    streamsChanged = pyqtSignal()
+    
+    def __init__(self, grab, screens, parent=None):
+        super().__init__(parent)
+        self.grab = grab
+        self.screens = screens
+        self.condition = threading.Condition()
+        self.frames = {}
+        self.pending = set()
+        # 区域 -> 各视频流的帧率列表
+        self.streams = {}
+        self.grab_scheduled = False
+        self.serial = 0
+        self.grabs = 0
+        # 定时截图的间隔，没有视频流时为0
+        self.interval_ms = 0
+        self.stopping = False
+        self.screen_rects = []
+        self.refreshScreens()
+        
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        # 其他线程发出的信号排队到界面线程执行
+        self.grabRequested.connect(self.tick, Qt.ConnectionType.QueuedConnection)
+        self.streamsChanged.connect(self.updateTimer, Qt.ConnectionType.QueuedConnection)
+        
+    @staticmethod
+    def regionKey(rect):
+        return (rect.x(), rect.y(), rect.width(), rect.height())
+        
+    def refreshScreens(self):
+        rects = [(screen.name, QRect(screen.geometry)) for screen in self.screens()]
+        with self.condition:
+            self.screen_rects = rects
+            
+    def screenList(self):
+        with self.condition:
+            return [(name, QRect(rect)) for name, rect in self.screen_rects]
+            
+    def virtualGeometry(self):
+        geometry = QRect()
+        for _, rect in self.screenList():
+            geometry = geometry.united(rect)
+        return geometry
+        
+    def capture(self, rect, timeout=5.0):
+        """截取区域，返回SharedFrame，超时或服务停止时返回None"""
+        key = self.regionKey(rect)
+        with self.condition:
+            frame = self.frames.get(key)
+            if frame is not None and key in self.streams and self.interval_ms:
+                # 正在推流的区域：使用最近一个周期的帧
+                if (time.perf_counter() - frame.time) * 1000 <= self.interval_ms:
+                    return frame
+            serial = frame.serial if frame is not None else 0
+            self.pending.add(key)
+            if not self.grab_scheduled:
+                self.grab_scheduled = True
+                self.grabRequested.emit()
+        return self.waitFrame(key, serial, timeout)
+        
+    def subscribe(self, rect, fps):
+        key = self.regionKey(rect)
+        with self.condition:
+            self.streams.setdefault(key, []).append(fps)
+        self.streamsChanged.emit()
+        return key
+        
+    def unsubscribe(self, key, fps):
+        with self.condition:
+            rates = self.streams.get(key, [])
+            if fps in rates:
+                rates.remove(fps)
+            if not rates:
+                self.streams.pop(key, None)
+        self.streamsChanged.emit()
+        
+    def waitFrame(self, key, after_serial, timeout=5.0):
+        """等待区域中序号大于after_serial的帧"""
+        deadline = time.perf_counter() + timeout
+        with self.condition:
+            while not self.stopping:
+                frame = self.frames.get(key)
+                if frame is not None and frame.serial > after_serial:
+                    return frame
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    return None
+        return None
+        
+    def updateTimer(self):
+        with self.condition:
+            fps = max([max(rates) for rates in self.streams.values()] or [0])
+            self.interval_ms = max(1, round(1000 / fps)) if fps > 0 else 0
+        if fps <= 0:
+            self.timer.stop()
+            return
+        self.timer.setInterval(self.interval_ms)
+        if not self.timer.isActive():
+            self.timer.start()
+            self.tick()
+            
+    def tick(self):
+        """为所有等待中的区域各截一次图"""
+        self.refreshScreens()
+        with self.condition:
+            self.grab_scheduled = False
+            keys = self.pending | set(self.streams)
+            self.pending = set()
+        if not keys:
+            return
+        start = metrics.now()
+        grabbed = {}
+        for key in keys:
+            pixmap = self.grab(QRect(*key))
+            # QPixmap只能在界面线程中使用，转换为QImage后交给连接线程
+            image = pixmap.toImage() if pixmap is not None else None
+            self.serial += 1
+            grabbed[key] = SharedFrame(image, self.serial)
+            self.grabs += 1
+        metrics.record('http_grab', metrics.elapsed_ms(start))
+        with self.condition:
+            # 不再需要的区域只保留到下一次截图，避免一直占用内存
+            for key in list(self.frames):
+                if key not in keys and key not in self.streams:
+                    del self.frames[key]
+            self.frames.update(grabbed)
+            self.condition.notify_all()
+            
+    def stop(self):
+        self.timer.stop()
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'ScreenshotTool'
+    
+    def log_message(self, format, *args):
+        pass
+        
+    def authorized(self, query):
+        """Host必须是本机地址加端口，并且带有正确的令牌"""
+        port = self.server.server_address[1]
+        host = (self.headers.get('Host') or '').lower()
+        if host not in (f'127.0.0.1:{port}', f'localhost:{port}'):
+            return False
+        token = query.get('token') or self.headers.get(TOKEN_HEADER) or ''
+        return hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8'))
+        
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if not self.authorized(query):
+                self.sendError(403, '没有访问权限')
+            elif url.path == '/screens':
+                self.sendScreens()
+            elif url.path == '/capture':
+                self.sendCapture(query)
+            elif url.path == '/stream':
+                self.sendStream(query)
+            else:
+                self.sendError(404, '未知的路径')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except ValueError as e:
+            self.sendError(400, str(e))
+            
+    def sendError(self, code, message):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def sendScreens(self):
+        screens = [{'name': name, 'region': [rect.x(), rect.y(), rect.width(), rect.height()]}
+                   for name, rect in self.server.hub.screenList()]
+        body = json.dumps(screens, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def requestRegion(self, query):
+        """region=x,y,w,h 或 screen=序号，都没有时为整个虚拟桌面
+        
+        region只保留在虚拟桌面内的部分；过大或不在任何屏幕上的区域在截图之前就返回400。
+        """
+        hub = self.server.hub
+        if 'region' in query:
+            rect = region_from_text(query['region'])
+            if rect is None:
+                raise ValueError('region应为 x,y,w,h')
+            if rect.width() > MAX_REGION_SIZE or rect.height() > MAX_REGION_SIZE:
+                raise ValueError(f'region的宽和高不能超过 {MAX_REGION_SIZE}')
+            rect = rect.intersected(hub.virtualGeometry())
+            if rect.isEmpty():
+                raise ValueError('区域不在任何屏幕上')
+            return rect
+        if 'screen' in query:
+            screens = hub.screenList()
+            index = int(query['screen'])
+            if not 0 <= index < len(screens):
+                raise ValueError(f'没有序号为 {index} 的屏幕')
+            return screens[index][1]
+        return hub.virtualGeometry()
+        
+    @staticmethod
+    def imageFormat(query):
+        fmt = query.get('format', 'png').lower()
+        if fmt in ('jpg', 'jpeg'):
+            return 'JPEG', 'image/jpeg', int(query.get('quality', 85))
+        if fmt == 'png':
+            return 'PNG', 'image/png', -1
+        raise ValueError('format应为png或jpeg')
+        
+    def sendCapture(self, query):
+        rect = self.requestRegion(query)
+        fmt, content_type, quality = self.imageFormat(query)
+        frame = self.server.hub.capture(rect)
+        if frame is None:
+            self.sendError(503, '截图超时')
+            return
+        if frame.image is None:
+            self.sendError(404, '区域不在任何屏幕上')
+            return
+        body = frame.encode(fmt, quality)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def sendStream(self, query):
+        rect = self.requestRegion(query)
+        fps = min(60.0, max(0.1, float(query.get('fps', 10))))
+        quality = int(query.get('quality', 70))
+        max_frames = int(query.get('frames', 0))
+        hub = self.server.hub
+        key = hub.subscribe(rect, fps)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            
+            interval = 1.0 / fps
+            next_time = time.perf_counter()
+            serial = 0
+            sent = 0
+            while not max_frames or sent < max_frames:
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # 帧率低于截图周期时跳过中间的帧，只发送最新的一帧
+                frame = hub.waitFrame(key, serial)
+                if frame is None or frame.image is None:
+                    break
+                serial = frame.serial
+                data = frame.encode('JPEG', quality)
+                self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                 f'Content-Length: {len(data)}\r\n\r\n'.encode('ascii'))
+                self.wfile.write(data)
+                self.wfile.write(b'\r\n')
+                self.wfile.flush()
+                sent += 1
+                next_time = max(next_time + interval, time.perf_counter() - interval)
+        finally:
+            hub.unsubscribe(key, fps)
+
+class HttpApi:
+    """在后台线程中运行的HTTP服务，只监听本机地址，token为None时生成一个随机令牌"""
+    
+    def __init__(self, hub, port=8765, host='127.0.0.1', token=None):
+        self.hub = hub
+        self.host = host
+        self.requested_port = port
+        self.token = token or new_token()
+        self.httpd = None
+        self.thread = None
+        
+    @property
+    def port(self):
+        return self.httpd.server_address[1] if self.httpd is not None else None
+        
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.requested_port), ApiRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.hub = self.hub
+        self.httpd.token = self.token
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='http-api', daemon=True)
+        self.thread.start()
+        
+    def stop(self):
+        if self.httpd is None:
+            return
+        self.hub.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd = None
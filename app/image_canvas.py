@@ -0,0 +1,268 @@
+import math
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QRect, QRectF, QPoint, QPointF, QSize
+from PyQt6.QtGui import QPainter, QPixmap, QColor
+from . import metrics
+
+# 显示时按块处理：只准备可见的块，缩小显示用的各级缩略图也按块失效和重建
+TILE_SIZE = 256
+
+class ImageCanvas(QWidget):
+    """编辑窗口的图片显示区域，替代QLabel，支持缩放和平移
+    
+    直接绘制编辑器持有的QPixmap（同一个对象，不复制），每次只重绘失效的区域。
+    缩小显示时使用逐级减半的缩略图（mip），第一次用到某一级时才生成，
+    截图修改后只把对应的块标记为失效，显示到这些块时再从上一级重新生成。
+    正在拖动的图形、画笔光标等由overlay_painter按图片坐标画在截图之上，不写入截图。
+    Ctrl+滚轮缩放，滚轮上下平移，Shift+滚轮左右平移。
+    """
+    MIN_ZOOM = 0.05
+    MAX_ZOOM = 16.0
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pixmap = None
+        # overlay_painter(painter)在截图之上绘制预览，painter已经变换到图片坐标
+        self.overlay_painter = None
+        self.zoom = 1.0
+        # 图片左上角在控件中的位置
+        self.offset = QPointF(0, 0)
+        # 为True时随控件大小自动缩放到完整显示
+        self.fit_to_view = True
+        # 第k级缩略图为原图缩小2^k倍，levels[0]为None（直接使用原图）
+        self.levels = [None]
+        # 每一级中失效的块
+        self.dirty_tiles = [set()]
+        # 下一次绘制完成后调用一次（测量打开编辑窗口到第一次绘制的耗时）
+        self.first_paint_callback = None
+        # 没有按键时的移动也需要传给编辑窗口（画笔光标预览）
+        self.setMouseTracking(True)
+        self.setMinimumSize(200, 150)
+        
+    def setPixmap(self, pixmap):
+        """显示新的截图，尺寸不变时只需要重绘"""
+        resized = self._pixmap is None or self._pixmap.size() != pixmap.size()
+        self._pixmap = pixmap
+        # 缩略图都需要重新生成
+        self.levels = [None]
+        self.dirty_tiles = [set()]
+        if resized:
+            self.updateGeometry()
+            if self.fit_to_view:
+                self.fitToView()
+            else:
+                self.clampOffset()
+        self.update()
+        
+    def pixmap(self):
+        return self._pixmap
+        
+    def clear(self):
+        """不再显示截图，释放截图和缩略图"""
+        self._pixmap = None
+        self.levels = [None]
+        self.dirty_tiles = [set()]
+        self.first_paint_callback = None
+        self.update()
+        
+    def sizeHint(self):
+        """与图片一样大，但不超过屏幕可用区域的大部分"""
+        if self._pixmap is None:
+            return QSize(0, 0)
+        size = QSize(self._pixmap.size())
+        screen = self.screen()
+        if screen is not None:
+            available = screen.availableGeometry().size() * 0.8
+            size = size.boundedTo(QSize(available.width() - 220, available.height()))
+        return size
+        
+    def setZoom(self, zoom, anchor=None):
+        """缩放，anchor（控件坐标）下的图片内容保持不动，默认以控件中心为准"""
+        zoom = max(self.MIN_ZOOM, min(self.MAX_ZOOM, zoom))
+        if anchor is None:
+            anchor = QPointF(self.width() / 2, self.height() / 2)
+        anchor = QPointF(anchor)
+        image_point = (anchor - self.offset) / self.zoom
+        self.zoom = zoom
+        self.offset = anchor - image_point * zoom
+        self.fit_to_view = False
+        self.clampOffset()
+        self.update()
+        
+    def fitToView(self):
+        """缩放到完整显示图片，图片比控件小时按原始大小显示"""
+        self.fit_to_view = True
+        if self._pixmap is None or self.width() <= 0 or self.height() <= 0:
+            return
+        self.zoom = min(1.0, self.width() / self._pixmap.width(), self.height() / self._pixmap.height())
+        self.clampOffset()
+        self.update()
+        
+    def clampOffset(self):
+        """图片比控件小时居中，否则不允许移出控件留下空白"""
+        if self._pixmap is None:
+            return
+        x, y = self.offset.x(), self.offset.y()
+        width = self._pixmap.width() * self.zoom
+        height = self._pixmap.height() * self.zoom
+        x = (self.width() - width) / 2 if width <= self.width() else min(0.0, max(self.width() - width, x))
+        y = (self.height() - height) / 2 if height <= self.height() else min(0.0, max(self.height() - height, y))
+        self.offset = QPointF(round(x), round(y))
+        
+    def panBy(self, dx, dy):
+        self.offset += QPointF(dx, dy)
+        self.clampOffset()
+        self.update()
+        
+    def imagePos(self, pos):
+        """控件坐标转换为图片坐标"""
+        point = (QPointF(pos) - self.offset) / self.zoom
+        return QPoint(math.floor(point.x()), math.floor(point.y()))
+        
+    def widgetPos(self, point):
+        """图片坐标转换为控件坐标（像素中心）"""
+        return (QPointF(point) + QPointF(0.5, 0.5)) * self.zoom + self.offset
+        
+    def widgetRect(self, rect):
+        """图片坐标中的区域在控件中覆盖的范围"""
+        return QRectF(self.offset.x() + rect.x() * self.zoom, self.offset.y() + rect.y() * self.zoom,
+                      rect.width() * self.zoom, rect.height() * self.zoom).toAlignedRect().adjusted(-1, -1, 1, 1)
+                      
+    def visibleImageRect(self, widget_rect):
+        """控件中的区域对应的图片区域"""
+        top_left = (QPointF(widget_rect.topLeft()) - self.offset) / self.zoom
+        size = QSize(math.ceil(widget_rect.width() / self.zoom) + 2, math.ceil(widget_rect.height() / self.zoom) + 2)
+        return QRect(QPoint(math.floor(top_left.x()) - 1, math.floor(top_left.y()) - 1), size).intersected(
+            QRect(QPoint(0, 0), self._pixmap.size()))
+            
+    def markDirty(self, rect):
+        """截图中rect的内容变化：各级缩略图中对应的块失效"""
+        for level in range(1, len(self.levels)):
+            scale = 2 ** level
+            tile = TILE_SIZE * scale
+            for tile_y in range(rect.top() // tile, rect.bottom() // tile + 1):
+                for tile_x in range(rect.left() // tile, rect.right() // tile + 1):
+                    self.dirty_tiles[level].add((tile_x, tile_y))
+        
+    def updateImageRect(self, rect):
+        """截图中rect（图片坐标）的内容或其上的预览发生了变化"""
+        if self._pixmap is None:
+            return
+        rect = rect.intersected(QRect(QPoint(0, 0), self._pixmap.size()))
+        if rect.isEmpty():
+            return
+        self.markDirty(rect)
+        self.update(self.widgetRect(rect).intersected(self.rect()))
+        
+    def repaintImageRect(self, rect):
+        """与updateImageRect相同，但立即重绘"""
+        if self._pixmap is None:
+            return
+        rect = rect.intersected(QRect(QPoint(0, 0), self._pixmap.size()))
+        if rect.isEmpty():
+            return
+        self.markDirty(rect)
+        self.repaint(self.widgetRect(rect).intersected(self.rect()))
+        
+    def levelFor(self, zoom):
+        """缩小到一半以下时使用缩略图，第k级的缩放比例不小于zoom"""
+        if zoom >= 0.5:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / zoom))), 12)
+        
+    def ensureLevel(self, level, rect):
+        """保证第level级缩略图中覆盖rect（该级坐标）的块是最新的，只处理这些块"""
+        while len(self.levels) <= level:
+            previous = self.levels[-1] if len(self.levels) > 1 else self._pixmap
+            pixmap = QPixmap(max(1, (previous.width() + 1) // 2), max(1, (previous.height() + 1) // 2))
+            pixmap.fill(QColor(0, 0, 0, 0))
+            self.levels.append(pixmap)
+            # 新建的一级全部失效，用到哪些块再生成哪些块
+            self.dirty_tiles.append({(x, y) for y in range(pixmap.height() // TILE_SIZE + 1)
+                                     for x in range(pixmap.width() // TILE_SIZE + 1)})
+        if level == 0:
+            return
+        pixmap = self.levels[level]
+        rect = rect.intersected(pixmap.rect())
+        if rect.isEmpty():
+            return
+        dirty = self.dirty_tiles[level]
+        stale = [(x, y) for y in range(rect.top() // TILE_SIZE, rect.bottom() // TILE_SIZE + 1)
+                 for x in range(rect.left() // TILE_SIZE, rect.right() // TILE_SIZE + 1) if (x, y) in dirty]
+        if not stale:
+            return
+        source_bounds = QRect()
+        for x, y in stale:
+            source_bounds = source_bounds.united(QRect(x * TILE_SIZE * 2, y * TILE_SIZE * 2, TILE_SIZE * 2, TILE_SIZE * 2))
+        # 先保证上一级对应的块是最新的
+        self.ensureLevel(level - 1, source_bounds)
+        source = self.levels[level - 1] if level > 1 else self._pixmap
+        painter = QPainter(pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        # 缩小一半时双线性插值正好取2x2像素的平均值
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        for x, y in stale:
+            target = QRect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE).intersected(pixmap.rect())
+            painter.drawPixmap(QRectF(target), source, QRectF(target.x() * 2, target.y() * 2,
+                                                             target.width() * 2, target.height() * 2))
+            dirty.discard((x, y))
+        painter.end()
+        metrics.record('canvas_mip_tiles', len(stale), '块')
+            
+    def paintEvent(self, event):
+        if self._pixmap is None:
+            return
+        start = metrics.now()
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), self.palette().color(self.backgroundRole()))
+        visible = self.visibleImageRect(event.rect())
+        if not visible.isEmpty():
+            level = self.levelFor(self.zoom)
+            if self.zoom != 1.0:
+                painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, self.zoom < 1.0)
+            if level == 0:
+                source = QRectF(visible)
+                pixmap = self._pixmap
+            else:
+                # 只生成可见部分的缩略图块
+                scale = 2 ** level
+                level_rect = QRect(visible.x() // scale, visible.y() // scale,
+                                   visible.width() // scale + 2, visible.height() // scale + 2)
+                self.ensureLevel(level, level_rect)
+                pixmap = self.levels[level]
+                source = QRectF(visible.x() / scale, visible.y() / scale, visible.width() / scale, visible.height() / scale)
+            target = QRectF(self.offset.x() + visible.x() * self.zoom, self.offset.y() + visible.y() * self.zoom,
+                            visible.width() * self.zoom, visible.height() * self.zoom)
+            painter.drawPixmap(target, pixmap, source)
+        if self.overlay_painter is not None:
+            painter.setClipRect(event.rect())
+            painter.translate(self.offset)
+            painter.scale(self.zoom, self.zoom)
+            self.overlay_painter(painter)
+        painter.end()
+        metrics.record('editor_paint', metrics.elapsed_ms(start))
+        if self.first_paint_callback is not None:
+            callback = self.first_paint_callback
+            self.first_paint_callback = None
+            callback()
+
+    def resizeEvent(self, event):
+        if self.fit_to_view:
+            self.fitToView()
+        else:
+            self.clampOffset()
+        super().resizeEvent(event)
+        
+    def wheelEvent(self, event):
+        delta = event.angleDelta()
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            # 每一格放大或缩小约19%
+            steps = delta.y() / 120.0
+            self.setZoom(self.zoom * (1.19 ** steps), event.position())
+        else:
+            pixel_delta = event.pixelDelta()
+            dx, dy = (pixel_delta.x(), pixel_delta.y()) if not pixel_delta.isNull() else (delta.x() / 2, delta.y() / 2)
+            if event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+                dx, dy = dy, dx
+            self.panBy(dx, dy)
+        event.accept()
@@ -0,0 +1,46 @@
+from PyQt6.QtGui import QImage
+
+# Pillow只在需要处理图像时才导入，避免拖慢启动
+
+def qimage_to_gray(image):
+    """把QImage转换为Pillow的灰度图，不逐像素访问"""
+    from PIL import Image
+    gray = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    data = gray.constBits().asstring(gray.sizeInBytes())
+    return Image.frombuffer('L', (gray.width(), gray.height()), data, 'raw', 'L', gray.bytesPerLine(), 1)
+
+def qimage_to_pil(image, alpha=False):
+    """把QImage转换为Pillow的RGB（alpha为True时RGBA）图像，一次复制整块像素数据"""
+    from PIL import Image
+    if alpha:
+        converted = image.convertToFormat(QImage.Format.Format_RGBA8888)
+        mode = 'RGBA'
+    else:
+        converted = image.convertToFormat(QImage.Format.Format_RGB888)
+        mode = 'RGB'
+    data = converted.constBits().asstring(converted.sizeInBytes())
+    return Image.frombuffer(mode, (converted.width(), converted.height()), data, 'raw', mode,
+                            converted.bytesPerLine(), 1)
+
+def image_shown_in(image, grabbed, tolerance=8):
+    """grabbed（屏幕截图）中是否仍然显示着image（窗口自身的渲染，可以带透明）
+    
+    只比较image中完全不透明的像素，平均差异小于tolerance时认为仍然显示着。
+    尺寸不同或image完全透明时返回False。
+    """
+    from PIL import ImageChops, ImageStat
+    if image.size() != grabbed.size():
+        return False
+    rgba = qimage_to_pil(image, alpha=True)
+    mask = rgba.getchannel('A').point(lambda alpha: 255 if alpha == 255 else 0)
+    if mask.getbbox() is None:
+        return False
+    diff = ImageChops.difference(rgba.convert('RGB'), qimage_to_pil(grabbed)).convert('L')
+    return ImageStat.Stat(diff, mask).mean[0] < tolerance
+
+def pil_to_qimage(image):
+    """把Pillow图像转换为QImage（RGBA8888），返回的QImage拥有自己的数据"""
+    rgba = image.convert('RGBA')
+    data = rgba.tobytes()
+    qimage = QImage(data, rgba.width, rgba.height, rgba.width * 4, QImage.Format.Format_RGBA8888)
+    return qimage.copy()
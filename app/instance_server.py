@@ -0,0 +1,105 @@
+"""单实例：第一个进程监听本地套接字，之后的启动只把命令发给它然后立即退出
+
+协议为每行一个JSON对象：请求 {"command": "capture", "argument": ""}，
+回复 {"ok": true} 或 {"ok": false, "error": "..."}。
+本地套接字在Windows上是命名管道，在其他平台上是Unix域套接字，都由QtNetwork处理。
+发送命令的一方只需要QtCore和QtNetwork，不创建QApplication，也不导入界面模块。
+"""
+import json
+import getpass
+from PyQt6.QtCore import QObject
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+COMMANDS = ('capture', 'repeat-last', 'open', 'show', 'quit')
+
+def server_name():
+    """每个用户一个实例"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'default'
+    return f'ScreenshotTool-{user}'
+
+def send_command(command, argument='', timeout_ms=1000):
+    """把命令发给正在运行的实例
+    
+    返回(是否有实例在运行, 错误信息)；实例执行成功时错误信息为空字符串。
+    """
+    socket = QLocalSocket()
+    socket.connectToServer(server_name())
+    if not socket.waitForConnected(timeout_ms):
+        return False, ''
+    request = json.dumps({'command': command, 'argument': argument}) + '\n'
+    socket.write(request.encode('utf-8'))
+    socket.flush()
+    reply = b''
+    while not reply.endswith(b'\n') and socket.waitForReadyRead(timeout_ms):
+        reply += bytes(socket.readAll())
+    socket.disconnectFromServer()
+    try:
+        result = json.loads(reply.decode('utf-8'))
+    except ValueError:
+        return True, '没有收到回复'
+    return True, '' if result.get('ok') else result.get('error', '')
+
+class InstanceServer(QObject):
+    """在运行中的实例里接收命令，handler(command, argument)返回错误信息，成功时返回None"""
+    
+    def __init__(self, handler, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self.onNewConnection)
+        self.buffers = {}
+        
+    def listen(self):
+        """开始监听；上一个实例异常退出时会留下套接字文件，确认没有实例在用后将其移除"""
+        name = server_name()
+        if self.server.listen(name):
+            return True
+        probe = QLocalSocket()
+        probe.connectToServer(name)
+        if probe.waitForConnected(200):
+            probe.disconnectFromServer()
+            return False
+        QLocalServer.removeServer(name)
+        return self.server.listen(name)
+        
+    def close(self):
+        self.server.close()
+        
+    def onNewConnection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self.buffers[socket] = b''
+            socket.readyRead.connect(lambda socket=socket: self.onReadyRead(socket))
+            socket.disconnected.connect(lambda socket=socket: self.onDisconnected(socket))
+            
+    def onDisconnected(self, socket):
+        self.buffers.pop(socket, None)
+        socket.deleteLater()
+        
+    def onReadyRead(self, socket):
+        data = self.buffers.get(socket, b'') + bytes(socket.readAll())
+        while b'\n' in data:
+            line, data = data.split(b'\n', 1)
+            socket.write((json.dumps(self.execute(line)) + '\n').encode('utf-8'))
+        self.buffers[socket] = data
+        socket.flush()
+        
+    def execute(self, line):
+        try:
+            request = json.loads(line.decode('utf-8'))
+            command = request.get('command', '')
+            argument = request.get('argument', '')
+        except (ValueError, AttributeError):
+            return {'ok': False, 'error': '无法解析的请求'}
+        if command not in COMMANDS:
+            return {'ok': False, 'error': f'未知命令: {command}'}
+        try:
+            error = self.handler(command, argument)
+        except Exception as e:
+            print(f"执行命令 {command} 时出错: {str(e)}")
+            error = str(e)
+        return {'ok': False, 'error': error} if error else {'ok': True}
@@ -0,0 +1,44 @@
+import os
+import time
+from collections import deque
+
+# 设置环境变量 SCREENSHOT_TOOL_METRICS=1 时打印每一次测量结果
+ENABLED = os.environ.get('SCREENSHOT_TOOL_METRICS', '') == '1'
+
+# 每个指标只保留最近的若干个样本
+MAX_SAMPLES = 256
+
+_samples = {}
+
+def now():
+    """返回单调时钟的当前时间（秒）"""
+    return time.perf_counter()
+
+def elapsed_ms(start):
+    """返回从start到现在经过的毫秒数"""
+    return (time.perf_counter() - start) * 1000.0
+
+def record(name, value, unit='ms'):
+    """记录一个测量样本"""
+    samples = _samples.get(name)
+    if samples is None:
+        samples = _samples[name] = deque(maxlen=MAX_SAMPLES)
+    samples.append(value)
+    if ENABLED:
+        print(f"[metrics] {name}: {value:.2f} {unit}")
+
+def summary(name):
+    """返回指标的统计信息，没有样本时返回None"""
+    samples = _samples.get(name)
+    if not samples:
+        return None
+    return {
+        'count': len(samples),
+        'last': samples[-1],
+        'mean': sum(samples) / len(samples),
+        'max': max(samples),
+    }
+
+def names():
+    """返回所有已记录的指标名称"""
+    return sorted(_samples)
@@ -0,0 +1,54 @@
+from PyQt6.QtCore import QRect, QSettings
+
+def region_to_text(rect):
+    """把区域保存为 x,y,w,h 形式的字符串"""
+    return f'{rect.x()},{rect.y()},{rect.width()},{rect.height()}'
+
+def region_from_text(text):
+    """解析 x,y,w,h 形式的字符串，格式不正确时返回None"""
+    try:
+        x, y, w, h = [int(float(part)) for part in str(text).split(',')]
+    except (TypeError, ValueError):
+        return None
+    if w <= 0 or h <= 0:
+        return None
+    return QRect(x, y, w, h)
+
+class RegionPresets:
+    """上次截图区域和命名区域预设
+    
+    区域使用全局逻辑坐标（与QScreen.geometry一致），保存在
+    QSettings('ScreenshotTool', 'Settings')的last_region和region_presets/<名称>中。
+    """
+    GROUP = 'region_presets'
+    
+    def __init__(self):
+        self.settings = QSettings('ScreenshotTool', 'Settings')
+        
+    def lastRegion(self):
+        return region_from_text(self.settings.value('last_region', ''))
+        
+    def setLastRegion(self, rect):
+        self.settings.setValue('last_region', region_to_text(rect))
+        
+    def presets(self):
+        """返回{名称: 区域}，按名称排序"""
+        self.settings.beginGroup(self.GROUP)
+        try:
+            presets = {}
+            for name in sorted(self.settings.childKeys()):
+                rect = region_from_text(self.settings.value(name, ''))
+                if rect is not None:
+                    presets[name] = rect
+            return presets
+        finally:
+            self.settings.endGroup()
+            
+    def preset(self, name):
+        return region_from_text(self.settings.value(f'{self.GROUP}/{name}', ''))
+        
+    def savePreset(self, name, rect):
+        self.settings.setValue(f'{self.GROUP}/{name}', region_to_text(rect))
+        
+    def removePreset(self, name):
+        self.settings.remove(f'{self.GROUP}/{name}')
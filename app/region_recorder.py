@@ -0,0 +1,362 @@
+import os
+import queue
+import time
+import zlib
+import struct
+from PIL import Image
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, QDateTime, pyqtSignal
+from .image_ops import qimage_to_pil
+from . import capture_output
+from . import metrics
+
+# 输出格式按文件扩展名选择
+FORMATS = {'.webp': 'WEBP', '.png': 'PNG', '.apng': 'PNG'}
+# 等待对比的帧数上限，编码线程跟不上时丢弃新的帧（上一帧的显示时间随之延长）
+MAX_QUEUED_FRAMES = 8
+
+class DeltaFrame:
+    """录制中的一帧：只保存与上一帧相比发生变化的块"""
+    __slots__ = ('tiles', 'duration')
+    
+    def __init__(self, tiles, duration=0):
+        # [(box, Pillow图像)]，box为(left, top, right, bottom)
+        self.tiles = tiles
+        self.duration = duration
+
+def changed_tiles(previous, current, tile_size):
+    """比较两帧，返回current中发生变化的块"""
+    from PIL import ImageChops
+    diff = ImageChops.difference(previous, current)
+    bbox = diff.getbbox()
+    if bbox is None:
+        return []
+    # 只在整体变化范围内逐块检查
+    width, height = current.size
+    left = bbox[0] // tile_size * tile_size
+    top = bbox[1] // tile_size * tile_size
+    tiles = []
+    for y in range(top, bbox[3], tile_size):
+        for x in range(left, bbox[2], tile_size):
+            box = (x, y, min(x + tile_size, width), min(y + tile_size, height))
+            if diff.crop(box).getbbox() is not None:
+                tiles.append((box, current.crop(box)))
+    return tiles
+
+class ReconstructedFrames(Image.Image):
+    """按需还原录制内容的多帧图像，任意时刻只在内存中保留一帧完整画面
+    
+    seek(n)把第n帧的变化块贴到当前画面上，交给Pillow按多帧图像（n_frames/seek）编码。
+    向前seek时把第一帧贴回画面，从第一帧重新开始。
+    """
+    is_animated = True
+    
+    @staticmethod
+    def supported():
+        """当前的Pillow是否有__init__中用到的内部字段，没有时改用完整的帧列表"""
+        image = Image.Image()
+        return hasattr(image, '_mode') and hasattr(image, '_size')
+    
+    def __init__(self, first_frame, frames):
+        super().__init__()
+        self.first_frame = first_frame
+        self.frames = frames
+        # 只在这里直接设置Pillow的内部字段（在Pillow 11.1.0和12.3.0上检查过），
+        # 之后画面的模式和尺寸不再变化，只通过paste修改
+        canvas = first_frame.copy()
+        self.im = canvas.im
+        self._mode = canvas.mode
+        self._size = canvas.size
+        self.index = 0
+        
+    def images(self):
+        """依次还原每一帧，每次产生的都是同一个图像对象"""
+        for index in range(len(self.frames)):
+            self.seek(index)
+            yield self
+        
+    @property
+    def n_frames(self):
+        return len(self.frames)
+        
+    def tell(self):
+        return self.index
+        
+    def seek(self, index):
+        if index >= len(self.frames):
+            raise EOFError('没有更多的帧')
+        if index < self.index:
+            self.paste(self.first_frame, (0, 0))
+            self.index = 0
+        while self.index < index:
+            self.index += 1
+            for box, tile in self.frames[self.index].tiles:
+                self.paste(tile, box[:2])
+
+def png_chunk(output, kind, data):
+    output.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+
+def write_apng(filename, size, frames, images, durations):
+    """逐帧写出APNG，每一帧只写入变化块的外接矩形
+    
+    images依次产生每一帧的完整画面（可以是逐帧还原的生成器）。
+    Pillow的APNG编码会先保留所有帧的完整副本，这里边还原边写，内存中只有一帧。
+    """
+    width, height = size
+    with open(filename, 'wb') as output:
+        output.write(b'\x89PNG\r\n\x1a\n')
+        png_chunk(output, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        png_chunk(output, b'acTL', struct.pack('>II', len(frames), 0))
+        number = 0
+        for index, (frame, image) in enumerate(zip(frames, images)):
+            if frame.tiles:
+                boxes = [box for box, _ in frame.tiles]
+                box = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                       max(b[2] for b in boxes), max(b[3] for b in boxes))
+            else:
+                box = (0, 0, width, height)
+            region = image.crop(box).convert('RGB')
+            # 延迟为 分子/分母 秒，都不能超过65535
+            duration = durations[index]
+            delay = (duration, 1000) if duration <= 65535 else (min(65535, round(duration / 100)), 10)
+            png_chunk(output, b'fcTL', struct.pack('>IIIIIHHBB', number, region.width, region.height,
+                                                   box[0], box[1], delay[0], delay[1], 0, 0))
+            number += 1
+            # 每一行前加上滤波类型0
+            stride = region.width * 3
+            data = region.tobytes()
+            compressor = zlib.compressobj(6)
+            compressed = b''.join(compressor.compress(b'\x00' + data[row * stride:(row + 1) * stride])
+                                  for row in range(region.height)) + compressor.flush()
+            if index == 0:
+                png_chunk(output, b'IDAT', compressed)
+            else:
+                png_chunk(output, b'fdAT', struct.pack('>I', number) + compressed)
+                number += 1
+        png_chunk(output, b'IEND', b'')
+
+class RecordingEncoder(QThread):
+    """在后台线程中对比帧、保存变化的块，停止录制后编码为动画WebP或APNG
+    
+    界面线程只负责截图并把QImage放入队列，对比和编码都不会阻塞截图定时器。
+    队列最多保留MAX_QUEUED_FRAMES帧，满时丢弃新截的帧；编码时逐帧还原，不保留所有帧的完整画面。
+    """
+    encoded = pyqtSignal(dict)
+    
+    def __init__(self, filename, tile_size=64, quality=80, lossless=False, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.format = FORMATS.get(os.path.splitext(filename)[1].lower(), 'WEBP')
+        self.tile_size = tile_size
+        self.quality = quality
+        self.lossless = lossless
+        self.queue = queue.Queue(MAX_QUEUED_FRAMES)
+        
+        self.first_frame = None
+        self.previous = None
+        self.previous_timestamp = None
+        self.frames = []
+        self.received = 0
+        self.dropped = 0
+        self.kept_tiles = 0
+        self.total_tiles = 0
+        self.kept_bytes = 0
+        self.diff_seconds = 0.0
+        
+    def addFrame(self, image, timestamp_ms):
+        """界面线程调用：把一帧QImage交给编码线程，队列已满时丢弃这一帧并返回False"""
+        try:
+            self.queue.put_nowait((image, timestamp_ms))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+        
+    def finishRecording(self, timestamp_ms):
+        """界面线程调用：录制结束，timestamp_ms为最后一帧的结束时间"""
+        # 结束标记不能丢弃，队列满时等待编码线程取走一帧（编码线程已经出错退出时放弃）
+        while True:
+            try:
+                self.queue.put((None, timestamp_ms), timeout=0.1)
+                return
+            except queue.Full:
+                if not self.isRunning():
+                    return
+        
+    def run(self):
+        try:
+            while True:
+                image, timestamp_ms = self.queue.get()
+                if image is None:
+                    self.closeLastFrame(timestamp_ms)
+                    break
+                self.processFrame(image, timestamp_ms)
+            self.encoded.emit(self.encode())
+        except Exception as e:
+            print(f"编码录制内容时出错: {str(e)}")
+            self.encoded.emit({'filename': self.filename, 'error': str(e)})
+            
+    def closeLastFrame(self, timestamp_ms):
+        if self.frames and self.previous_timestamp is not None:
+            self.frames[-1].duration = max(1, timestamp_ms - self.previous_timestamp)
+            
+    def processFrame(self, image, timestamp_ms):
+        start = time.perf_counter()
+        current = qimage_to_pil(image)
+        self.received += 1
+        width, height = current.size
+        tiles_per_frame = ((width + self.tile_size - 1) // self.tile_size) * \
+                          ((height + self.tile_size - 1) // self.tile_size)
+                          
+        if self.previous is None:
+            self.first_frame = current
+            self.frames.append(DeltaFrame([]))
+            self.kept_tiles += tiles_per_frame
+        else:
+            tiles = changed_tiles(self.previous, current, self.tile_size)
+            if not tiles:
+                # 画面没有变化，只延长上一帧的显示时间
+                self.diff_seconds += time.perf_counter() - start
+                return
+            self.frames[-1].duration = max(1, timestamp_ms - self.previous_timestamp)
+            self.frames.append(DeltaFrame(tiles))
+            self.kept_tiles += len(tiles)
+            self.kept_bytes += sum(tile.width * tile.height * 3 for _, tile in tiles)
+        self.total_tiles += tiles_per_frame
+        self.previous = current
+        self.previous_timestamp = timestamp_ms
+        self.diff_seconds += time.perf_counter() - start
+        
+    def reconstruct(self):
+        """还原出所有帧的完整画面，只在Pillow不支持逐帧还原时使用"""
+        canvas = self.first_frame.copy()
+        images = []
+        for frame in self.frames:
+            for box, tile in frame.tiles:
+                canvas.paste(tile, box[:2])
+            images.append(canvas.copy())
+        return images
+        
+    def encode(self):
+        report = {
+            'filename': self.filename,
+            'format': self.format,
+            'frames': self.received,
+            'dropped_frames': self.dropped,
+            'unique_frames': len(self.frames),
+            'kept_tiles': self.kept_tiles,
+            'total_tiles': self.total_tiles,
+            'kept_bytes': self.kept_bytes,
+            'diff_ms_per_frame': self.diff_seconds * 1000 / max(1, self.received),
+        }
+        if not self.frames:
+            report.update({'size': 0, 'encode_ms': 0.0, 'encode_ms_per_frame': 0.0})
+            return report
+            
+        start = time.perf_counter()
+        durations = [frame.duration or 1 for frame in self.frames]
+        if ReconstructedFrames.supported():
+            sequence = ReconstructedFrames(self.first_frame, self.frames)
+            images = sequence.images()
+        else:
+            sequence = None
+            images = self.reconstruct()
+        if self.format == 'WEBP':
+            options = {'save_all': True, 'duration': durations, 'loop': 0,
+                       'quality': self.quality, 'lossless': self.lossless, 'method': 4}
+            if sequence is not None:
+                sequence.save(self.filename, self.format, **options)
+            else:
+                images[0].save(self.filename, self.format, append_images=images[1:], **options)
+        else:
+            write_apng(self.filename, self.first_frame.size, self.frames, images, durations)
+        encode_seconds = time.perf_counter() - start
+        
+        report.update({
+            'size': os.path.getsize(self.filename),
+            'encode_ms': encode_seconds * 1000,
+            'encode_ms_per_frame': encode_seconds * 1000 / len(self.frames),
+        })
+        return report
+
+class RegionRecorder(QObject):
+    """按目标帧率录制一个区域（全局逻辑坐标）
+    
+    截图走ScreenshotTool.grabRegion，每一帧只在界面线程中截图并转为QImage，
+    其余工作都交给RecordingEncoder。
+    """
+    finished = pyqtSignal(dict)
+    
+    def __init__(self, tool, rect, filename=None, fps=10, max_seconds=120, tile_size=64, parent=None):
+        super().__init__(parent)
+        self.tool = tool
+        self.rect = rect
+        if filename is None:
+            directory = capture_output.default_save_dir() or os.path.expanduser('~')
+            timestamp = QDateTime.currentDateTime().toString('yyyyMMdd_hhmmss')
+            filename = os.path.join(directory, f'recording_{timestamp}.webp')
+        self.filename = filename
+        self.fps = max(1, fps)
+        self.max_seconds = max_seconds
+        
+        self.encoder = RecordingEncoder(filename, tile_size)
+        self.encoder.encoded.connect(self.onEncoded)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.start_time = None
+        self.stop_time = None
+        self.grab_seconds = 0.0
+        self.grabbed = 0
+        
+    def isRecording(self):
+        return self.timer.isActive()
+        
+    def start(self):
+        self.encoder.start(QThread.Priority.LowPriority)
+        self.start_time = metrics.now()
+        self.timer.start(round(1000 / self.fps))
+        self.tick()
+        
+    def tick(self):
+        elapsed_ms = metrics.elapsed_ms(self.start_time)
+        if self.max_seconds and elapsed_ms > self.max_seconds * 1000:
+            self.stop()
+            return
+        grab_start = metrics.now()
+        screenshot = self.tool.grabRegion(self.rect)
+        if screenshot is None:
+            print("录制区域不在任何屏幕上，停止录制")
+            self.stop()
+            return
+        if self.encoder.addFrame(screenshot.toImage(), round(elapsed_ms)):
+            self.grabbed += 1
+        self.grab_seconds += metrics.elapsed_ms(grab_start) / 1000.0
+        
+    def stop(self):
+        """停止截图，编码在后台完成后发出finished"""
+        if not self.timer.isActive():
+            return
+        self.timer.stop()
+        self.stop_time = metrics.now()
+        self.encoder.finishRecording(round((self.stop_time - self.start_time) * 1000))
+        
+    def onEncoded(self, report):
+        elapsed = self.stop_time - self.start_time
+        report['grab_ms_per_frame'] = self.grab_seconds * 1000 / max(1, self.grabbed)
+        report['fps'] = self.grabbed / elapsed if elapsed > 0 else 0.0
+        if 'encode_ms_per_frame' in report:
+            metrics.record('record_encode_frame', report['encode_ms_per_frame'])
+        self.encoder.wait()
+        self.finished.emit(report)
+
+def format_report(report):
+    """把录制报告格式化为一行文字"""
+    if 'error' in report:
+        return f"录制失败: {report['error']}"
+    return (f"{report['filename']}: {report['frames']} 帧（不同的 {report['unique_frames']} 帧，"
+            f"丢弃 {report['dropped_frames']} 帧），"
+            f"保留块 {report['kept_tiles']}/{report['total_tiles']}，"
+            f"文件 {report['size'] / 1024:.1f} KB，"
+            f"截图 {report.get('grab_ms_per_frame', 0):.1f} ms/帧，"
+            f"对比 {report['diff_ms_per_frame']:.1f} ms/帧，"
+            f"编码 {report['encode_ms_per_frame']:.1f} ms/帧")
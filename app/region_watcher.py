@@ -0,0 +1,100 @@
+import os
+from PyQt6.QtCore import Qt, QObject, QTimer, pyqtSignal
+from .image_ops import qimage_to_gray
+from . import capture_output
+from . import metrics
+
+def proxy_image(pixmap, proxy_size):
+    """把截图缩小为最长边不超过proxy_size的灰度代理图，用于低成本的变化检测"""
+    if max(pixmap.width(), pixmap.height()) > proxy_size:
+        pixmap = pixmap.scaled(proxy_size, proxy_size, Qt.AspectRatioMode.KeepAspectRatio,
+                               Qt.TransformationMode.FastTransformation)
+    return qimage_to_gray(pixmap.toImage())
+
+def change_score(reference, current, pixel_threshold=24):
+    """两张代理图中差异超过pixel_threshold的像素所占的比例（0~1）"""
+    from PIL import ImageChops
+    if reference.size != current.size:
+        return 1.0
+    diff = ImageChops.difference(reference, current)
+    changed = diff.point(lambda v: 255 if v > pixel_threshold else 0).histogram()[255]
+    return changed / (current.width * current.height)
+
+class RegionWatcher(QObject):
+    """监视一个区域（全局逻辑坐标），画面明显变化时才保存截图
+    
+    每次采样都走ScreenshotTool.grabRegion，随即缩小为灰度代理图与上一次保存时的
+    代理图比较；只有变化比例超过threshold时才把原生分辨率的截图转换并在后台保存，
+    其余采样的截图直接丢弃。
+    """
+    changed = pyqtSignal(str, float)
+    
+    def __init__(self, tool, rect, interval_ms=1000, threshold=0.01, pixel_threshold=24,
+                 proxy_size=96, directory=None, parent=None):
+        super().__init__(parent)
+        self.tool = tool
+        self.rect = rect
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.proxy_size = proxy_size
+        self.directory = directory if directory is not None else (
+            capture_output.default_save_dir() or os.path.expanduser('~'))
+            
+        self.timer = QTimer(self)
+        # 监视不需要精确的间隔，允许系统合并定时器唤醒
+        self.timer.setTimerType(Qt.TimerType.VeryCoarseTimer if interval_ms >= 1000
+                                else Qt.TimerType.CoarseTimer)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.sample)
+        
+        self.reference = None
+        self.samples = 0
+        self.saved = 0
+        self.sample_seconds = 0.0
+        self.last_score = 0.0
+        
+    def isWatching(self):
+        return self.timer.isActive()
+        
+    def start(self):
+        self.timer.start()
+        self.sample()
+        
+    def stop(self):
+        self.timer.stop()
+        
+    def sample(self):
+        start = metrics.now()
+        screenshot = self.tool.grabRegion(self.rect)
+        if screenshot is None:
+            print("监视区域不在任何屏幕上，停止监视")
+            self.stop()
+            return
+        proxy = proxy_image(screenshot, self.proxy_size)
+        self.samples += 1
+        
+        score = 1.0 if self.reference is None else change_score(self.reference, proxy, self.pixel_threshold)
+        self.last_score = score
+        if score >= self.threshold:
+            # 只有变化时才处理原生分辨率的截图
+            self.reference = proxy
+            filename = capture_output.save_in_background(screenshot, self.directory, 'watch')
+            self.saved += 1
+            self.changed.emit(filename or '', score)
+            
+        elapsed_ms = metrics.elapsed_ms(start)
+        self.sample_seconds += elapsed_ms / 1000.0
+        metrics.record('watch_sample', elapsed_ms)
+        
+    def stats(self):
+        return {
+            'samples': self.samples,
+            'saved': self.saved,
+            'last_score': self.last_score,
+            'sample_ms': self.sample_seconds * 1000 / max(1, self.samples),
+            'directory': self.directory,
+        }
+
+def format_stats(stats):
+    return (f"采样 {stats['samples']} 次，保存 {stats['saved']} 张，"
+            f"平均每次采样 {stats['sample_ms']:.2f} ms，最近变化 {stats['last_score'] * 100:.1f}%")
@@ -0,0 +1,47 @@
+from PyQt6.QtCore import QObject, QRect, pyqtSignal
+from PyQt6.QtGui import QGuiApplication
+
+class ScreenTopology(QObject):
+    """缓存屏幕列表和虚拟桌面区域，只在屏幕增删或几何变化时失效"""
+    changed = pyqtSignal()
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._screens = None
+        self._virtual_geometry = None
+        
+        app = QGuiApplication.instance()
+        app.screenAdded.connect(self.onScreenAdded)
+        app.screenRemoved.connect(self.onScreenRemoved)
+        for screen in QGuiApplication.screens():
+            self.watchScreen(screen)
+            
+    def watchScreen(self, screen):
+        screen.geometryChanged.connect(self.invalidate)
+        
+    def onScreenAdded(self, screen):
+        self.watchScreen(screen)
+        self.invalidate()
+        
+    def onScreenRemoved(self, screen):
+        self.invalidate()
+        
+    def invalidate(self, *args):
+        """丢弃缓存的屏幕布局"""
+        self._screens = None
+        self._virtual_geometry = None
+        self.changed.emit()
+        
+    def screens(self):
+        if self._screens is None:
+            self._screens = list(QGuiApplication.screens())
+        return self._screens
+        
+    def virtualGeometry(self):
+        """所有屏幕的总区域"""
+        if self._virtual_geometry is None:
+            virtual_geometry = QRect()
+            for screen in self.screens():
+                virtual_geometry = virtual_geometry.united(screen.geometry())
+            self._virtual_geometry = virtual_geometry
+        return QRect(self._virtual_geometry)
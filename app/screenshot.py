@@ -1,8 +1,15 @@
 from PyQt6.QtWidgets import QWidget, QApplication, QHBoxLayout, QPushButton, QLabel
-from PyQt6.QtCore import Qt, QRect, QPoint, pyqtSignal
-from PyQt6.QtGui import QPainter, QPen, QColor, QScreen, QIcon, QPixmap
-from .editor_window import EditorWindow
+from PyQt6.QtCore import Qt, QRect, QRectF, QPoint, pyqtSignal, QSettings, QTimer, QThread
+from PyQt6.QtGui import QPainter, QPen, QColor, QScreen, QIcon, QFont, QFontMetrics, QCursor
 from .cursor_rules import CursorRules
+from .screen_topology import ScreenTopology
+from .capture_backend import create_backend, grab_region
+from .tiled_frame import TiledFrame
+from .edge_snap import SnapDetector
+from .region_presets import RegionPresets
+from . import capture_output
+from . import metrics
+import os
 
 class FloatingToolPanel(QWidget):
     def __init__(self, parent=None):
@@ -11,8 +18,14 @@ class FloatingToolPanel(QWidget):
         
     def initUI(self):
         # 设置无边框窗口
-        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint)
+        self.setWindowFlags(
+            Qt.WindowType.FramelessWindowHint |
+            Qt.WindowType.WindowStaysOnTopHint |
+            Qt.WindowType.Tool
+        )
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        # 显示时不抢走遮罩窗口的焦点，Esc和回车仍由遮罩处理
+        self.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
         
         # 创建水平布局
         layout = QHBoxLayout()
@@ -36,11 +49,19 @@ class FloatingToolPanel(QWidget):
         self.copy_btn = self.createButton("复制")
         self.save_btn = self.createButton("保存")
         self.edit_btn = self.createButton("编辑")
+        self.collage_btn = self.createButton("拼图")
+        self.record_btn = self.createButton("录制")
+        self.scroll_btn = self.createButton("长截图")
         self.cancel_btn = self.createButton("取消")
+        # 拼图只在选择了多个区域时显示
+        self.collage_btn.hide()
         
         layout.addWidget(self.copy_btn)
         layout.addWidget(self.save_btn)
         layout.addWidget(self.edit_btn)
+        layout.addWidget(self.collage_btn)
+        layout.addWidget(self.record_btn)
+        layout.addWidget(self.scroll_btn)
         layout.addWidget(self.cancel_btn)
         
         self.setLayout(layout)
@@ -74,12 +95,131 @@ class FloatingToolPanel(QWidget):
         
     def updateSizeLabel(self, width, height):
         self.size_label.setText(f"{width} × {height}")
+        
+    def setRegionCount(self, count):
+        """选择了多个区域时显示区域数量和拼图按钮"""
+        if count > 1:
+            self.size_label.setText(f"{count} 个区域")
+        self.collage_btn.setVisible(count > 1)
+        # 录制和长截图只针对单个区域
+        self.record_btn.setVisible(count == 1)
+        self.scroll_btn.setVisible(count == 1)
+        
+    def showAt(self, selection, bounds, count=1, margin=6):
+        """显示在选择区域（全局坐标）右下方，超出屏幕bounds时移到选择区域内侧"""
+        self.updateSizeLabel(selection.width(), selection.height())
+        self.setRegionCount(count)
+        self.adjustSize()
+        x = selection.right() - self.width() + 1
+        y = selection.bottom() + margin
+        if y + self.height() > bounds.bottom():
+            y = max(selection.top(), selection.bottom() - self.height() - margin)
+        x = max(bounds.left(), min(x, bounds.right() - self.width() + 1))
+        y = max(bounds.top(), min(y, bounds.bottom() - self.height() + 1))
+        self.move(x, y)
+        self.show()
+        self.raise_()
+
+class ScreenOverlayWindow(QWidget):
+    """单个屏幕上的截图遮罩窗口，绘制和鼠标事件都转交给ScreenshotTool处理"""
+    def __init__(self, tool, screen):
+        super().__init__(None)
+        self.tool = tool
+        self.target_screen = screen
+        self.setWindowFlags(
+            Qt.WindowType.FramelessWindowHint |
+            Qt.WindowType.WindowStaysOnTopHint |
+            Qt.WindowType.Tool |
+            Qt.WindowType.NoDropShadowWindowHint
+        )
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setMouseTracking(True)
+        self.setCursor(CursorRules.get_cursor_for_tool('screenshot'))
+        
+    def offset(self):
+        """本窗口左上角在虚拟桌面坐标中的位置"""
+        return self.target_screen.geometry.topLeft() - self.tool.virtual_geometry.topLeft()
+        
+    def toVirtual(self, event):
+        return event.globalPosition().toPoint() - self.tool.virtual_geometry.topLeft()
+        
+    def showOnScreen(self):
+        self.winId()
+        if self.target_screen.handle is not None:
+            self.windowHandle().setScreen(self.target_screen.handle)
+        self.setGeometry(self.target_screen.geometry)
+        self.showFullScreen()
+        
+    def paintEvent(self, event):
+        offset = self.offset()
+        painter = QPainter(self)
+        painter.translate(-offset.x(), -offset.y())
+        self.tool.paintOverlay(painter, event.rect().translated(offset))
+        painter.end()
+        
+    def mousePressEvent(self, event):
+        self.tool.selectionPress(self.toVirtual(event), event.button())
+        
+    def mouseMoveEvent(self, event):
+        self.tool.selectionMove(self.toVirtual(event))
+        
+    def mouseReleaseEvent(self, event):
+        self.tool.selectionRelease(self.toVirtual(event), event.button())
+        
+    def keyPressEvent(self, event):
+        self.tool.keyPressEvent(event)
 
 class ScreenshotTool(QWidget):
     finished = pyqtSignal()
+    # 在工具条上选择录制时发出，参数为全局逻辑坐标中的区域
+    recordRequested = pyqtSignal(QRect)
+    # 在工具条上选择长截图时发出，参数同上
+    scrollCaptureRequested = pyqtSignal(QRect)
+    
+    # 渲染模式：cached 将冻结的截图预先变暗缓存，只重绘选择框变化的区域；
+    # transparent 为旧的透明窗口模式，直接透出实时桌面
+    RENDER_MODES = ('cached', 'transparent')
+    
+    # 窗口模式：virtual 用一个窗口覆盖整个虚拟桌面；
+    # per_screen 每个屏幕一个窗口，各自保留原生分辨率的截图
+    OVERLAY_MODES = ('virtual', 'per_screen')
     
-    def __init__(self):
+    # 遮罩颜色、选择框颜色和线宽
+    DIM_COLOR = QColor(0, 0, 0, 100)
+    SELECTION_COLOR = QColor(0, 174, 255)
+    SELECTION_PEN_WIDTH = 2
+    CORNER_SIZE = 10
+    
+    # 按下后移动不超过该距离视为单击，单击时选中鼠标下的界面矩形
+    CLICK_DISTANCE = 3
+    
+    # 放大镜：显示鼠标周围LOUPE_PIXELS x LOUPE_PIXELS个像素，与鼠标保持LOUPE_OFFSET的距离
+    LOUPE_PIXELS = 15
+    LOUPE_OFFSET = 20
+    
+    def __init__(self, backend=None, render_mode=None, overlay_mode=None):
         super().__init__(None)
+        # 截图窗口会被反复使用，屏幕布局由截图后端（默认后端通过ScreenTopology）缓存
+        self.backend = backend or create_backend(ScreenTopology(self))
+        settings = QSettings('ScreenshotTool', 'Settings')
+        if render_mode is None:
+            render_mode = settings.value('overlay_render_mode', 'cached')
+        self.render_mode = render_mode if render_mode in self.RENDER_MODES else 'cached'
+        if overlay_mode is None:
+            overlay_mode = settings.value('overlay_mode', 'virtual')
+        self.overlay_mode = overlay_mode if overlay_mode in self.OVERLAY_MODES else 'virtual'
+        # 大于0时每个屏幕的截图再切成固定大小的块
+        self.tile_size = int(settings.value('frame_tile_size', 0))
+        # 是否在后台检测界面矩形用于吸附，以及检测前的降采样倍数
+        self.snap_enabled = str(settings.value('snap_enabled', 'true')).lower() == 'true'
+        self.snap_downsample = int(settings.value('snap_downsample', 2))
+        # 放大镜是否显示及其放大倍数
+        self.loupe_enabled = str(settings.value('loupe_enabled', 'true')).lower() == 'true'
+        self.loupe_zoom = max(2, int(settings.value('loupe_zoom', 8)))
+        # 记录上次截图区域，用于不经过遮罩直接重复截图
+        self.presets = RegionPresets()
+        # 选择完成后：'panel'显示复制/保存/编辑工具条，'editor'直接打开编辑窗口
+        self.selection_action = settings.value('selection_action', 'panel')
         self.initUI()
         
     def initUI(self):
@@ -91,21 +231,45 @@ class ScreenshotTool(QWidget):
             Qt.WindowType.NoDropShadowWindowHint
         )
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
-        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
         
         # 截图相关变量
         self.begin = QPoint()
         self.end = QPoint()
         self.is_drawing = False
+        # 松开鼠标后选择区域保留，等待在工具条上选择操作
+        self.has_selection = False
+        # 已完成的选择区域，按住Shift框选可以在同一张截图上选择多个区域
+        self.regions = []
         
-        # 获取所有屏幕信息
-        self.screens = QApplication.screens()
+        # 工具条在第一次需要时创建，之后复用；编辑窗口只在点击编辑时才创建
+        self.tool_panel = None
+        self.editor = None
         
-        # 计算所有屏幕的总区域
-        self.virtual_geometry = self.calculate_virtual_geometry()
+        # 屏幕信息和截图在每次start()时刷新
+        self.screens = []
+        self.virtual_geometry = QRect()
+        self.frame = None
+        self.trigger_time = None
+        # 松开鼠标完成选择的时刻，用于测量到编辑窗口第一次绘制的耗时
+        self.release_time = None
         
-        # 获取所有屏幕的截图
-        self.original_pixmap = self.grab_all_screens()
+        # 分屏模式下每个屏幕一个遮罩窗口
+        self.overlay_windows = []
+        
+        # 界面矩形吸附：检测线程、检测结果和鼠标下高亮的矩形
+        self.capture_serial = 0
+        self.snap_detector = None
+        self.snap_workers = []
+        self.snap_index = None
+        self.hover_rect = None
+        
+        # 放大镜跟随的鼠标位置（虚拟桌面坐标）
+        self.cursor_pos = None
+        
+        # 尺寸标签的字体和度量只创建一次
+        self.label_font = QFont(self.font())
+        self.label_font.setPointSize(10)
+        self.label_metrics = QFontMetrics(self.label_font)
         
         # 设置鼠标追踪
         self.setMouseTracking(True)
@@ -113,169 +277,636 @@ class ScreenshotTool(QWidget):
         # 设置光标
         self.setCursor(CursorRules.get_cursor_for_tool('screenshot'))
         
+    def warmUp(self):
+        """提前创建原生窗口并计算屏幕布局，减少第一次截图的延迟"""
+        self.winId()
+        self.backend.screens()
+        self.backend.virtualGeometry()
+        if self.overlay_mode == 'per_screen':
+            for window in self.ensureOverlayWindows():
+                window.winId()
+                
+    def ensureOverlayWindows(self):
+        """按当前屏幕列表准备分屏遮罩窗口，屏幕不变时直接复用"""
+        screens = self.backend.screens()
+        if [window.target_screen for window in self.overlay_windows] != screens:
+            for window in self.overlay_windows:
+                window.hide()
+                window.deleteLater()
+            self.overlay_windows = [ScreenOverlayWindow(self, screen) for screen in screens]
+        return self.overlay_windows
+        
     def calculate_virtual_geometry(self):
         """计算所有屏幕的总区域"""
-        virtual_geometry = QRect()
-        for screen in self.screens:
-            virtual_geometry = virtual_geometry.united(screen.geometry())
-        return virtual_geometry
+        return self.backend.virtualGeometry()
         
     def grab_all_screens(self):
-        """捕获所有屏幕的截图"""
-        # 创建一个足够大的空白图像
-        combined_pixmap = QPixmap(self.virtual_geometry.width(), self.virtual_geometry.height())
-        combined_pixmap.fill(Qt.GlobalColor.transparent)
+        """捕获所有屏幕的截图
         
-        # 创建画布
-        painter = QPainter(combined_pixmap)
-        
-        # 在相应位置绘制每个屏幕的截图
+        每个屏幕单独保存为原生分辨率的块，屏幕之间的空隙不分配内存。
+        frame_tile_size设置大于0时，每个屏幕再切成固定大小的块。
+        """
+        grabs = []
         for screen in self.screens:
-            # 获取屏幕截图
-            screen_pixmap = screen.grabWindow(0)
             # 计算屏幕在虚拟桌面中的相对位置
-            screen_rect = screen.geometry()
-            # 绘制到合并的图像上
-            painter.drawPixmap(
-                screen_rect.x() - self.virtual_geometry.x(),
-                screen_rect.y() - self.virtual_geometry.y(),
-                screen_pixmap
-            )
+            screen_rect = screen.geometry.translated(-self.virtual_geometry.topLeft())
+            grabs.append((screen_rect, self.backend.grabScreen(screen)))
+        
+        bounds = QRect(QPoint(0, 0), self.virtual_geometry.size())
+        frame = TiledFrame.fromGrabs(grabs, bounds, self.tile_size)
+        return frame
             
-        painter.end()
-        return combined_pixmap
+    def reportFrameMemory(self):
+        """记录本次截图占用的内存"""
+        report = self.frame.memoryReport()
+        metrics.record('frame_memory', report['bytes'] / (1024 * 1024), 'MB')
+        metrics.record('frame_dimmed_memory', report['dimmed_bytes'] / (1024 * 1024), 'MB')
+        metrics.record('frame_bounding_memory', report['bounding_bytes'] / (1024 * 1024), 'MB')
+        return report
         
-    def paintEvent(self, event):
-        painter = QPainter(self)
+    def grabSelection(self, rect):
+        """在截图完成时才按选择区域从相交的块中组合结果
+            
+        virtual模式与以前一样输出逻辑分辨率的截图；
+        per_screen模式保留原生分辨率，跨屏时按最高的设备像素比拼接。
+        """
+        scale = None if self.overlay_mode == 'per_screen' else 1.0
+        return self.frame.crop(rect, scale)
+        
+    def rememberRegion(self, rect):
+        """把选择区域换算为全局坐标保存为上次截图区域"""
+        self.presets.setLastRegion(rect.translated(self.virtual_geometry.topLeft()))
+        
+    def grabRegion(self, rect):
+        """不显示遮罩，直接截取全局逻辑坐标中的区域，区域不在任何屏幕上时返回None"""
+        scale = None if self.overlay_mode == 'per_screen' else 1.0
+        return grab_region(self.backend, rect, scale)
+        
+    def captureRegion(self, rect, trigger_time=None):
+        """截取区域后直接复制到剪贴板（设置了存储路径时同时保存），返回截图"""
+        start = trigger_time if trigger_time is not None else metrics.now()
+        screenshot = self.grabRegion(rect)
+        if screenshot is None:
+            print(f"区域不在任何屏幕上: {rect.x()},{rect.y()},{rect.width()},{rect.height()}")
+            return None
+        capture_output.deliver(screenshot)
+        self.presets.setLastRegion(rect)
+        metrics.record('region_capture', metrics.elapsed_ms(start))
+        return screenshot
+        
+    def invalidate(self, rect):
+        """重绘虚拟桌面坐标中的一块区域"""
+        if self.overlay_mode == 'per_screen':
+            for window in self.overlay_windows:
+                local = rect.translated(-window.offset()).intersected(window.rect())
+                if not local.isEmpty():
+                    window.update(local)
+        else:
+            self.update(rect)
         
-        # 绘制半透明背景
-        painter.fillRect(self.rect(), QColor(0, 0, 0, 1))
+    def selectionRect(self):
+        return QRect(self.begin, self.end).normalized()
         
+    def sizeLabelRect(self, rect, index=0):
+        """计算尺寸标签的背景区域和文本基线位置，index大于0时在尺寸前显示区域序号"""
+        size_text = f'{rect.width()} x {rect.height()}'
+        if index > 0:
+            size_text = f'{index}. {size_text}'
+        text_rect = self.label_metrics.boundingRect(size_text)
+        text_x = int(rect.center().x() - text_rect.width() / 2)
+        text_y = int(rect.top() - 5)
+        text_bg_rect = QRect(text_x - 5, text_y - text_rect.height(),
+                           text_rect.width() + 10, text_rect.height() + 5)
+        return size_text, text_bg_rect, QPoint(text_x, text_y)
+        
+    def selectionDirtyRect(self, rect, index=0):
+        """选择框（含边框、四角和尺寸标签）需要重绘的区域"""
+        margin = self.SELECTION_PEN_WIDTH + 1
+        _, text_bg_rect, _ = self.sizeLabelRect(rect, index)
+        return rect.adjusted(-margin, -margin, margin, margin).united(text_bg_rect.adjusted(-1, -1, 1, 1))
+        
+    def visibleSelections(self):
+        """需要绘制的选择区域及其序号：已完成的区域加上正在框选的区域，只有一个区域时不显示序号"""
+        rects = list(self.regions)
         if self.is_drawing:
-            # 计算选择区域
-            rect = QRect(self.begin, self.end).normalized()
-            
-            # 绘制选择框边界
-            pen = QPen(QColor(0, 174, 255), 2, Qt.PenStyle.SolidLine)
-            painter.setPen(pen)
-            painter.drawRect(rect)
-            
-            # 绘制选择框四角
-            corner_size = 10
-            corner_color = QColor(0, 174, 255)
-            painter.setPen(QPen(corner_color, 2))
-            
-            # 获取整数坐标
-            x1, y1 = int(rect.topLeft().x()), int(rect.topLeft().y())
-            x2, y2 = int(rect.topRight().x()), int(rect.topRight().y())
-            x3, y3 = int(rect.bottomLeft().x()), int(rect.bottomLeft().y())
-            x4, y4 = int(rect.bottomRight().x()), int(rect.bottomRight().y())
-            
-            # 左上角
-            painter.drawLine(x1, y1, x1 + corner_size, y1)
-            painter.drawLine(x1, y1, x1, y1 + corner_size)
-            
-            # 右上角
-            painter.drawLine(x2, y2, x2 - corner_size, y2)
-            painter.drawLine(x2, y2, x2, y2 + corner_size)
-            
-            # 左下角
-            painter.drawLine(x3, y3, x3 + corner_size, y3)
-            painter.drawLine(x3, y3, x3, y3 - corner_size)
+            rects.append(self.selectionRect())
+        if len(rects) == 1:
+            return [(0, rects[0])]
+        return [(index + 1, rect) for index, rect in enumerate(rects)]
+        
+    def invalidateSelections(self):
+        for index, rect in self.visibleSelections():
+            self.invalidate(self.selectionDirtyRect(rect, index))
+        
+    def loupeRect(self, pos):
+        """放大镜（含下方的坐标和颜色信息）在虚拟桌面坐标中的区域，超出屏幕时翻到鼠标另一侧"""
+        side = self.LOUPE_PIXELS * self.loupe_zoom
+        line_height = self.label_metrics.height()
+        info_width = self.label_metrics.horizontalAdvance('RGB(255, 255, 255)') + 10
+        rect = QRect(0, 0, max(side, info_width), side + line_height * 2 + 8)
+        
+        bounds = QRect(0, 0, self.virtual_geometry.width(), self.virtual_geometry.height())
+        for screen in self.screens:
+            screen_rect = screen.geometry.translated(-self.virtual_geometry.topLeft())
+            if screen_rect.contains(pos):
+                bounds = screen_rect
+                break
+                
+        x = pos.x() + self.LOUPE_OFFSET
+        if x + rect.width() > bounds.right():
+            x = pos.x() - self.LOUPE_OFFSET - rect.width()
+        y = pos.y() + self.LOUPE_OFFSET
+        if y + rect.height() > bounds.bottom():
+            y = pos.y() - self.LOUPE_OFFSET - rect.height()
+        rect.moveTo(x, y)
+        return rect
+        
+    def moveLoupe(self, pos):
+        """放大镜只重绘新旧位置两小块区域，pos为None时隐藏放大镜"""
+        if not self.loupe_enabled or self.frame is None:
+            return
+        if self.cursor_pos is not None:
+            self.invalidate(self.loupeRect(self.cursor_pos).adjusted(-1, -1, 1, 1))
+        self.cursor_pos = QPoint(pos) if pos is not None else None
+        if pos is not None:
+            self.invalidate(self.loupeRect(pos).adjusted(-1, -1, 1, 1))
+        
+    def paintLoupe(self, painter, dirty):
+        if not self.loupe_enabled or self.frame is None or self.cursor_pos is None:
+            return
+        loupe_rect = self.loupeRect(self.cursor_pos)
+        if not loupe_rect.intersects(dirty):
+            return
+        tile = self.frame.tileAt(self.cursor_pos)
+        if tile is None:
+            return
             
-            # 右下角
-            painter.drawLine(x4, y4, x4 - corner_size, y4)
-            painter.drawLine(x4, y4, x4, y4 - corner_size)
+        zoom = self.loupe_zoom
+        side = self.LOUPE_PIXELS * zoom
+        half = self.LOUPE_PIXELS // 2
+        view_rect = QRect(loupe_rect.x() + (loupe_rect.width() - side) // 2, loupe_rect.y(), side, side)
+        painter.fillRect(loupe_rect, QColor(0, 0, 0, 200))
+        
+        # 只取鼠标周围的一小块原生像素放大，不缩放整张截图
+        center = tile.devicePoint(self.cursor_pos)
+        source = QRect(center.x() - half, center.y() - half, self.LOUPE_PIXELS, self.LOUPE_PIXELS)
+        visible = source.intersected(QRect(0, 0, tile.pixmap.width(), tile.pixmap.height()))
+        if not visible.isEmpty():
+            target = QRect(view_rect.x() + (visible.x() - source.x()) * zoom,
+                           view_rect.y() + (visible.y() - source.y()) * zoom,
+                           visible.width() * zoom, visible.height() * zoom)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, False)
+            painter.drawPixmap(QRectF(target), tile.pixmap, QRectF(visible))
             
-            # 显示尺寸信息
-            size_text = f'{rect.width()} x {rect.height()}'
-            font = painter.font()
-            font.setPointSize(10)
-            painter.setFont(font)
+        # 像素网格
+        painter.setPen(QColor(255, 255, 255, 40))
+        for offset in range(zoom, side, zoom):
+            painter.drawLine(view_rect.x() + offset, view_rect.y(), view_rect.x() + offset, view_rect.bottom())
+            painter.drawLine(view_rect.x(), view_rect.y() + offset, view_rect.right(), view_rect.y() + offset)
             
-            text_rect = painter.fontMetrics().boundingRect(size_text)
-            text_x = int(rect.center().x() - text_rect.width() / 2)
-            text_y = int(rect.top() - 5)
+        # 标出鼠标所在的像素
+        painter.setPen(QPen(self.SELECTION_COLOR, 1))
+        painter.drawRect(view_rect.x() + half * zoom, view_rect.y() + half * zoom, zoom, zoom)
+        painter.drawRect(view_rect.adjusted(0, 0, -1, -1))
+        
+        # 坐标和颜色信息
+        color = tile.pixelColor(self.cursor_pos)
+        line_height = self.label_metrics.height()
+        painter.setFont(self.label_font)
+        painter.setPen(Qt.GlobalColor.white)
+        text_x = loupe_rect.x() + 5
+        text_y = view_rect.bottom() + 4 + self.label_metrics.ascent()
+        painter.drawText(text_x, text_y, f'{self.cursor_pos.x()}, {self.cursor_pos.y()}')
+        painter.drawText(text_x, text_y + line_height, f'RGB({color.red()}, {color.green()}, {color.blue()})')
+        
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self.paintOverlay(painter, event.rect())
+        painter.end()
+        
+    def paintUndimmed(self, painter, rect, dirty):
+        """在区域内绘制未变暗的冻结截图"""
+        if self.render_mode != 'cached' or self.frame is None:
+            return
+        visible = rect.intersected(dirty)
+        for tile in self.frame.tilesIn(visible):
+            part = tile.rect.intersected(visible)
+            if not part.isEmpty():
+                painter.drawPixmap(QRectF(part), tile.pixmap, tile.sourceRect(part))
+                
+    def paintSelection(self, painter, rect, dirty, index=0):
+        """绘制一个选择区域：未变暗的原图、边框、四角和尺寸标签"""
+        # 选择区域内显示未变暗的原图
+        self.paintUndimmed(painter, rect, dirty)
+        
+        # 绘制选择框边界
+        pen = QPen(self.SELECTION_COLOR, self.SELECTION_PEN_WIDTH, Qt.PenStyle.SolidLine)
+        painter.setPen(pen)
+        painter.drawRect(rect)
+        
+        # 绘制选择框四角
+        corner_size = self.CORNER_SIZE
+        painter.setPen(QPen(self.SELECTION_COLOR, self.SELECTION_PEN_WIDTH))
+        
+        # 获取整数坐标
+        x1, y1 = int(rect.topLeft().x()), int(rect.topLeft().y())
+        x2, y2 = int(rect.topRight().x()), int(rect.topRight().y())
+        x3, y3 = int(rect.bottomLeft().x()), int(rect.bottomLeft().y())
+        x4, y4 = int(rect.bottomRight().x()), int(rect.bottomRight().y())
+        
+        # 左上角
+        painter.drawLine(x1, y1, x1 + corner_size, y1)
+        painter.drawLine(x1, y1, x1, y1 + corner_size)
+        
+        # 右上角
+        painter.drawLine(x2, y2, x2 - corner_size, y2)
+        painter.drawLine(x2, y2, x2, y2 + corner_size)
+        
+        # 左下角
+        painter.drawLine(x3, y3, x3 + corner_size, y3)
+        painter.drawLine(x3, y3, x3, y3 - corner_size)
+        
+        # 右下角
+        painter.drawLine(x4, y4, x4 - corner_size, y4)
+        painter.drawLine(x4, y4, x4, y4 - corner_size)
+        
+        # 显示尺寸信息
+        size_text, text_bg_rect, text_pos = self.sizeLabelRect(rect, index)
+        painter.setFont(self.label_font)
+        
+        # 绘制文本背景
+        painter.fillRect(text_bg_rect, QColor(0, 0, 0, 160))
+        
+        # 绘制尺寸文本
+        painter.setPen(Qt.GlobalColor.white)
+        painter.drawText(text_pos, size_text)
+        
+    def paintOverlay(self, painter, dirty):
+        """绘制遮罩和选择框，dirty为虚拟桌面坐标中需要重绘的区域"""
+        paint_start = metrics.now()
+        
+        if self.render_mode == 'cached' and self.frame is not None:
+            # 只贴出需要重绘的那一块变暗背景，屏幕间的空隙保持透明
+            painter.fillRect(dirty, QColor(0, 0, 0, 1))
+            for tile in self.frame.tilesIn(dirty):
+                part = tile.rect.intersected(dirty)
+                if not part.isEmpty():
+                    painter.drawPixmap(QRectF(part), tile.dimmed, tile.sourceRect(part))
+        else:
+            # 绘制半透明背景
+            painter.fillRect(dirty, QColor(0, 0, 0, 1))
+        
+        if not self.is_drawing and not self.has_selection and self.hover_rect is not None:
+            # 高亮鼠标下检测到的界面矩形，单击即可选中
+            self.paintUndimmed(painter, self.hover_rect, dirty)
+            painter.setPen(QPen(self.SELECTION_COLOR, 1, Qt.PenStyle.DashLine))
+            painter.drawRect(self.hover_rect.adjusted(0, 0, -1, -1))
             
-            # 绘制文本背景
-            text_bg_rect = QRect(text_x - 5, text_y - text_rect.height(),
-                               text_rect.width() + 10, text_rect.height() + 5)
-            painter.fillRect(text_bg_rect, QColor(0, 0, 0, 160))
+        for index, rect in self.visibleSelections():
+            if self.selectionDirtyRect(rect, index).intersects(dirty):
+                self.paintSelection(painter, rect, dirty, index)
             
-            # 绘制尺寸文本
-            painter.setPen(Qt.GlobalColor.white)
-            painter.drawText(text_x, text_y, size_text)
+        # 放大镜始终画在最上层
+        self.paintLoupe(painter, dirty)
+        
+        metrics.record('overlay_paint', metrics.elapsed_ms(paint_start))
             
     def mousePressEvent(self, event):
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.begin = event.pos()
+        self.selectionPress(event.pos(), event.button())
+        
+    def mouseMoveEvent(self, event):
+        self.selectionMove(event.pos())
+        
+    def mouseReleaseEvent(self, event):
+        self.selectionRelease(event.pos(), event.button())
+        
+    def selectionPress(self, pos, button):
+        """pos为虚拟桌面坐标，选择区域可以跨越多个屏幕"""
+        if button == Qt.MouseButton.LeftButton:
+            self.invalidateSelections()
+            # 按住Shift时保留已选择的区域，否则重新框选
+            if not QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+                self.regions = []
+            # 框选时收起上一次的工具条
+            self.has_selection = False
+            if self.tool_panel is not None:
+                self.tool_panel.hide()
+            self.begin = pos
             self.end = self.begin
             self.is_drawing = True
-            self.update()
+            self.invalidateSelections()
             
-    def mouseMoveEvent(self, event):
+    def selectionMove(self, pos):
+        if self.has_selection:
+            # 等待选择操作时不显示放大镜和吸附高亮
+            return
+        self.moveLoupe(pos)
         if self.is_drawing:
-            self.end = event.pos()
-            self.update()
+            # 只重绘新旧选择框覆盖的区域
+            index = len(self.regions) + 1 if self.regions else 0
+            old_dirty = self.selectionDirtyRect(self.selectionRect(), index)
+            self.end = pos
+            self.invalidate(old_dirty.united(self.selectionDirtyRect(self.selectionRect(), index)))
+        else:
+            self.updateHover(pos)
             
-    def mouseReleaseEvent(self, event):
-        if event.button() == Qt.MouseButton.LeftButton and self.is_drawing:
+    def updateHover(self, pos):
+        """根据检测结果高亮鼠标下的界面矩形"""
+        hover_rect = self.snap_index.rectAt(pos) if self.snap_index is not None else None
+        if hover_rect == self.hover_rect:
+            return
+        for rect in (self.hover_rect, hover_rect):
+            if rect is not None:
+                self.invalidate(rect.adjusted(-1, -1, 1, 1))
+        self.hover_rect = hover_rect
+            
+    def selectionRelease(self, pos, button):
+        if button == Qt.MouseButton.LeftButton and self.is_drawing:
+            self.release_time = metrics.now()
+            self.invalidateSelections()
             self.is_drawing = False
-            if self.begin and self.end:
+            # 用户已经完成选择，不再需要吸附结果（显示工具条后不再高亮，继续框选时也用不到）
+            self.cancelSnapDetection()
+            
+            # 单击（几乎没有拖动）时选中鼠标下高亮的界面矩形
+            moved = (self.end - self.begin).manhattanLength()
+            if moved <= self.CLICK_DISTANCE and self.hover_rect is not None:
+                self.begin = self.hover_rect.topLeft()
+                self.end = self.hover_rect.bottomRight()
+            self.hover_rect = None
+            
+            if self.begin is not None and self.end is not None:
                 rect = QRect(self.begin, self.end).normalized()
                 if rect.width() > 0 and rect.height() > 0:
-                    self.capture_screenshot()
+                    self.regions.append(rect)
+                    if self.selection_action == 'editor' and len(self.regions) == 1:
+                        self.capture_screenshot()
+                        return
+            if self.regions:
+                self.showToolPanel(self.regions[-1])
+                
+                        
+    def ensureToolPanel(self):
+        if self.tool_panel is None:
+            self.tool_panel = FloatingToolPanel()
+            self.tool_panel.copy_btn.clicked.connect(self.copyScreenshot)
+            self.tool_panel.save_btn.clicked.connect(self.saveScreenshot)
+            self.tool_panel.edit_btn.clicked.connect(self.editScreenshot)
+            self.tool_panel.collage_btn.clicked.connect(self.collageScreenshot)
+            self.tool_panel.record_btn.clicked.connect(self.recordSelection)
+            self.tool_panel.scroll_btn.clicked.connect(self.scrollCaptureSelection)
+            self.tool_panel.cancel_btn.clicked.connect(self.finish)
+        return self.tool_panel
+        
+    def showToolPanel(self, rect):
+        """在选择区域旁显示工具条，选择区域保持高亮直到选择操作"""
+        self.has_selection = True
+        self.moveLoupe(None)
+        self.invalidateSelections()
+        
+        selection = rect.translated(self.virtual_geometry.topLeft())
+        bounds = self.virtual_geometry
+        for screen in self.screens:
+            if screen.geometry.contains(selection.bottomRight()):
+                bounds = screen.geometry
+                break
+        self.ensureToolPanel().showAt(selection, bounds, len(self.regions))
                     
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Escape:
-            self.close()
-            self.finished.emit()
+            self.finish()
+        elif self.has_selection:
+            # 工具条的快捷键：回车复制，Ctrl+S保存，Ctrl+E编辑
+            ctrl = event.modifiers() & Qt.KeyboardModifier.ControlModifier
+            if event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+                self.copyScreenshot()
+            elif ctrl and event.key() == Qt.Key.Key_S:
+                self.saveScreenshot()
+            elif ctrl and event.key() == Qt.Key.Key_E:
+                self.editScreenshot()
+            elif ctrl and event.key() == Qt.Key.Key_G:
+                self.collageScreenshot()
+                
+    def takeSelections(self):
+        """从同一张冻结截图中裁出所有选择区域，不重新截屏；最后一个区域记为上次截图区域"""
+        if self.frame is None or not self.regions:
+            return []
+        self.rememberRegion(self.regions[-1])
+        return [self.grabSelection(rect) for rect in self.regions]
+                
+    def takeSelection(self):
+        """取出当前选择的截图，多个区域时返回拼图，没有有效选择时返回None"""
+        screenshots = self.takeSelections()
+        if not screenshots:
+            return None
+        if len(screenshots) == 1:
+            return screenshots[0]
+        return capture_output.make_collage(screenshots)
             
     def capture_screenshot(self):
-        if self.begin and self.end:
+        if self.begin is not None and self.end is not None:
             rect = QRect(self.begin, self.end).normalized()
             if rect.width() > 0 and rect.height() > 0:
                 # 捕获选定区域的截图
-                screenshot = self.original_pixmap.copy(rect)
+                screenshot = self.grabSelection(rect)
+                self.rememberRegion(rect)
                 
-                # 打开编辑窗口
-                from .editor_window import EditorWindow
-                self.editor = EditorWindow(screenshot)
-                self.editor.show()
+                # 打开编辑窗口（复用之前关闭的窗口）
+                from .editor_window import open_editor
+                self.editor = open_editor(screenshot, self.release_time)
                 
-        self.close()
-        self.finished.emit()
+        self.finish()
         
     def copyScreenshot(self):
-        if self.begin and self.end:
-            rect = QRect(self.begin, self.end).normalized()
-            screenshot = self.original_pixmap.copy(rect)
-            QApplication.clipboard().setPixmap(screenshot)
-            self.close()
-            self.finished.emit()
+        """只复制到剪贴板，不创建编辑窗口；多个区域时一次复制所有截图"""
+        start = metrics.now()
+        screenshots = self.takeSelections()
+        if len(screenshots) == 1:
+            capture_output.copy_to_clipboard(screenshots[0])
+        elif screenshots:
+            capture_output.copy_batch_to_clipboard(screenshots)
+        if screenshots:
+            metrics.record('selection_copy', metrics.elapsed_ms(start))
+        self.finish()
             
     def saveScreenshot(self):
-        if self.begin and self.end:
-            rect = QRect(self.begin, self.end).normalized()
-            screenshot = self.original_pixmap.copy(rect)
-            self.editor = EditorWindow(screenshot)
-            self.editor.show()
-            self.close()
-            self.finished.emit()
+        """保存到设置的存储路径，未设置时询问保存位置，不创建编辑窗口；多个区域时分别保存"""
+        screenshots = self.takeSelections()
+        self.finish()
+        if len(screenshots) > 1:
+            self.saveScreenshots(screenshots)
+            return
+        if not screenshots:
+            return
+        screenshot = screenshots[0]
+        try:
+            if capture_output.save_in_background(screenshot) is None:
+                from PyQt6.QtWidgets import QFileDialog
+                suggested = capture_output.timestamped_filename(os.path.expanduser('~'))
+                filename, _ = QFileDialog.getSaveFileName(
+                    None,
+                    "保存截图",
+                    suggested,
+                    "PNG图片 (*.png);;JPEG图片 (*.jpg)"
+                )
+                # 建议的文件名只用于对话框，不在后台写入
+                capture_output.release_filename(suggested)
+                if filename:
+                    screenshot.save(filename, quality=100)
+        except Exception as e:
+            print(f"保存截图时出错: {str(e)}")
+            
+    def saveScreenshots(self, screenshots):
+        try:
+            directory = capture_output.default_save_dir()
+            if not directory:
+                from PyQt6.QtWidgets import QFileDialog
+                directory = QFileDialog.getExistingDirectory(None, "选择保存目录", os.path.expanduser('~'))
+            if directory:
+                capture_output.save_batch_in_background(screenshots, directory)
+        except Exception as e:
+            print(f"保存截图时出错: {str(e)}")
+            
+    def collageScreenshot(self):
+        """把所有区域拼成一张图，复制到剪贴板并在设置了存储路径时保存"""
+        screenshots = self.takeSelections()
+        if screenshots:
+            capture_output.deliver(capture_output.make_collage(screenshots))
+        self.finish()
             
+    def recordSelection(self):
+        """关闭遮罩后录制选择区域，录制由recordRequested的接收方负责"""
+        rect = self.releaseSelection()
+        if rect is not None:
+            self.recordRequested.emit(rect)
+            
+    def scrollCaptureSelection(self):
+        """关闭遮罩后对选择区域进行长截图，由scrollCaptureRequested的接收方负责"""
+        rect = self.releaseSelection()
+        if rect is not None:
+            self.scrollCaptureRequested.emit(rect)
+            
+    def releaseSelection(self):
+        """记住最后一个选择区域并关闭遮罩，返回该区域的全局逻辑坐标"""
+        if not self.regions:
+            self.finish()
+            return None
+        rect = self.regions[-1].translated(self.virtual_geometry.topLeft())
+        self.rememberRegion(self.regions[-1])
+        self.finish()
+        return rect
+        
     def editScreenshot(self):
-        if self.begin and self.end:
-            rect = QRect(self.begin, self.end).normalized()
-            screenshot = self.original_pixmap.copy(rect)
-            self.editor = EditorWindow(screenshot)
-            self.editor.show()
-            self.close()
-            self.finished.emit()
+        start = metrics.now()
+        screenshot = self.takeSelection()
+        if screenshot is not None:
+            # 编辑窗口较重，只在真正需要编辑时才导入和创建，关闭后回收复用
+            from .editor_window import open_editor
+            self.editor = open_editor(screenshot, start)
+        self.finish()
+            
+    def startSnapDetection(self):
+        """在遮罩显示后启动后台矩形检测，检测期间遮罩照常响应"""
+        if not self.snap_enabled or self.frame is None:
+            return
+        # QPixmap只能在界面线程使用，这里只做廉价的toImage，降采样和检测都在线程中完成
+        # 转换出的QImage保存在块中，放大镜读取颜色时也会复用
+        images = [(tile.rect, tile.image()) for tile in self.frame.tiles]
+        detector = SnapDetector(self.capture_serial, images, self.snap_downsample)
+        detector.detected.connect(self.onSnapDetected)
+        detector.finished.connect(lambda: self.onSnapWorkerFinished(detector))
+        self.snap_workers.append(detector)
+        self.snap_detector = detector
+        detector.start(QThread.Priority.LowPriority)
+        
+    def cancelSnapDetection(self):
+        if self.snap_detector is not None:
+            self.snap_detector.cancel()
+            self.snap_detector = None
+            
+    def onSnapWorkerFinished(self, detector):
+        # 线程结束后才释放引用，避免QThread在运行中被回收
+        if detector in self.snap_workers:
+            self.snap_workers.remove(detector)
+            
+    def onSnapDetected(self, serial, index):
+        # 忽略上一次截图的过期结果
+        if serial != self.capture_serial or self.frame is None:
+            return
+        self.snap_index = index
+        metrics.record('snap_detect', metrics.elapsed_ms(self.trigger_time))
+        if not self.is_drawing:
+            self.updateHover(self.mapFromVirtualCursor())
             
-    def start(self):
-        # 设置窗口大小为所有屏幕的总区域
-        self.setGeometry(self.virtual_geometry)
-        self.showFullScreen()  # 使用showFullScreen而不是show
+    def mapFromVirtualCursor(self):
+        """当前鼠标位置在虚拟桌面坐标中的位置"""
+        return QCursor.pos() - self.virtual_geometry.topLeft()
+        
+    def finish(self):
+        """隐藏截图窗口并释放本次截图，窗口本身保留以便下次复用"""
+        self.cancelSnapDetection()
+        self.close()
+        for window in self.overlay_windows:
+            window.hide()
+        if self.tool_panel is not None:
+            self.tool_panel.hide()
+        self.is_drawing = False
+        self.has_selection = False
+        self.regions = []
+        self.frame = None
+        self.snap_index = None
+        self.hover_rect = None
+        self.cursor_pos = None
+        self.finished.emit()
+        
+    def start(self, trigger_time=None):
+        # 触发时间用于统计从双击到可以框选的延迟
+        self.trigger_time = trigger_time if trigger_time is not None else metrics.now()
+        
+        # 屏幕布局来自缓存，只有屏幕变化后才会重新计算
+        self.screens = self.backend.screens()
+        self.virtual_geometry = self.calculate_virtual_geometry()
+        
+        # 获取所有屏幕的截图
+        self.capture_serial += 1
+        self.snap_index = None
+        self.hover_rect = None
+        self.frame = self.grab_all_screens()
+        if self.render_mode == 'cached':
+            self.frame.buildDimmed(self.DIM_COLOR)
+        self.reportFrameMemory()
+        
+        # 重置选择状态
+        self.begin = QPoint()
+        self.end = QPoint()
+        self.is_drawing = False
+        self.has_selection = False
+        self.regions = []
+        self.cursor_pos = QPoint(self.mapFromVirtualCursor()) if self.loupe_enabled else None
+        
+        if self.overlay_mode == 'per_screen':
+            self.showOverlayWindows()
+        else:
+            # 设置窗口大小为所有屏幕的总区域
+            self.setGeometry(self.virtual_geometry)
+            self.showFullScreen()  # 使用showFullScreen而不是show
+            QApplication.processEvents()  # 确保窗口完全显示
+            self.activateWindow()  # 确保窗口获得焦点
+            self.raise_()  # 确保窗口在最顶层
+        metrics.record('overlay_ready', metrics.elapsed_ms(self.trigger_time))
+        
+        # 遮罩显示之后再开始检测界面矩形
+        QTimer.singleShot(0, self.startSnapDetection)
+        
+    def showOverlayWindows(self):
+        """在每个屏幕上显示各自的遮罩窗口，并激活鼠标所在屏幕的窗口"""
+        windows = self.ensureOverlayWindows()
+        for window in windows:
+            window.showOnScreen()
         QApplication.processEvents()  # 确保窗口完全显示
-        self.activateWindow()  # 确保窗口获得焦点
-        self.raise_()  # 确保窗口在最顶层
\ No newline at end of file
+        cursor_pos = QCursor.pos()
+        for window in windows:
+            if window.target_screen.geometry.contains(cursor_pos):
+                window.activateWindow()
+                window.raise_()
+                break
\ No newline at end of file
@@ -0,0 +1,95 @@
+from PyQt6.QtCore import Qt, QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap
+from .image_ops import qimage_to_pil, pil_to_qimage
+from .scroll_stitcher import ScrollStitcher
+from . import capture_output
+from . import metrics
+
+class ScrollingCapture(QObject):
+    """长截图：用户滚动页面时反复截取同一区域（全局逻辑坐标），逐帧拼接成长图
+    
+    拼接由scroll_stitcher完成，这里只负责定时截图、判断何时结束和输出结果。
+    连续idle_seconds秒没有新内容、拼接高度超过max_height或从菜单停止时结束，
+    结果复制到剪贴板并在设置了存储路径时保存。
+    """
+    finished = pyqtSignal(dict)
+    
+    def __init__(self, tool, rect, interval_ms=150, idle_seconds=3.0, max_height=60000, parent=None):
+        super().__init__(parent)
+        self.tool = tool
+        self.rect = rect
+        self.idle_seconds = idle_seconds
+        self.max_height = max_height
+        self.stitcher = ScrollStitcher()
+        self.device_pixel_ratio = 1.0
+        
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.CoarseTimer)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.tick)
+        
+        self.start_time = None
+        self.last_change = None
+        self.stitch_seconds = 0.0
+        
+    def isCapturing(self):
+        return self.timer.isActive()
+        
+    def start(self):
+        self.start_time = metrics.now()
+        self.last_change = self.start_time
+        self.timer.start()
+        self.tick()
+        
+    def tick(self):
+        screenshot = self.tool.grabRegion(self.rect)
+        if screenshot is None:
+            print("长截图区域不在任何屏幕上，停止长截图")
+            self.stop()
+            return
+        self.device_pixel_ratio = screenshot.devicePixelRatio()
+        
+        start = metrics.now()
+        rows = self.stitcher.add(qimage_to_pil(screenshot.toImage()))
+        elapsed_ms = metrics.elapsed_ms(start)
+        self.stitch_seconds += elapsed_ms / 1000.0
+        metrics.record('scroll_stitch', elapsed_ms)
+        
+        if rows:
+            self.last_change = metrics.now()
+        if self.stitcher.totalHeight() >= self.max_height:
+            print("长截图已达到最大高度")
+            self.stop()
+        elif metrics.elapsed_ms(self.last_change) >= self.idle_seconds * 1000:
+            self.stop()
+            
+    def stop(self):
+        """停止截图并输出拼接结果"""
+        if not self.timer.isActive():
+            return
+        self.timer.stop()
+        filename = None
+        image = self.stitcher.result()
+        if image is not None:
+            pixmap = QPixmap.fromImage(pil_to_qimage(image))
+            pixmap.setDevicePixelRatio(self.device_pixel_ratio)
+            filename = capture_output.deliver(pixmap)
+        self.finished.emit(self.stats(filename))
+        
+    def stats(self, filename=None):
+        stitcher = self.stitcher
+        return {
+            'frames': stitcher.frames,
+            'skipped': stitcher.skipped,
+            'width': stitcher.width or 0,
+            'height': stitcher.totalHeight(),
+            'stitch_ms': self.stitch_seconds * 1000 / max(1, stitcher.frames),
+            'filename': filename,
+        }
+
+def format_stats(stats):
+    text = (f"长截图 {stats['width']}x{stats['height']}，共 {stats['frames']} 帧，"
+            f"无法对齐 {stats['skipped']} 帧，平均每帧拼接 {stats['stitch_ms']:.2f} ms")
+    if stats['filename']:
+        text += f"，保存到 {stats['filename']}"
+    return text
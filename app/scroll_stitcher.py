@@ -0,0 +1,185 @@
+"""滚动截图的拼接
+
+只依赖Pillow，不需要Qt，可以直接对一组图像使用（基准测试和无界面环境）。
+每一帧按行计算摘要，比较整行摘要而不是逐像素比较：先用在上一帧中唯一的连续若干行
+作为锚点找出候选的滚动距离，再用列表切片一次性校验重叠部分。
+"""
+
+def row_hashes(image):
+    """返回图像每一行像素数据的摘要列表，宽或高为0时返回空列表"""
+    data = image.tobytes()
+    if not data:
+        return []
+    stride = len(data) // image.height
+    return [hash(data[offset:offset + stride]) for offset in range(0, len(data), stride)]
+
+def static_margins(previous, current, limit):
+    """两帧中位置不变的顶部和底部行数（固定的标题栏、工具栏等）"""
+    count = min(len(previous), len(current))
+    top = 0
+    while top < min(limit, count) and previous[top] == current[top]:
+        top += 1
+    bottom = 0
+    while bottom < min(limit, count - top) and previous[-1 - bottom] == current[-1 - bottom]:
+        bottom += 1
+    return top, bottom
+
+def row_windows(hashes, size):
+    """连续size行的摘要组成的窗口，单独一行常常重复（空白行、同一行文字的多个像素行）"""
+    return list(zip(*(hashes[offset:] for offset in range(size))))
+
+def find_scroll(previous, current, min_overlap=16, max_anchors=32, margin_limit=None, window=8):
+    """求current相对previous向下滚动了多少行
+    
+    previous和current为row_hashes的结果。返回(滚动行数, 顶部固定行数, 底部固定行数)，
+    找不到可靠的重叠时滚动行数为None，画面完全没有滚动时为0。
+    """
+    if previous == current:
+        return 0, 0, 0
+    if len(previous) != len(current):
+        return None, 0, 0
+    if margin_limit is None:
+        margin_limit = len(current) // 3
+    top, bottom = static_margins(previous, current, margin_limit)
+    prev_body = previous[top:len(previous) - bottom]
+    cur_body = current[top:len(current) - bottom]
+    if len(prev_body) < min_overlap or len(cur_body) < min_overlap:
+        return None, top, bottom
+        
+    # 上一帧中只出现一次的窗口才适合作锚点
+    positions = {}
+    for index, value in enumerate(row_windows(prev_body, window)):
+        positions[value] = -1 if value in positions else index
+        
+    candidates = []
+    anchors = 0
+    for index, value in enumerate(row_windows(cur_body, window)):
+        position = positions.get(value, -1)
+        if position < 0:
+            continue
+        shift = position - index
+        if shift > 0 and shift not in candidates:
+            candidates.append(shift)
+        anchors += 1
+        if anchors >= max_anchors:
+            break
+            
+    # 滚动距离越小重叠越多，优先校验
+    for shift in sorted(candidates):
+        overlap = len(prev_body) - shift
+        if overlap < min_overlap:
+            continue
+        if prev_body[shift:] == cur_body[:overlap]:
+            top, bottom = shrink_margins(previous, current, shift, top, bottom)
+            return shift, top, bottom
+    return None, top, bottom
+
+def shrink_margins(previous, current, shift, top, bottom):
+    """固定区域旁边的空白行在两帧中也相同，会被误算进固定区域；
+    找出与滚动距离仍然一致的最小顶部和底部行数"""
+    count = len(current)
+    
+    def consistent(top, bottom):
+        return previous[top + shift:count - bottom] == current[top:count - bottom - shift]
+        
+    for smaller in range(bottom):
+        if consistent(top, smaller):
+            bottom = smaller
+            break
+    for smaller in range(top):
+        if consistent(smaller, bottom):
+            top = smaller
+            break
+    return top, bottom
+
+class ScrollStitcher:
+    """逐帧拼接滚动截图
+    
+    每一帧只保留新出现的行（一条条横向的图块），最后一次性贴到结果图中。
+    固定在顶部的标题栏只保留第一帧的，固定在底部的状态栏只在结果末尾保留一次。
+    """
+    def __init__(self, min_overlap=16):
+        self.min_overlap = min_overlap
+        self.strips = []
+        self.previous = None
+        self.previous_image = None
+        self.footer = None
+        self.width = None
+        self.height = 0
+        self.frames = 0
+        self.skipped = 0
+        
+    def add(self, image):
+        """加入一帧，返回新增的行数；无法与上一帧对齐或者是空图像时返回None并丢弃该帧"""
+        self.frames += 1
+        if image.width == 0 or image.height == 0:
+            self.skipped += 1
+            return None
+        hashes = row_hashes(image)
+        if self.previous is None:
+            self.width = image.width
+            self.previous = hashes
+            self.previous_image = image
+            self.strips.append(image)
+            self.height = image.height
+            return image.height
+            
+        if image.width != self.width:
+            self.skipped += 1
+            return None
+        shift, top, bottom = find_scroll(self.previous, hashes, self.min_overlap)
+        if shift is None:
+            self.skipped += 1
+            return None
+        if shift == 0:
+            return 0
+            
+        # 新内容位于固定的底部之上；底部固定区域先从已拼接的内容中移除，结果末尾再补一次
+        if bottom and self.footer is None:
+            self.footer = self.previous_image.crop((0, image.height - bottom, self.width, image.height))
+            self.trimBottom(bottom)
+        body_end = image.height - bottom
+        new_rows = image.crop((0, body_end - shift, self.width, body_end))
+        self.strips.append(new_rows)
+        self.height += shift
+        self.previous = hashes
+        self.previous_image = image
+        return shift
+        
+    def trimBottom(self, rows):
+        """从已拼接的内容末尾去掉rows行"""
+        while rows > 0 and self.strips:
+            last = self.strips[-1]
+            if last.height <= rows:
+                self.strips.pop()
+                rows -= last.height
+                self.height -= last.height
+            else:
+                self.strips[-1] = last.crop((0, 0, last.width, last.height - rows))
+                self.height -= rows
+                rows = 0
+                
+    def totalHeight(self):
+        """结果长图的高度：height不包括末尾补上的底部固定区域"""
+        return self.height + (self.footer.height if self.footer is not None else 0)
+        
+    def result(self):
+        """组合出完整的长图"""
+        from PIL import Image
+        if not self.strips:
+            return None
+        parts = self.strips + ([self.footer] if self.footer is not None else [])
+        mode = parts[0].mode
+        output = Image.new(mode, (self.width, sum(part.height for part in parts)))
+        y = 0
+        for part in parts:
+            output.paste(part, (0, y))
+            y += part.height
+        return output
+
+def stitch(images, min_overlap=16):
+    """拼接一组按滚动顺序排列的图像"""
+    stitcher = ScrollStitcher(min_overlap)
+    for image in images:
+        stitcher.add(image)
+    return stitcher.result()
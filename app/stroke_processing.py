@@ -0,0 +1,134 @@
+"""画笔笔迹的简化与平滑
+
+鼠标移动得到的点非常密集，而且带有整像素的锯齿。笔画结束时先用Ramer–Douglas–Peucker
+算法去掉与折线偏差小于容差的点，再用二次贝塞尔曲线连接剩下的点：以相邻两点的中点作为
+曲线的端点、原来的点作为控制点，曲线在连接处切线连续。
+simplify和smooth_segments只处理(x, y)元组，不依赖Qt，可以直接用于记录下来的笔迹数据。
+"""
+import os
+import json
+
+# 默认容差（像素），小于一个像素的偏差在屏幕上看不出来
+DEFAULT_TOLERANCE = 0.8
+
+def radial_reduce(points, tolerance):
+    """去掉与上一个保留点距离不超过tolerance的点（包括鼠标不动时重复的点），保留终点
+    
+    这一步是线性的，先用它减少点数，RDP的开销就小得多。
+    """
+    if len(points) < 3:
+        return list(points)
+    tolerance_sq = tolerance * tolerance
+    last_x, last_y = points[0]
+    result = [points[0]]
+    for point in points[1:-1]:
+        dx = point[0] - last_x
+        dy = point[1] - last_y
+        if dx * dx + dy * dy > tolerance_sq:
+            result.append(point)
+            last_x, last_y = point
+    if points[-1] != result[-1]:
+        result.append(points[-1])
+    return result
+
+def simplify(points, tolerance=DEFAULT_TOLERANCE):
+    """Ramer–Douglas–Peucker简化，保留首尾两点，所有去掉的点到结果折线的距离不超过tolerance
+    
+    用栈代替递归，长笔画不会超出递归深度。
+    """
+    points = radial_reduce(points, tolerance)
+    if len(points) < 3:
+        return points
+    tolerance_sq = tolerance * tolerance
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first]
+        x2, y2 = points[last]
+        dx = x2 - x1
+        dy = y2 - y1
+        length_sq = dx * dx + dy * dy
+        farthest = -1
+        farthest_distance = tolerance_sq
+        # 点到线段距离的平方，直接写在循环里避免函数调用的开销
+        for index in range(first + 1, last):
+            px, py = points[index]
+            if length_sq == 0:
+                cx = px - x1
+                cy = py - y1
+            else:
+                t = ((px - x1) * dx + (py - y1) * dy) / length_sq
+                t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+                cx = x1 + t * dx - px
+                cy = y1 + t * dy - py
+            distance = cx * cx + cy * cy
+            if distance > farthest_distance:
+                farthest = index
+                farthest_distance = distance
+        if farthest >= 0:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def smooth_segments(points):
+    """把折线转换为二次贝塞尔曲线
+    
+    返回(起点, [(控制点, 终点), ...])，控制点为None表示直线段。
+    曲线经过首尾两点和各边的中点。
+    """
+    if not points:
+        return None, []
+    if len(points) < 3:
+        return points[0], [(None, point) for point in points[1:]]
+    segments = []
+    for index in range(1, len(points) - 1):
+        control = points[index]
+        following = points[index + 1]
+        middle = ((control[0] + following[0]) / 2.0, (control[1] + following[1]) / 2.0)
+        segments.append((control, middle))
+    segments.append((None, points[-1]))
+    return points[0], segments
+
+def stroke_path(points, tolerance=DEFAULT_TOLERANCE):
+    """简化并平滑笔迹，返回可以直接绘制的QPainterPath"""
+    return smooth_path(simplify(points, tolerance))
+
+def smooth_path(points):
+    """把已经简化的折线平滑为QPainterPath"""
+    from PyQt6.QtCore import QPointF
+    from PyQt6.QtGui import QPainterPath
+    start, segments = smooth_segments(points)
+    if start is None:
+        return QPainterPath()
+    path = QPainterPath(QPointF(*start))
+    for control, end in segments:
+        if control is None:
+            path.lineTo(QPointF(*end))
+        else:
+            path.quadTo(QPointF(*control), QPointF(*end))
+    return path
+
+def record_trace(points, thickness):
+    """设置了SCREENSHOT_TOOL_STROKE_LOG时把原始笔迹追加到该文件（每行一个JSON），供基准测试回放"""
+    filename = os.environ.get('SCREENSHOT_TOOL_STROKE_LOG', '')
+    if not filename:
+        return
+    try:
+        with open(filename, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'thickness': thickness, 'points': points}) + '\n')
+    except Exception as e:
+        print(f"记录笔迹出错: {str(e)}")
+
+def load_traces(filename):
+    """读取record_trace记录的笔迹，返回[(线宽, 点列表), ...]"""
+    traces = []
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                trace = json.loads(line)
+                traces.append((trace.get('thickness', 2), [tuple(point) for point in trace['points']]))
+    return traces
@@ -0,0 +1,303 @@
+"""文字标注的排版
+
+字体度量和每个断行单位（单词、单个汉字、空白）的宽度按（字体，字号）缓存，
+排版结果按（文字，字体，字号，行宽）缓存。编辑时的文本框和写入截图的文字标注
+用同样的参数取得同一个TextLayout来绘制，两者的换行和字号完全一致。
+排版使用图片像素为单位，文本框在画布缩放时按画布的比例绘制。
+
+文本框的字号用二分查找取能放进文本框的最大值；输入时字号通常不变或只变化一号，
+先检查上一次的字号，大多数按键只需要排版一两次。每次排版都从同样字体和行宽的上一次结果出发，
+编辑位置之前的行直接沿用，只重新断行之后的部分，因此长文字中每次按键的开销基本不变。
+"""
+import re
+import math
+from collections import OrderedDict
+from PyQt6.QtCore import Qt, QPointF, QSize
+from PyQt6.QtGui import QFont, QFontMetricsF, QStaticText, QTextOption
+from . import metrics
+
+MIN_PIXEL_SIZE = 8
+MAX_PIXEL_SIZE = 400
+MAX_CACHED_FONTS = 32
+MAX_CACHED_LAYOUTS = 64
+# 二分查找之后在结果之上再检查的字号数
+FIT_LOOKAHEAD = 4
+# 每个字体缓存的断行单位宽度的上限，超过时清空重新积累
+MAX_CACHED_ADVANCES = 4096
+
+# 断行单位：连续的空白、单个中日韩字符（任意两个字之间都可以换行）、其他连续字符（单词）
+CJK_RANGES = '\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+TOKEN_PATTERN = re.compile(f'[^\\S\\n]+|[{CJK_RANGES}]|[^\\s{CJK_RANGES}]+')
+
+class FontEntry:
+    """一个（字体，字号）的度量和断行单位宽度的缓存"""
+    __slots__ = ('font', 'metrics', 'line_height', 'advances')
+    
+    def __init__(self, font):
+        self.font = font
+        self.metrics = QFontMetricsF(font)
+        self.line_height = self.metrics.lineSpacing()
+        self.advances = {}
+        
+    def advance(self, token):
+        width = self.advances.get(token)
+        if width is None:
+            if len(self.advances) >= MAX_CACHED_ADVANCES:
+                self.advances.clear()
+            width = self.advances[token] = self.metrics.horizontalAdvance(token)
+        return width
+
+_fonts = OrderedDict()
+_layouts = OrderedDict()
+# 每种（字体，行宽）最近一次的排版，新的排版从它出发
+_recent = OrderedDict()
+
+def font_entry(font, pixel_size):
+    """按像素字号取字体的缓存，同样的字体和字号总是返回同一个对象"""
+    sized = QFont(font)
+    sized.setPixelSize(max(1, int(pixel_size)))
+    key = sized.key()
+    entry = _fonts.get(key)
+    if entry is None:
+        entry = _fonts[key] = FontEntry(sized)
+        if len(_fonts) > MAX_CACHED_FONTS:
+            _fonts.popitem(last=False)
+    else:
+        _fonts.move_to_end(key)
+    return entry
+
+def common_prefix_length(first, second):
+    """两个字符串相同前缀的长度，二分比较切片，比较本身在C中完成"""
+    if second.startswith(first):
+        return len(first)
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def wrap_lines(text, entry, wrap_width=None, offset=0):
+    """按行宽断行，返回[(起始下标, 这一行的文字, 宽度, 是否从断行单位的开头开始), ...]
+    
+    换行符强制换行；行末的空白不计入宽度，也不会出现在下一行的开头。
+    一个单词比行宽还长时按字符断开。wrap_width为None时只在换行符处换行。
+    offset为text在完整文字中的起始下标。
+    """
+    lines = []
+    for paragraph in text.split('\n'):
+        begin = 0
+        width = 0.0
+        at_token = True
+        # 还没有跟上可见字符的空白的宽度
+        spaces = 0.0
+        for match in TOKEN_PATTERN.finditer(paragraph):
+            token = match.group()
+            position = match.start()
+            if token[0].isspace():
+                spaces += entry.advance(token)
+                continue
+            token_width = entry.advance(token)
+            if wrap_width is not None and width > 0 and width + spaces + token_width > wrap_width:
+                lines.append((offset + begin, paragraph[begin:position], width, at_token))
+                begin = position
+                at_token = True
+                width = spaces = 0.0
+            if wrap_width is not None and token_width > wrap_width and len(token) > 1:
+                for index, char in enumerate(token):
+                    char_width = entry.advance(char)
+                    if width > 0 and width + spaces + char_width > wrap_width:
+                        lines.append((offset + begin, paragraph[begin:position + index], width, at_token))
+                        begin = position + index
+                        at_token = index == 0
+                        width = spaces = 0.0
+                    width += spaces + char_width
+                    spaces = 0.0
+            else:
+                width += spaces + token_width
+                spaces = 0.0
+        lines.append((offset + begin, paragraph[begin:], width, at_token))
+        offset += len(paragraph) + 1
+    return lines
+
+class TextLayout:
+    """排好的多行文字，坐标以第一行的左上角为原点
+    
+    lines为wrap_lines的结果，每一行的QStaticText在第一次绘制时创建并保留，
+    之后的重绘不再重新排列字形。previous为同样字体和行宽的另一次排版，
+    与它相同的前缀所在的行直接沿用（连同已经创建的QStaticText）。
+    """
+    
+    def __init__(self, text, entry, wrap_width=None, previous=None):
+        self.text = text
+        self.entry = entry
+        self.font = entry.font
+        self.wrap_width = wrap_width
+        self.line_height = entry.line_height
+        reuse = 0
+        if previous is not None:
+            # 从编辑位置所在的行往前找到开头不受这次编辑影响的行，从那里重新断行，
+            # 保证结果与完整排版相同
+            prefix = common_prefix_length(previous.text, text)
+            reuse = previous.lineOf(prefix)
+            while reuse > 0 and not previous.stableLine(reuse, prefix):
+                reuse -= 1
+        if reuse > 0:
+            start = previous.lines[reuse][0]
+            self.lines = previous.lines[:reuse] + wrap_lines(text[start:], entry, wrap_width, start)
+        else:
+            self.lines = wrap_lines(text, entry, wrap_width)
+        self.width = max(line[2] for line in self.lines)
+        self.height = self.line_height * len(self.lines)
+        self.static_texts = [None] * len(self.lines)
+        if reuse > 0:
+            self.static_texts[:reuse] = previous.static_texts[:reuse]
+            
+    def size(self):
+        """占用的整像素大小"""
+        return QSize(math.ceil(self.width), math.ceil(self.height))
+        
+    def paint(self, painter, origin, color, clip=None):
+        """在origin（第一行的左上角）绘制文字，clip（排版坐标）之外的行不绘制"""
+        painter.setFont(self.font)
+        painter.setPen(color)
+        first, last = 0, len(self.lines) - 1
+        if clip is not None:
+            first = max(first, int(clip.top() // self.line_height))
+            last = min(last, int(clip.bottom() // self.line_height))
+        x, y = origin.x(), origin.y()
+        for index in range(first, last + 1):
+            line = self.lines[index][1]
+            if not line:
+                continue
+            static_text = self.static_texts[index]
+            if static_text is None:
+                static_text = self.static_texts[index] = QStaticText(line)
+                static_text.setTextFormat(Qt.TextFormat.PlainText)
+                static_text.setTextOption(QTextOption(Qt.AlignmentFlag.AlignLeft))
+                static_text.setPerformanceHint(QStaticText.PerformanceHint.AggressiveCaching)
+            painter.drawStaticText(QPointF(x, y + index * self.line_height), static_text)
+            
+    def firstDifference(self, other):
+        """与另一次排版第一处不同的行，完全相同时返回行数"""
+        for index, (line, other_line) in enumerate(zip(self.lines, other.lines)):
+            if line[:2] != other_line[:2]:
+                return index
+        return min(len(self.lines), len(other.lines))
+        
+    def stableLine(self, number, prefix):
+        """文字从下标prefix开始改变后，第number行是否仍从原来的位置开始
+        
+        这一行必须从断行单位的开头开始，并且开头的单位完全在不变的前缀中，
+        否则删除可能使这个单词变短，上一行就放得下它了。
+        """
+        start, _, _, at_token = self.lines[number]
+        if not at_token:
+            return False
+        if self.text[start - 1] == '\n':
+            return True
+        match = TOKEN_PATTERN.match(self.text, start)
+        return match is not None and match.end() <= prefix
+        
+    def lineOf(self, index):
+        """文字下标所在的行"""
+        line_index = 0
+        for number, line in enumerate(self.lines):
+            if line[0] > index:
+                break
+            line_index = number
+        return line_index
+        
+    def cursorPos(self, index):
+        """文字下标处光标的位置（这一行的顶部）"""
+        number = self.lineOf(index)
+        start, line = self.lines[number][:2]
+        column = min(len(line), index - start)
+        return QPointF(self.entry.metrics.horizontalAdvance(line[:column]), number * self.line_height)
+        
+    def indexAt(self, point):
+        """点（排版坐标）对应的文字下标，用于点击移动光标"""
+        number = max(0, min(len(self.lines) - 1, int(point.y() // self.line_height)))
+        start, line = self.lines[number][:2]
+        x = 0.0
+        for column, char in enumerate(line):
+            char_width = self.entry.advance(char)
+            if point.x() < x + char_width / 2:
+                return start + column
+            x += char_width
+        return start + len(line.rstrip(' ')) if number < len(self.lines) - 1 else start + len(line)
+
+def layout_text(text, font, pixel_size, wrap_width=None):
+    """排版文字，同样的参数返回同一个缓存的TextLayout"""
+    entry = font_entry(font, pixel_size)
+    if wrap_width is not None:
+        wrap_width = round(wrap_width, 2)
+    key = (entry.font.key(), text, wrap_width)
+    layout = _layouts.get(key)
+    if layout is None:
+        recent_key = key[0], wrap_width
+        layout = _layouts[key] = TextLayout(text, entry, wrap_width, _recent.get(recent_key))
+        if len(_layouts) > MAX_CACHED_LAYOUTS:
+            _layouts.popitem(last=False)
+        _recent[recent_key] = layout
+        _recent.move_to_end(recent_key)
+        if len(_recent) > MAX_CACHED_LAYOUTS:
+            _recent.popitem(last=False)
+    else:
+        _layouts.move_to_end(key)
+    return layout
+
+def fit_text(text, font, width, height, hint=None, min_size=MIN_PIXEL_SIZE, max_size=None):
+    """在width×height内按width换行，二分查找能放下文字的最大像素字号
+    
+    hint为上一次的字号：先检查它和相邻的一号，只在字号确实需要大幅变化时才在剩下的范围内查找。
+    换行使能否放下并不随字号单调变化（字号变大后断行位置改变，行数可能反而减少），
+    因此查找之后再检查结果之上的FIT_LOOKAHEAD个字号，放得下时从那里继续往上检查；
+    间隔更大的更大字号不保证找到。连最小字号都放不下时返回最小字号。返回(字号, TextLayout)。
+    """
+    start = metrics.now()
+    if max_size is None:
+        max_size = MAX_PIXEL_SIZE
+    max_size = max(min_size, min(max_size, int(height)))
+    layouts = 0
+    
+    def fits(size):
+        nonlocal layouts
+        layouts += 1
+        layout = layout_text(text, font, size, width)
+        return layout.height <= height and layout.width <= width
+        
+    low, high = min_size, max_size
+    best = min_size
+    if hint is not None and min_size <= hint <= max_size:
+        if fits(hint):
+            best = hint
+            low = hint + 1
+            if low <= high:
+                if fits(low):
+                    best = low
+                    low += 1
+                else:
+                    high = hint
+        else:
+            high = hint - 1
+            if high >= low and fits(high):
+                best = high
+                low = high + 1
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best = middle
+            low = middle + 1
+        else:
+            high = middle - 1
+    size = best + 1
+    while size <= min(best + FIT_LOOKAHEAD, max_size):
+        if fits(size):
+            best = size
+        size += 1
+    metrics.record('text_fit', metrics.elapsed_ms(start))
+    metrics.record('text_fit_layouts', layouts, '次')
+    return best, layout_text(text, font, best, width)
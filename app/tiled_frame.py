@@ -0,0 +1,152 @@
+from PyQt6.QtCore import Qt, QRect, QRectF, QPoint
+from PyQt6.QtGui import QPainter, QPixmap
+
+class FrameTile:
+    """冻结截图中的一块，rect为它在虚拟桌面中的逻辑区域，pixmap保持原生分辨率"""
+    def __init__(self, rect, pixmap):
+        self.rect = QRect(rect)
+        self.pixmap = pixmap
+        self.dimmed = None
+        # 需要读取像素时才转换为QImage，转换一次后一直复用
+        self._image = None
+        
+    def scale(self):
+        return self.pixmap.devicePixelRatio()
+        
+    def sourceRect(self, rect):
+        """把虚拟桌面中的逻辑区域换算为本块pixmap中的像素区域"""
+        scale = self.scale()
+        return QRectF((rect.x() - self.rect.x()) * scale,
+                      (rect.y() - self.rect.y()) * scale,
+                      rect.width() * scale,
+                      rect.height() * scale)
+                      
+    def devicePoint(self, point):
+        """虚拟桌面中的逻辑坐标对应的pixmap像素坐标"""
+        scale = self.scale()
+        return QPoint(min(int((point.x() - self.rect.x()) * scale), self.pixmap.width() - 1),
+                      min(int((point.y() - self.rect.y()) * scale), self.pixmap.height() - 1))
+                      
+    def image(self):
+        if self._image is None:
+            self._image = self.pixmap.toImage()
+        return self._image
+        
+    def pixelColor(self, point):
+        """读取逻辑坐标处的像素颜色，没有现成的QImage时只复制这一个像素"""
+        device_point = self.devicePoint(point)
+        if self._image is not None:
+            return self._image.pixelColor(device_point)
+        return self.pixmap.copy(QRect(device_point, device_point)).toImage().pixelColor(0, 0)
+                      
+    def buildDimmed(self, color):
+        """把截图和遮罩合成一次，之后重绘时直接贴图"""
+        self.dimmed = QPixmap(self.pixmap)
+        painter = QPainter(self.dimmed)
+        painter.fillRect(self.dimmed.rect(), color)
+        painter.end()
+        
+    def byteCount(self):
+        return pixmap_bytes(self.pixmap)
+        
+    def dimmedByteCount(self):
+        return pixmap_bytes(self.dimmed) if self.dimmed is not None else 0
+
+def pixmap_bytes(pixmap):
+    """估算pixmap占用的内存字节数"""
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+class TiledFrame:
+    """稀疏的虚拟桌面截图
+    
+    只为屏幕实际覆盖的区域分配内存，按屏幕（或固定大小的块）保存，
+    选择区域的截图在需要时才从相交的块中组合出来。
+    """
+    def __init__(self, tiles, bounds):
+        self.tiles = tiles
+        # 虚拟桌面在帧坐标中的范围，左上角为(0, 0)
+        self.bounds = QRect(bounds)
+        
+    @classmethod
+    def fromGrabs(cls, grabs, bounds, tile_size=0):
+        """grabs为(屏幕在帧坐标中的区域, 屏幕截图)列表，tile_size大于0时按固定大小切块"""
+        tiles = []
+        for rect, pixmap in grabs:
+            if tile_size > 0:
+                tiles.extend(cls.splitGrab(rect, pixmap, tile_size))
+            else:
+                tiles.append(FrameTile(rect, pixmap))
+        return cls(tiles, bounds)
+        
+    @staticmethod
+    def splitGrab(rect, pixmap, tile_size):
+        """把一个屏幕的截图切成tile_size逻辑像素见方的块"""
+        scale = pixmap.devicePixelRatio()
+        tiles = []
+        for y in range(0, rect.height(), tile_size):
+            for x in range(0, rect.width(), tile_size):
+                part = QRect(rect.x() + x, rect.y() + y,
+                             min(tile_size, rect.width() - x),
+                             min(tile_size, rect.height() - y))
+                source = QRect(round(x * scale), round(y * scale),
+                               round(part.width() * scale), round(part.height() * scale))
+                tile_pixmap = pixmap.copy(source)
+                tile_pixmap.setDevicePixelRatio(scale)
+                tiles.append(FrameTile(part, tile_pixmap))
+        return tiles
+        
+    def tilesIn(self, rect):
+        """返回与区域相交的块"""
+        return [tile for tile in self.tiles if tile.rect.intersects(rect)]
+        
+    def tileAt(self, point):
+        for tile in self.tiles:
+            if tile.rect.contains(point):
+                return tile
+        return None
+        
+    def buildDimmed(self, color):
+        for tile in self.tiles:
+            tile.buildDimmed(color)
+            
+    def maxScale(self):
+        return max([tile.scale() for tile in self.tiles] or [1.0])
+        
+    def crop(self, rect, scale=None):
+        """组合出区域的截图
+        
+        scale为结果图每个逻辑像素对应的像素数，为None时使用相交块中最高的设备像素比。
+        结果图的设备像素比为1，未被任何屏幕覆盖的部分保持透明。
+        """
+        tiles = self.tilesIn(rect)
+        if scale is None:
+            scale = max([tile.scale() for tile in tiles] or [1.0])
+            
+        # 区域完全落在一个块内且不需要缩放时直接复制
+        if len(tiles) == 1 and tiles[0].rect.contains(rect) and tiles[0].scale() == scale:
+            screenshot = tiles[0].pixmap.copy(tiles[0].sourceRect(rect).toRect())
+            screenshot.setDevicePixelRatio(1.0)
+            return screenshot
+            
+        screenshot = QPixmap(round(rect.width() * scale), round(rect.height() * scale))
+        screenshot.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(screenshot)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        for tile in tiles:
+            part = tile.rect.intersected(rect)
+            target = QRectF((part.x() - rect.x()) * scale,
+                            (part.y() - rect.y()) * scale,
+                            part.width() * scale,
+                            part.height() * scale)
+            painter.drawPixmap(target, tile.pixmap, tile.sourceRect(part))
+        painter.end()
+        return screenshot
+        
+    def memoryReport(self):
+        """本帧各块占用的内存，以及用一整张图保存整个虚拟桌面（逻辑分辨率）时需要的内存"""
+        return {
+            'tiles': len(self.tiles),
+            'bytes': sum(tile.byteCount() for tile in self.tiles),
+            'dimmed_bytes': sum(tile.dimmedByteCount() for tile in self.tiles),
+            'bounding_bytes': self.bounds.width() * self.bounds.height() * 4,
+        }
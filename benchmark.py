@@ -0,0 +1,939 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+def parse_size(text):
+    """把 1920x1080 形式的字符串解析为(宽, 高)"""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def report(name, durations, unit_count=1, unit='次'):
+    """打印一组耗时（秒）的统计结果"""
+    durations = sorted(durations)
+    total = sum(durations)
+    mean_ms = total / len(durations) * 1000
+    p95_ms = durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000
+    rate = unit_count * len(durations) / total if total > 0 else float('inf')
+    print(f"{name:<12} 平均 {mean_ms:8.2f} ms  P95 {p95_ms:8.2f} ms  吞吐 {rate:10.1f} {unit}/秒")
+
+def ensure_gui_application():
+    """没有显示器时使用offscreen平台"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+def bench_capture(args):
+    """用合成后端测量截图、遮罩合成和裁剪的吞吐量"""
+    app = ensure_gui_application()
+    from PyQt6.QtCore import QRect, QSize
+    from app.capture_backend import SyntheticCaptureBackend
+    from app.screenshot import ScreenshotTool
+
+    width, height = parse_size(args.size)
+    backend = SyntheticCaptureBackend(
+        screen_count=args.screens,
+        screen_size=QSize(width, height),
+        layout=args.layout,
+        device_pixel_ratios=args.dpr,
+        seed=args.seed,
+    )
+    tool = ScreenshotTool(backend=backend, render_mode='cached', overlay_mode=args.overlay_mode)
+    tool.tile_size = args.tile_size
+    tool.screens = backend.screens()
+    tool.virtual_geometry = tool.calculate_virtual_geometry()
+
+    # 预先生成画面，测量时只包含截图本身
+    for screen in backend.screens():
+        backend.screenImage(screen)
+
+    grab_times, compose_times, crop_times = [], [], []
+    rng = random.Random(args.seed)
+    bounds = QRect(0, 0, tool.virtual_geometry.width(), tool.virtual_geometry.height())
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        tool.frame = tool.grab_all_screens()
+        grab_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        tool.frame.buildDimmed(tool.DIM_COLOR)
+        compose_times.append(time.perf_counter() - start)
+
+        for _ in range(args.crops):
+            w = rng.randint(50, max(51, bounds.width() // 2))
+            h = rng.randint(50, max(51, bounds.height() // 2))
+            rect = QRect(rng.randint(0, bounds.width() - w), rng.randint(0, bounds.height() - h), w, h)
+            start = time.perf_counter()
+            tool.grabSelection(rect)
+            crop_times.append(time.perf_counter() - start)
+
+    memory = tool.frame.memoryReport()
+    print(f"屏幕: {args.screens} x {args.size} 布局: {args.layout} DPR: {args.dpr} "
+          f"块数: {memory['tiles']}")
+    print(f"帧内存 {memory['bytes'] / 1048576:.1f} MB，遮罩 {memory['dimmed_bytes'] / 1048576:.1f} MB，"
+          f"整张包围盒 {memory['bounding_bytes'] / 1048576:.1f} MB")
+    report('grab', grab_times, unit='帧')
+    report('compose', compose_times, unit='帧')
+    report('crop', crop_times, unit='次')
+
+def bench_region(args):
+    """测量不经过遮罩直接截取区域并放到剪贴板的耗时"""
+    app = ensure_gui_application()
+    from PyQt6.QtCore import QRect, QSize
+    from app.capture_backend import SyntheticCaptureBackend
+    from app.screenshot import ScreenshotTool
+    from app import capture_output
+    
+    width, height = parse_size(args.size)
+    backend = SyntheticCaptureBackend(
+        screen_count=args.screens,
+        screen_size=QSize(width, height),
+        layout=args.layout,
+        device_pixel_ratios=args.dpr,
+        seed=args.seed,
+    )
+    for screen in backend.screens():
+        backend.screenImage(screen)
+    tool = ScreenshotTool(backend=backend, overlay_mode=args.overlay_mode)
+    
+    x, y, w, h = [int(part) for part in args.region.split(',')]
+    rect = QRect(x, y, w, h)
+    grab_times, total_times = [], []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        screenshot = tool.grabRegion(rect)
+        grab_times.append(time.perf_counter() - start)
+        capture_output.copy_to_clipboard(screenshot)
+        total_times.append(time.perf_counter() - start)
+        
+    print(f"区域: {args.region} 屏幕: {args.screens} x {args.size} DPR: {args.dpr} "
+          f"结果 {screenshot.width()}x{screenshot.height()}")
+    report('grab', grab_times, unit='次')
+    report('clipboard', total_times, unit='次')
+
+def bench_burst(args):
+    """用合成后端测量连拍的实际帧率、重复帧和缓冲区占用"""
+    app = ensure_gui_application()
+    import tempfile
+    from PyQt6.QtCore import QRect, QSize, QTimer
+    from app.capture_backend import SyntheticCaptureBackend
+    from app.screenshot import ScreenshotTool
+    from app.burst_capture import BurstCapture, format_stats
+    
+    width, height = parse_size(args.size)
+    backend = SyntheticCaptureBackend(screen_count=args.screens, screen_size=QSize(width, height), seed=args.seed)
+    tool = ScreenshotTool(backend=backend)
+    x, y, w, h = [int(part) for part in args.region.split(',')]
+    directory = args.out or tempfile.mkdtemp(prefix='burst_bench_')
+    burst = BurstCapture(tool, QRect(x, y, w, h), args.interval, args.buffer_mb * 1024 * 1024, directory)
+    
+    # 每隔若干毫秒改变一次画面，其余的帧都是重复帧
+    change_timer = QTimer()
+    change_timer.timeout.connect(backend.advance)
+    if args.change_ms > 0:
+        change_timer.start(args.change_ms)
+    burst.start()
+    QTimer.singleShot(int(args.duration * 1000), lambda: (burst.stop(wait=True), app.quit()))
+    burst.stopped.connect(lambda stats: print(format_stats(stats)))
+    app.exec()
+    print(f"输出目录: {directory}")
+
+def bench_record(args):
+    """用合成后端录制区域，报告文件大小、截图/对比/编码耗时"""
+    app = ensure_gui_application()
+    import tempfile
+    from PyQt6.QtCore import QRect, QSize, QTimer
+    from app.capture_backend import SyntheticCaptureBackend
+    from app.screenshot import ScreenshotTool
+    from app.region_recorder import RegionRecorder, format_report
+    
+    width, height = parse_size(args.size)
+    backend = SyntheticCaptureBackend(screen_count=1, screen_size=QSize(width, height), seed=args.seed)
+    tool = ScreenshotTool(backend=backend)
+    x, y, w, h = [int(part) for part in args.region.split(',')]
+    filename = args.out or os.path.join(tempfile.mkdtemp(prefix='record_bench_'), f'recording.{args.format}')
+    recorder = RegionRecorder(tool, QRect(x, y, w, h), filename, args.fps, tile_size=args.tile_size)
+    
+    change_timer = QTimer()
+    change_timer.timeout.connect(backend.advance)
+    if args.change_ms > 0:
+        change_timer.start(args.change_ms)
+    recorder.finished.connect(lambda report: (print(format_report(report)), app.quit()))
+    recorder.start()
+    QTimer.singleShot(int(args.duration * 1000), recorder.stop)
+    app.exec()
+
+def bench_watch(args):
+    """用合成后端测量监视模式每次采样的耗时和保存的帧数"""
+    app = ensure_gui_application()
+    import tempfile
+    from PyQt6.QtCore import QRect, QSize, QTimer
+    from PyQt6.QtCore import QThreadPool
+    from app.capture_backend import SyntheticCaptureBackend
+    from app.screenshot import ScreenshotTool
+    from app.region_watcher import RegionWatcher, format_stats
+    
+    width, height = parse_size(args.size)
+    backend = SyntheticCaptureBackend(screen_count=1, screen_size=QSize(width, height), seed=args.seed)
+    tool = ScreenshotTool(backend=backend)
+    x, y, w, h = [int(part) for part in args.region.split(',')]
+    directory = tempfile.mkdtemp(prefix='watch_bench_')
+    watcher = RegionWatcher(tool, QRect(x, y, w, h), args.interval, args.threshold,
+                            proxy_size=args.proxy_size, directory=directory)
+                            
+    change_timer = QTimer()
+    change_timer.timeout.connect(backend.advance)
+    if args.change_ms > 0:
+        change_timer.start(args.change_ms)
+    watcher.start()
+    QTimer.singleShot(int(args.duration * 1000), app.quit)
+    app.exec()
+    watcher.stop()
+    QThreadPool.globalInstance().waitForDone()
+    print(format_stats(watcher.stats()))
+    print(f"输出目录: {directory}（{len(os.listdir(directory))} 个文件）")
+
+def synthetic_page(width, rows, seed=0):
+    """生成一张很高的合成页面：白底上按行排列的长短不一的“文字”块"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    page = Image.new('RGB', (width, rows), (255, 255, 255))
+    draw = ImageDraw.Draw(page)
+    y = 10
+    while y < rows - 20:
+        x = 20
+        while x < width - 60:
+            word = rng.randint(15, 90)
+            shade = rng.randint(0, 90)
+            draw.rectangle((x, y, min(x + word, width - 20), y + 11), fill=(shade, shade, shade + rng.randint(0, 60)))
+            x += word + rng.randint(6, 14)
+            if rng.random() < 0.08:
+                break
+        y += rng.choice((18, 20, 22, 40))
+    return page
+
+def bench_stitch(args):
+    """在合成的长页面上切出带固定标题栏/状态栏的滚动帧，测量拼接耗时并校验结果"""
+    from PIL import Image, ImageChops
+    from app.scroll_stitcher import ScrollStitcher
+    
+    rng = random.Random(args.seed)
+    page = synthetic_page(args.width, args.rows, args.seed)
+    header = Image.new('RGB', (args.width, args.header), (40, 60, 90))
+    footer = Image.new('RGB', (args.width, args.footer), (90, 40, 60))
+    body = args.frame_height - args.header - args.footer
+    
+    frames = []
+    y = 0
+    while True:
+        frame = Image.new('RGB', (args.width, args.frame_height))
+        frame.paste(header, (0, 0))
+        frame.paste(page.crop((0, y, args.width, y + body)), (0, args.header))
+        frame.paste(footer, (0, args.frame_height - args.footer))
+        frames.append(frame)
+        if y + body >= args.rows:
+            break
+        y = min(args.rows - body, y + rng.randint(args.min_step, args.max_step))
+        
+    stitcher = ScrollStitcher()
+    durations = []
+    for frame in frames:
+        start = time.perf_counter()
+        stitcher.add(frame)
+        durations.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    result = stitcher.result()
+    compose = time.perf_counter() - start
+    
+    expected = Image.new('RGB', (args.width, args.header + args.rows + args.footer))
+    expected.paste(header, (0, 0))
+    expected.paste(page, (0, args.header))
+    expected.paste(footer, (0, args.header + args.rows))
+    matches = result.size == expected.size and ImageChops.difference(result, expected).getbbox() is None
+    
+    print(f"页面 {args.width}x{args.rows}，{len(frames)} 帧，每帧 {args.frame_height} 行，"
+          f"跳过 {stitcher.skipped} 帧")
+    report('add', durations, args.frame_height, '行')
+    print(f"组合结果 {compose * 1000:.1f} ms，结果 {result.width}x{result.height}，"
+          f"与原页面{'一致' if matches else '不一致'}")
+
+def run_child(command, env):
+    """运行一个子进程，返回(耗时秒, 峰值内存MB, 退出码)；不支持wait4的平台峰值内存为None"""
+    import subprocess
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak = usage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+        return elapsed, peak, process.returncode
+    process.wait()
+    return time.perf_counter() - start, None, process.returncode
+
+def bench_cli(args):
+    """测量命令行模式每次调用的冷启动耗时和峰值内存，并与导入界面模块对比"""
+    import tempfile
+    root = os.path.dirname(os.path.abspath(__file__))
+    main_script = os.path.join(root, 'main.py')
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', SCREENSHOT_TOOL_BACKEND='synthetic')
+    directory = tempfile.mkdtemp(prefix='cli_bench_')
+    shot = os.path.join(directory, 'shot.png')
+    marked = os.path.join(directory, 'marked.png')
+    
+    cases = [
+        ('python', [sys.executable, '-c', 'pass']),
+        ('capture', [sys.executable, main_script, 'capture', '--region', args.region, '--out', shot]),
+        ('annotate', [sys.executable, main_script, 'annotate', shot, '--out', marked,
+                      '--rect', '10,10,200,100', '--arrow', '400,300,250,150', '--mosaic', '300,300,200,100',
+                      '--text', '20,20:benchmark']),
+        # 对比：界面模式启动时需要导入的模块
+        ('gui-import', [sys.executable, '-c', 'import sys; sys.path.insert(0, sys.argv[1]); '
+                        'from PyQt6.QtWidgets import QApplication; import app.floating_icon', root]),
+    ]
+    print(f"每项运行 {args.iterations} 次，输出目录 {directory}")
+    for name, command in cases:
+        durations, peaks = [], []
+        for _ in range(args.iterations):
+            elapsed, peak, code = run_child(command, env)
+            if code != 0:
+                print(f"{name} 退出码为 {code}")
+                return
+            durations.append(elapsed)
+            peaks.append(peak)
+        report(name, durations)
+        if peaks[0] is not None:
+            print(f"{'':<12} 峰值内存 {max(peaks):.1f} MB")
+
+def bench_instance(args):
+    """启动一个常驻实例，测量之后每次启动把命令交给它并退出的耗时"""
+    import subprocess
+    root = os.path.dirname(os.path.abspath(__file__))
+    main_script = os.path.join(root, 'main.py')
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', SCREENSHOT_TOOL_BACKEND='synthetic')
+    
+    start = time.perf_counter()
+    daemon = subprocess.Popen([sys.executable, main_script, 'send', 'show'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # 等待常驻实例开始监听；探测在本进程中进行，避免探测本身又启动一个实例
+    from app.instance_server import send_command
+    while not send_command('show', timeout_ms=100)[0]:
+        if daemon.poll() is not None:
+            print("常驻实例启动失败")
+            return
+        time.sleep(0.05)
+    print(f"常驻实例启动到可以接收命令 {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    try:
+        durations, peaks = [], []
+        for _ in range(args.iterations):
+            elapsed, peak, code = run_child([sys.executable, main_script, 'send', args.command], env)
+            if code != 0:
+                print(f"发送命令的退出码为 {code}")
+                return
+            durations.append(elapsed)
+            peaks.append(peak)
+        report(f'send {args.command}', durations)
+        if peaks[0] is not None:
+            print(f"{'':<12} 峰值内存 {max(peaks):.1f} MB")
+    finally:
+        run_child([sys.executable, main_script, 'send', 'quit'], env)
+        daemon.wait()
+
+def read_mjpeg(response, max_frames):
+    """读取multipart MJPEG流，返回每帧到达的时间"""
+    arrivals = []
+    while len(arrivals) < max_frames:
+        line = response.readline()
+        if not line:
+            break
+        if not line.startswith(b'--'):
+            continue
+        length = 0
+        while True:
+            header = response.readline().strip()
+            if not header:
+                break
+            name, _, value = header.partition(b':')
+            if name.lower() == b'content-length':
+                length = int(value)
+        response.read(length)
+        arrivals.append(time.perf_counter())
+    return arrivals
+
+def bench_http(args):
+    """多个客户端同时推流和单次截图，统计实际截图次数、各客户端帧率和单次截图延迟"""
+    import threading
+    import http.client
+    app = ensure_gui_application()
+    from PyQt6.QtCore import QSize, QTimer
+    from app.capture_backend import SyntheticCaptureBackend, grab_region
+    from app.http_api import FrameHub, HttpApi
+    
+    width, height = parse_size(args.size)
+    backend = SyntheticCaptureBackend(screen_count=1, screen_size=QSize(width, height))
+    hub = FrameHub(lambda rect: grab_region(backend, rect, 1.0), backend.screens)
+    api = HttpApi(hub, port=0)
+    api.start()
+    frames_per_stream = max(1, int(args.fps * args.duration))
+    
+    stream_results = []
+    capture_latencies = []
+    lock = threading.Lock()
+    
+    def stream_client():
+        connection = http.client.HTTPConnection('127.0.0.1', api.port, timeout=10)
+        connection.request('GET', f'/stream?region={args.region}&fps={args.fps}&frames={frames_per_stream}',
+                           headers={'X-Api-Token': api.token})
+        arrivals = read_mjpeg(connection.getresponse(), frames_per_stream)
+        connection.close()
+        with lock:
+            stream_results.append(arrivals)
+            
+    def capture_client():
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            connection = http.client.HTTPConnection('127.0.0.1', api.port, timeout=10)
+            start = time.perf_counter()
+            connection.request('GET', f'/capture?region={args.region}&format={args.format}',
+                               headers={'X-Api-Token': api.token})
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+            connection.close()
+            if response.status != 200:
+                print(f"单次截图返回 {response.status}")
+                return
+            with lock:
+                capture_latencies.append(elapsed)
+                
+    threads = [threading.Thread(target=stream_client) for _ in range(args.streams)]
+    threads += [threading.Thread(target=capture_client) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+        
+    # 界面线程负责截图，客户端全部结束后退出事件循环
+    def check_done():
+        if not any(thread.is_alive() for thread in threads):
+            app.quit()
+    poll = QTimer()
+    poll.timeout.connect(check_done)
+    poll.start(50)
+    app.exec()
+    api.stop()
+    
+    served = sum(len(arrivals) for arrivals in stream_results) + len(capture_latencies)
+    print(f"{args.streams} 路推流（{args.fps} fps），{args.clients} 个单次截图客户端，区域 {args.region}")
+    print(f"实际截图 {hub.grabs} 次，提供 {served} 帧/张")
+    for index, arrivals in enumerate(stream_results):
+        if len(arrivals) > 1:
+            fps = (len(arrivals) - 1) / (arrivals[-1] - arrivals[0])
+            print(f"推流 {index}: {len(arrivals)} 帧，{fps:.1f} fps")
+    if capture_latencies:
+        report('capture', capture_latencies)
+
+def synthetic_screenshot(size, seed=0):
+    """用合成后端生成一张指定大小的截图"""
+    from PyQt6.QtCore import QSize
+    from PyQt6.QtGui import QPixmap
+    from app.capture_backend import SyntheticCaptureBackend
+    width, height = parse_size(size)
+    backend = SyntheticCaptureBackend(screen_count=1, screen_size=QSize(width, height), seed=seed)
+    return QPixmap.fromImage(backend.screenImage(backend.screens()[0]))
+
+def mouse_event(kind, pos, button, buttons):
+    from PyQt6.QtCore import Qt, QPointF
+    from PyQt6.QtGui import QMouseEvent
+    return QMouseEvent(kind, QPointF(pos), QPointF(pos), button, buttons, Qt.KeyboardModifier.NoModifier)
+
+def bench_editor(args):
+    """在编辑窗口中模拟一次拖动绘制，测量每次鼠标移动（含重绘）的耗时
+    
+    --rate 大于0时按该频率（Hz）发送鼠标移动，模拟高回报率鼠标，
+    此时事件之间会继续处理界面事件，画笔按屏幕刷新率合并绘制。
+    """
+    app = ensure_gui_application()
+    from PyQt6.QtCore import Qt, QEvent, QPoint
+    from app.editor_window import EditorWindow
+    from app import metrics
+    
+    editor = EditorWindow(synthetic_screenshot(args.size, args.seed))
+    editor.tool_combo.setCurrentIndex(['pen', 'rect', 'circle', 'text', 'arrow', 'mosaic'].index(args.tool))
+    editor.thickness_spin.setValue(args.thickness)
+    editor.show()
+    app.processEvents()
+    if args.zoom > 0:
+        editor.canvas.setZoom(args.zoom)
+        app.processEvents()
+        
+    def window_pos(point):
+        # 图片坐标经过画布的缩放和平移转换为编辑窗口坐标
+        return editor.canvas.mapTo(editor, editor.canvas.widgetPos(point).toPoint())
+    
+    rng = random.Random(args.seed)
+    width = editor.current_screenshot.width()
+    height = editor.current_screenshot.height()
+    point = QPoint(width // 4, height // 4)
+    left = Qt.MouseButton.LeftButton
+    editor.mousePressEvent(mouse_event(QEvent.Type.MouseButtonPress, window_pos(point), left, left))
+    durations = []
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    next_time = time.perf_counter()
+    drag_start = next_time
+    for _ in range(args.moves):
+        point = QPoint(min(width - 1, max(0, point.x() + rng.randint(-5, 12))),
+                       min(height - 1, max(0, point.y() + rng.randint(-5, 12))))
+        while time.perf_counter() < next_time:
+            app.processEvents()
+        next_time += interval
+        start = time.perf_counter()
+        editor.mouseMoveEvent(mouse_event(QEvent.Type.MouseMove, window_pos(point), Qt.MouseButton.NoButton, left))
+        app.processEvents()
+        durations.append(time.perf_counter() - start)
+    drag_seconds = time.perf_counter() - drag_start
+    start = time.perf_counter()
+    editor.mouseReleaseEvent(mouse_event(QEvent.Type.MouseButtonRelease, window_pos(point), left, Qt.MouseButton.NoButton))
+    app.processEvents()
+    release = time.perf_counter() - start
+    
+    rate_text = f"，{args.rate} Hz，用时 {drag_seconds:.2f} 秒" if args.rate > 0 else ''
+    print(f"截图 {width}x{height}，显示比例 {editor.canvas.zoom:.2f}，工具 {args.tool}，{args.moves} 次移动{rate_text}")
+    report('move', durations)
+    print(f"松开鼠标（写入截图并记录历史） {release * 1000:.2f} ms")
+    paint = metrics.summary('editor_paint')
+    if paint is not None:
+        print(f"画布重绘 {paint['count']} 次，平均 {paint['mean']:.2f} ms，最长 {paint['max']:.2f} ms")
+    latency = metrics.summary('stroke_latency')
+    if latency is not None:
+        print(f"画笔合并绘制 {latency['count']} 次，输入到画面延迟平均 {latency['mean']:.2f} ms，"
+              f"最长 {latency['max']:.2f} ms")
+    editor.close()
+
+def bench_editor_open(args):
+    """从触发打开（松开鼠标）到编辑窗口第一次绘制出截图的耗时：每次新建窗口与复用回收的窗口"""
+    app = ensure_gui_application()
+    from app import editor_window
+    from app import metrics
+    
+    screenshot = synthetic_screenshot(args.size, args.seed)
+    
+    def open_once():
+        start = metrics.now()
+        editor = editor_window.open_editor(screenshot, start)
+        deadline = time.perf_counter() + 5.0
+        while editor.open_started is not None and time.perf_counter() < deadline:
+            app.processEvents()
+        first_paint = metrics.summary('editor_first_paint')['last'] / 1000.0
+        editor.close()
+        app.processEvents()
+        return first_paint
+        
+    # 回收池容量为0时每次都新建窗口，与复用前的行为相同
+    pool_size = editor_window.EDITOR_POOL_SIZE
+    editor_window.EDITOR_POOL_SIZE = 0
+    cold = [open_once() for _ in range(args.iterations)]
+    editor_window.EDITOR_POOL_SIZE = pool_size
+    editor_window.prewarm_editor()
+    pooled = [open_once() for _ in range(args.iterations)]
+    
+    print(f"截图 {screenshot.width()}x{screenshot.height()}，{args.iterations} 次打开")
+    report('new window', cold)
+    report('pooled', pooled)
+    opened = metrics.summary('editor_open')
+    if opened is not None:
+        print(f"open_editor（创建或复用并载入截图）平均 {opened['mean']:.2f} ms")
+
+def bench_text(args):
+    """在文字框中逐字输入，测量每次按键到重绘完成的耗时，比较开头和结尾的按键（长文字时应保持不变）"""
+    app = ensure_gui_application()
+    from PyQt6.QtCore import Qt, QEvent
+    from PyQt6.QtGui import QFont, QKeyEvent
+    from PyQt6.QtWidgets import QApplication
+    from app.editor_window import DynamicTextBox
+    from app import metrics
+    
+    box = DynamicTextBox()
+    box.setFont(QFont('Arial', 12))
+    box.resize(*parse_size(args.box))
+    box.show()
+    box.text_edit.setFocus()
+    app.processEvents()
+    
+    sample = args.text or 'The quick brown fox jumps over the lazy dog. 敏捷的棕色狐狸跳过了懒狗。'
+    durations = []
+    for index in range(args.chars):
+        char = sample[index % len(sample)]
+        start = time.perf_counter()
+        QApplication.sendEvent(box.text_edit, QKeyEvent(QEvent.Type.KeyPress, 0, Qt.KeyboardModifier.NoModifier, char))
+        # 处理按键引起的重绘（只重绘变化了的行）
+        app.processEvents()
+        durations.append(time.perf_counter() - start)
+        
+    layout = box.text_edit.text_layout
+    print(f"文本框 {box.width()}x{box.height()}，输入 {args.chars} 个字符，"
+          f"最终字号 {box.text_edit.pixel_size} 像素，{len(layout.lines)} 行")
+    count = min(50, len(durations) // 2)
+    report('first keys', durations[:count], unit='键')
+    report('last keys', durations[-count:], unit='键')
+    fit = metrics.summary('text_fit_layouts')
+    if fit is not None:
+        print(f"每次查找字号平均排版 {fit['mean']:.1f} 次")
+    box.close()
+
+def bench_history(args):
+    """在编辑窗口中连续做多步修改，测量历史记录的内存占用和撤销/重做的耗时"""
+    app = ensure_gui_application()
+    from PyQt6.QtCore import QRect
+    from PyQt6.QtGui import QPainter, QColor
+    from app.editor_window import EditorWindow
+    from app.annotations import StrokeAnnotation
+    from app.edit_history import EditHistory
+    
+    editor = EditorWindow(synthetic_screenshot(args.size, args.seed))
+    editor.history = EditHistory(editor.scene, args.budget_mb * 1024 * 1024)
+    rng = random.Random(args.seed)
+    width = editor.current_screenshot.width()
+    height = editor.current_screenshot.height()
+    original = editor.current_screenshot.toImage()
+    
+    push_times = []
+    for step in range(args.steps):
+        start = time.perf_counter()
+        if args.raster_every and step % args.raster_every == args.raster_every - 1:
+            # 模拟调整颜色等修改底图的操作：底图中的一块区域发生变化
+            base = editor.scene.base.copy()
+            painter = QPainter(base)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Difference)
+            painter.fillRect(QRect(rng.randrange(width), rng.randrange(height), 800, 600), QColor('white'))
+            painter.end()
+            editor.scene.setBase(base, editor.scene.annotations)
+        else:
+            x, y = rng.randrange(width), rng.randrange(height)
+            points = [(x + i * 4, y + int(20 * math.sin(i / 5))) for i in range(60)]
+            editor.scene.add(StrokeAnnotation(points, QColor('red').rgba(), 3))
+        editor.refreshScene()
+        editor.addToHistory()
+        push_times.append(time.perf_counter() - start)
+    final = editor.current_screenshot.toImage()
+    
+    undo_times = []
+    while editor.history.canUndo():
+        start = time.perf_counter()
+        editor.undo()
+        undo_times.append(time.perf_counter() - start)
+    undone = editor.current_screenshot.toImage() == original.convertToFormat(editor.current_screenshot.toImage().format())
+    redo_times = []
+    while editor.history.canRedo():
+        start = time.perf_counter()
+        editor.redo()
+        redo_times.append(time.perf_counter() - start)
+    redone = editor.current_screenshot.toImage() == final
+    
+    full_mb = editor.current_screenshot.width() * editor.current_screenshot.height() * 4 * (args.steps + 1) / (1024 * 1024)
+    print(f"截图 {width}x{height}，{args.steps} 步修改（每 {args.raster_every} 步修改一次底图），内存预算 {args.budget_mb} MB")
+    print(f"历史记录占用内存 {editor.history.memoryBytes() / (1024 * 1024):.2f} MB，"
+          f"临时文件 {editor.history.diskBytes() / (1024 * 1024):.2f} MB"
+          f"（文件大小 {editor.history.fileBytes() / (1024 * 1024):.2f} MB，每步保存整张图约 {full_mb:.0f} MB）")
+    report('push', push_times)
+    report('undo', undo_times)
+    report('redo', redo_times)
+    # 撤销是从最后一步往前，比较最近的十步和最早的十步
+    recent = sum(undo_times[:10]) / max(1, len(undo_times[:10])) * 1000
+    oldest = sum(undo_times[-10:]) / max(1, len(undo_times[-10:])) * 1000
+    print(f"撤销最近10步平均 {recent:.2f} ms，最早10步平均 {oldest:.2f} ms")
+    print(f"全部撤销后与原图{'一致' if undone else '不一致'}，全部重做后与修改结果{'一致' if redone else '不一致'}")
+    editor.close()
+
+def bench_canvas(args):
+    """在画布上缩放和平移大尺寸截图，测量每帧重绘的耗时
+    
+    与每帧把整张截图缩放后绘制的做法比较；最后在缩小显示时修改一小块区域，
+    测量只重新生成失效的缩略图块后的重绘耗时。
+    """
+    app = ensure_gui_application()
+    from PyQt6.QtCore import QRect, QRectF
+    from PyQt6.QtGui import QImage, QPainter, QColor
+    from app.image_canvas import ImageCanvas
+    from app import metrics
+    
+    pixmap = synthetic_screenshot(args.size, args.seed)
+    view_width, view_height = parse_size(args.view)
+    canvas = ImageCanvas()
+    canvas.setPixmap(pixmap)
+    canvas.resize(view_width, view_height)
+    canvas.show()
+    app.processEvents()
+    
+    def frame():
+        start = time.perf_counter()
+        canvas.repaint()
+        return time.perf_counter() - start
+        
+    print(f"截图 {pixmap.width()}x{pixmap.height()}，画布 {view_width}x{view_height}")
+    fit_zoom = canvas.zoom
+    # 显示窗口时已经绘制过一次，重新设置截图使缩略图重新生成
+    canvas.setPixmap(pixmap)
+    first = frame()
+    print(f"适应窗口（{fit_zoom:.3f}）首次重绘（生成可见的缩略图块） {first * 1000:.2f} ms")
+    report('fit', [frame() for _ in range(args.frames)])
+    
+    zoom_times = []
+    for index in range(args.frames):
+        # 在适应窗口和2倍之间来回缩放
+        factor = (index % 20) / 19.0
+        canvas.setZoom(fit_zoom * (1 - factor) + 2.0 * factor)
+        zoom_times.append(frame())
+    report('zoom', zoom_times)
+    
+    canvas.setZoom(1.0)
+    pan_times = []
+    for index in range(args.frames):
+        canvas.panBy(-37 if (index // 50) % 2 == 0 else 37, -11)
+        pan_times.append(frame())
+    report('pan 100%', pan_times)
+    
+    # 对照：每帧把整张截图缩放绘制
+    target = QImage(view_width, view_height, QImage.Format.Format_ARGB32_Premultiplied)
+    full_times = []
+    for _ in range(min(args.frames, 20)):
+        start = time.perf_counter()
+        painter = QPainter(target)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawPixmap(QRectF(0, 0, pixmap.width() * fit_zoom, pixmap.height() * fit_zoom), pixmap, QRectF(pixmap.rect()))
+        painter.end()
+        full_times.append(time.perf_counter() - start)
+    report('full scaled', full_times)
+    
+    canvas.fitToView()
+    frame()
+    edit_times = []
+    for index in range(args.frames):
+        rect = QRect((index * 97) % (pixmap.width() - 64), (index * 53) % (pixmap.height() - 64), 64, 64)
+        painter = QPainter(pixmap)
+        painter.fillRect(rect, QColor(255, 0, 0))
+        painter.end()
+        start = time.perf_counter()
+        canvas.repaintImageRect(rect)
+        edit_times.append(time.perf_counter() - start)
+    report('edit at fit', edit_times)
+    tiles = metrics.summary('canvas_mip_tiles')
+    if tiles is not None:
+        print(f"重新生成缩略图块 {tiles['count']} 次，平均每次 {tiles['mean']:.1f} 块")
+    canvas.close()
+
+def synthetic_traces(count, rate=1000, seed=0):
+    """模拟手写笔迹：随机的曲线以rate Hz采样并取整，与鼠标事件一样带有整像素的锯齿"""
+    import math
+    rng = random.Random(seed)
+    traces = []
+    for _ in range(count):
+        x, y = rng.uniform(200, 3000), rng.uniform(200, 1800)
+        heading = rng.uniform(0, 2 * math.pi)
+        speed = rng.uniform(300, 1500)  # 像素/秒
+        turn = 0.0
+        points = []
+        for _ in range(int(rate * rng.uniform(0.5, 2.0))):
+            turn = max(-8.0, min(8.0, turn + rng.gauss(0, 0.6)))
+            heading += turn / rate
+            x += math.cos(heading) * speed / rate
+            y += math.sin(heading) * speed / rate
+            points.append((round(x), round(y)))
+        traces.append((rng.choice([2, 3, 5]), points))
+    return traces
+
+def bench_stroke(args):
+    """回放记录的笔迹，比较原始折线与简化平滑后的点数和绘制耗时"""
+    app = ensure_gui_application()
+    from PyQt6.QtCore import Qt, QPointF
+    from PyQt6.QtGui import QPainter, QPainterPath, QPen, QColor, QPixmap
+    from app import stroke_processing
+    
+    if args.traces:
+        traces = stroke_processing.load_traces(args.traces)
+        source = args.traces
+    else:
+        traces = synthetic_traces(args.count, args.rate, args.seed)
+        source = f"合成笔迹 {args.rate} Hz"
+    canvas = QPixmap(*parse_size(args.size))
+    canvas.fill(QColor('white'))
+    
+    def draw(path, thickness):
+        start = time.perf_counter()
+        painter = QPainter(canvas)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.strokePath(path, QPen(QColor('red'), thickness, Qt.PenStyle.SolidLine,
+                                      Qt.PenCapStyle.RoundCap, Qt.PenJoinStyle.RoundJoin))
+        painter.end()
+        return time.perf_counter() - start
+        
+    raw_points = simplified_points = 0
+    process_times, raw_draw_times, smooth_draw_times = [], [], []
+    for thickness, points in traces:
+        raw = QPainterPath(QPointF(*points[0]))
+        for point in points[1:]:
+            raw.lineTo(QPointF(*point))
+        raw_draw_times.append(draw(raw, thickness))
+        
+        start = time.perf_counter()
+        simplified = stroke_processing.simplify(points, args.tolerance)
+        path = stroke_processing.smooth_path(simplified)
+        process_times.append(time.perf_counter() - start)
+        smooth_draw_times.append(draw(path, thickness))
+        raw_points += len(points)
+        simplified_points += len(simplified)
+        
+    print(f"{source}：{len(traces)} 个笔画，容差 {args.tolerance} 像素")
+    print(f"点数 {raw_points} -> {simplified_points}（减少 {100 - simplified_points * 100 / max(1, raw_points):.1f}%）")
+    report('simplify', process_times, unit='笔画')
+    report('draw raw', raw_draw_times, unit='笔画')
+    report('draw smooth', smooth_draw_times, unit='笔画')
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='截图工具基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    capture = subparsers.add_parser('capture', help='截图/合成/裁剪吞吐量（合成后端）')
+    capture.add_argument('--screens', type=int, default=3)
+    capture.add_argument('--size', default='3840x2160', help='每个屏幕的逻辑尺寸')
+    capture.add_argument('--layout', default='horizontal', choices=['horizontal', 'vertical', 'staggered'])
+    capture.add_argument('--dpr', type=float, default=1.0, help='设备像素比')
+    capture.add_argument('--overlay-mode', default='virtual', choices=['virtual', 'per_screen'])
+    capture.add_argument('--tile-size', type=int, default=0, help='大于0时按固定大小切块')
+    capture.add_argument('--iterations', type=int, default=10)
+    capture.add_argument('--crops', type=int, default=20, help='每帧的随机裁剪次数')
+    capture.add_argument('--seed', type=int, default=0)
+    capture.set_defaults(func=bench_capture)
+
+    region = subparsers.add_parser('region', help='直接截取区域到剪贴板的耗时（合成后端）')
+    region.add_argument('--region', default='3000,200,1600,900', help='全局逻辑坐标 x,y,w,h')
+    region.add_argument('--screens', type=int, default=3)
+    region.add_argument('--size', default='3840x2160', help='每个屏幕的逻辑尺寸')
+    region.add_argument('--layout', default='horizontal', choices=['horizontal', 'vertical', 'staggered'])
+    region.add_argument('--dpr', type=float, default=1.0, help='设备像素比')
+    region.add_argument('--overlay-mode', default='virtual', choices=['virtual', 'per_screen'])
+    region.add_argument('--iterations', type=int, default=20)
+    region.add_argument('--seed', type=int, default=0)
+    region.set_defaults(func=bench_region)
+    
+    burst = subparsers.add_parser('burst', help='连拍帧率、重复帧和缓冲区占用（合成后端）')
+    burst.add_argument('--region', default='100,100,1280,720', help='全局逻辑坐标 x,y,w,h')
+    burst.add_argument('--screens', type=int, default=1)
+    burst.add_argument('--size', default='1920x1080', help='每个屏幕的逻辑尺寸')
+    burst.add_argument('--interval', type=int, default=100, help='截图间隔（毫秒）')
+    burst.add_argument('--duration', type=float, default=5.0, help='持续时间（秒）')
+    burst.add_argument('--change-ms', type=int, default=500, help='画面变化的间隔（毫秒），0表示不变化')
+    burst.add_argument('--buffer-mb', type=int, default=64)
+    burst.add_argument('--out', default='', help='输出目录，默认使用临时目录')
+    burst.add_argument('--seed', type=int, default=0)
+    burst.set_defaults(func=bench_burst)
+    
+    record = subparsers.add_parser('record', help='区域录制的文件大小和编码耗时（合成后端）')
+    record.add_argument('--region', default='100,100,800,600', help='全局逻辑坐标 x,y,w,h')
+    record.add_argument('--size', default='1920x1080', help='屏幕的逻辑尺寸')
+    record.add_argument('--fps', type=int, default=10)
+    record.add_argument('--duration', type=float, default=3.0, help='录制时间（秒）')
+    record.add_argument('--change-ms', type=int, default=500, help='画面变化的间隔（毫秒），0表示不变化')
+    record.add_argument('--format', default='webp', choices=['webp', 'png'])
+    record.add_argument('--tile-size', type=int, default=64)
+    record.add_argument('--out', default='', help='输出文件，默认写入临时目录')
+    record.add_argument('--seed', type=int, default=0)
+    record.set_defaults(func=bench_record)
+    
+    watch = subparsers.add_parser('watch', help='监视模式的采样耗时（合成后端）')
+    watch.add_argument('--region', default='0,0,1920,1080', help='全局逻辑坐标 x,y,w,h')
+    watch.add_argument('--size', default='1920x1080', help='屏幕的逻辑尺寸')
+    watch.add_argument('--interval', type=int, default=100, help='采样间隔（毫秒）')
+    watch.add_argument('--threshold', type=float, default=0.01, help='触发保存的变化比例')
+    watch.add_argument('--proxy-size', type=int, default=96)
+    watch.add_argument('--duration', type=float, default=3.0, help='持续时间（秒）')
+    watch.add_argument('--change-ms', type=int, default=1000, help='画面变化的间隔（毫秒），0表示不变化')
+    watch.add_argument('--seed', type=int, default=0)
+    watch.set_defaults(func=bench_watch)
+    
+    stitch = subparsers.add_parser('stitch', help='滚动截图拼接（合成长页面，无需界面）')
+    stitch.add_argument('--rows', type=int, default=30000, help='页面总行数')
+    stitch.add_argument('--width', type=int, default=1200)
+    stitch.add_argument('--frame-height', type=int, default=1000)
+    stitch.add_argument('--header', type=int, default=60, help='固定标题栏高度')
+    stitch.add_argument('--footer', type=int, default=40, help='固定状态栏高度')
+    stitch.add_argument('--min-step', type=int, default=100, help='每次滚动的最少行数')
+    stitch.add_argument('--max-step', type=int, default=700, help='每次滚动的最多行数')
+    stitch.add_argument('--seed', type=int, default=0)
+    stitch.set_defaults(func=bench_stitch)
+    
+    cli = subparsers.add_parser('cli', help='命令行模式的冷启动耗时和峰值内存（子进程，合成后端）')
+    cli.add_argument('--region', default='100,100,1280,720', help='全局逻辑坐标 x,y,w,h')
+    cli.add_argument('--iterations', type=int, default=10)
+    cli.set_defaults(func=bench_cli)
+    
+    instance = subparsers.add_parser('instance', help='把命令交给常驻实例的耗时（子进程，合成后端）')
+    instance.add_argument('--command', default='show', choices=['show', 'repeat-last'])
+    instance.add_argument('--iterations', type=int, default=20)
+    instance.set_defaults(func=bench_instance)
+    
+    http = subparsers.add_parser('http', help='HTTP截图接口的共享截图、推流帧率和截图延迟（合成后端）')
+    http.add_argument('--region', default='100,100,1280,720', help='全局逻辑坐标 x,y,w,h')
+    http.add_argument('--size', default='1920x1080', help='屏幕的逻辑尺寸')
+    http.add_argument('--streams', type=int, default=4, help='同时推流的客户端数')
+    http.add_argument('--clients', type=int, default=4, help='同时单次截图的客户端数')
+    http.add_argument('--fps', type=float, default=15)
+    http.add_argument('--format', default='png', choices=['png', 'jpeg'])
+    http.add_argument('--duration', type=float, default=3.0, help='持续时间（秒）')
+    http.set_defaults(func=bench_http)
+    
+    editor = subparsers.add_parser('editor', help='编辑窗口中拖动绘制时每次移动的耗时（合成截图）')
+    editor.add_argument('--size', default='3840x2160', help='截图尺寸')
+    editor.add_argument('--tool', default='rect', choices=['pen', 'rect', 'circle', 'arrow', 'mosaic'])
+    editor.add_argument('--thickness', type=int, default=2)
+    editor.add_argument('--moves', type=int, default=200)
+    editor.add_argument('--rate', type=int, default=0, help='鼠标移动的频率（Hz），0表示不限速')
+    editor.add_argument('--zoom', type=float, default=0, help='画布的显示比例，0表示适应窗口')
+    editor.add_argument('--seed', type=int, default=0)
+    editor.set_defaults(func=bench_editor)
+    
+    editor_open = subparsers.add_parser('editor-open', help='松开鼠标到编辑窗口第一次绘制的耗时（合成截图）')
+    editor_open.add_argument('--size', default='1920x1080', help='截图尺寸')
+    editor_open.add_argument('--iterations', type=int, default=20)
+    editor_open.add_argument('--seed', type=int, default=0)
+    editor_open.set_defaults(func=bench_editor_open)
+    
+    text = subparsers.add_parser('text', help='文字框逐字输入时按键到重绘的耗时')
+    text.add_argument('--chars', type=int, default=1000, help='输入的字符数')
+    text.add_argument('--box', default='400x300', help='文本框尺寸')
+    text.add_argument('--text', default='', help='循环输入的文字，默认中英文混合')
+    text.set_defaults(func=bench_text)
+    
+    canvas = subparsers.add_parser('canvas', help='画布缩放/平移时每帧重绘的耗时（合成截图）')
+    canvas.add_argument('--size', default='11520x2160', help='截图尺寸，默认相当于三块4K屏幕')
+    canvas.add_argument('--view', default='1600x900', help='画布尺寸')
+    canvas.add_argument('--frames', type=int, default=100)
+    canvas.add_argument('--seed', type=int, default=0)
+    canvas.set_defaults(func=bench_canvas)
+    
+    history = subparsers.add_parser('history', help='撤销/重做历史的内存占用和耗时（合成截图）')
+    history.add_argument('--size', default='3840x2160', help='截图尺寸')
+    history.add_argument('--steps', type=int, default=100)
+    history.add_argument('--raster-every', type=int, default=10, help='每隔几步修改一次底图，0表示只有标注')
+    history.add_argument('--budget-mb', type=int, default=256, help='历史记录的内存预算')
+    history.add_argument('--seed', type=int, default=0)
+    history.set_defaults(func=bench_history)
+    
+    stroke = subparsers.add_parser('stroke', help='画笔笔迹简化平滑前后的点数和绘制耗时')
+    stroke.add_argument('--traces', default='', help='SCREENSHOT_TOOL_STROKE_LOG记录的笔迹文件，默认使用合成笔迹')
+    stroke.add_argument('--count', type=int, default=50, help='合成笔迹的笔画数')
+    stroke.add_argument('--rate', type=int, default=1000, help='合成笔迹的采样频率（Hz）')
+    stroke.add_argument('--tolerance', type=float, default=0.8, help='简化容差（像素）')
+    stroke.add_argument('--size', default='3840x2160', help='绘制的画布尺寸')
+    stroke.add_argument('--seed', type=int, default=0)
+    stroke.set_defaults(func=bench_stroke)
+    
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
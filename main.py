@@ -1,7 +1,8 @@
 import sys
 import os
-from PyQt6.QtWidgets import QApplication
-from app.floating_icon import FloatingIcon
+
+# 命令行模式的子命令；界面相关的模块只在启动界面时才导入，命令行模式不加载它们
+CLI_COMMANDS = ('capture', 'annotate')
 
 def ensure_app_directories():
     """确保应用程序所需的目录存在"""
@@ -10,16 +11,55 @@ def ensure_app_directories():
     if not os.path.exists(app_data_dir):
         os.makedirs(app_data_dir)
 
+def parse_instance_command(argv):
+    """解析发给运行中实例的命令：main.py send <命令> [参数]，不带参数启动时相当于 send capture
+    
+    返回(命令, 参数, 是否显式指定)，参数中的文件路径转换为绝对路径。
+    """
+    if not argv:
+        return 'capture', '', False
+    if argv[0] != 'send' or len(argv) < 2:
+        return None, '', False
+    argument = ' '.join(argv[2:])
+    if argv[1] == 'open' and argument:
+        argument = os.path.abspath(argument)
+    return argv[1], argument, True
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        from app.cli import run
+        sys.exit(run(sys.argv[1:]))
+        
+    # 已有实例在运行时只把命令交给它，不再加载界面
+    command, argument, explicit = parse_instance_command(sys.argv[1:])
+    if command is not None:
+        from app.instance_server import send_command
+        running, error = send_command(command, argument)
+        if running:
+            if error:
+                print(error, file=sys.stderr)
+            sys.exit(1 if error else 0)
+            
     # 确保应用程序目录存在
     ensure_app_directories()
     
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QTimer
+    from app.floating_icon import FloatingIcon
+    from app.instance_server import InstanceServer
     app = QApplication(sys.argv)
     
     # 创建悬浮图标
     floating_icon = FloatingIcon()
     floating_icon.show()
     
+    # 监听之后的启动发来的命令
+    server = InstanceServer(floating_icon.handleCommand)
+    if not server.listen():
+        print("无法监听本地命令套接字，之后的启动不会复用这个实例")
+    if explicit:
+        QTimer.singleShot(0, lambda: floating_icon.handleCommand(command, argument))
+        
     sys.exit(app.exec())
 
 if __name__ == "__main__":